@@ -1,13 +1,21 @@
 from datetime import timedelta
 import re
 
+import numpy as np
+
 class TrackTime:
     """Class for handling the time formats in MK8DX time trials. Support for addition, subtraction,
-    and stringify functions using `datetime`.
-    
+    and stringify functions.
+
+    Times are stored internally as an integer number of milliseconds, so arithmetic and comparisons
+    never need to go back through strings.
+
     The format is `M:SS.sss`, for example, `1:06.243` and `0:59.100` are possible times.
     """
+    __slots__ = ("ms",)
+
     TIME_FORMAT_REGEX = r"^(\d+):(\d{2})\.(\d{3})$"
+    _PATTERN = re.compile(TIME_FORMAT_REGEX)
 
     def __init__(self, time_str: str):
         """Initialises a `TrackTime` object.
@@ -15,12 +23,33 @@ class TrackTime:
         Args:
             time (str): The time in the format `M:SS.sss`.
         """
-        if not self.validate_format(time_str):
+        ms = self._parse_ms(time_str) if isinstance(time_str, str) else None
+        if ms is None:
             raise ValueError("Time format is invalid, should be 'M:SS.sss'")
-        self.time = self._parse_time_string(time_str)
+        self.ms = ms
 
-    @staticmethod
-    def validate_format(time_str: str) -> bool:
+    @classmethod
+    def from_ms(cls, ms: int):
+        """Create a time directly from a number of milliseconds, skipping any string parsing.
+
+        Args:
+            ms (int): Time in milliseconds. Should be non-negative.
+        """
+        obj = object.__new__(cls)
+        obj.ms = int(ms)
+        return obj
+
+    @classmethod
+    def from_seconds(cls, s: float):
+        """Create a time from a float number of seconds.
+
+        Args:
+            s (float): Time in seconds. Should be non-negative.
+        """
+        return cls.from_ms(cls._seconds_to_ms(s))
+
+    @classmethod
+    def validate_format(cls, time_str: str) -> bool:
         """Check if the given string matches the format `M:SS.sss`.
 
         Args:
@@ -29,31 +58,63 @@ class TrackTime:
         Returns:
             bool: true if the format matches, otherwise false
         """
-        return bool(re.match(TrackTime.TIME_FORMAT_REGEX, time_str))
+        return bool(cls._PATTERN.match(time_str))
+
+    @classmethod
+    def _parse_ms(cls, time_str: str) -> int | None:
+        """Convert a time string to milliseconds. All fields except the last are base 60, the last
+        field is milliseconds.
+
+        Args:
+            time_str (str): Time as a string.
+
+        Returns:
+            int | None: Time in milliseconds, or None if the format is invalid.
+        """
+        match = cls._PATTERN.match(time_str)
+        if match is None:
+            return None
+        *fields, ms = match.groups()
+        total = 0
+        for field in fields:
+            total = total * 60 + int(field)
+        return total * 1000 + int(ms)
+
+    @staticmethod
+    def _format_ms(ms: int) -> str:
+        """Convert milliseconds to `M:SS.sss` format.
+
+        Args:
+            ms (int): Time in milliseconds."""
+        seconds, milliseconds = divmod(ms, 1000)
+        minutes, seconds = divmod(seconds, 60)
+        return f"{minutes:01}:{seconds:02}.{milliseconds:03}"
 
     @staticmethod
-    def _parse_time_string(time_str: str) -> timedelta:
+    def _seconds_to_ms(s: float) -> int:
+        """Convert a float number of seconds to whole milliseconds. Rounds to the microsecond first
+        (as `timedelta` does) and then truncates, to avoid float error like `7.350999...`."""
+        return int(round(s * 1e6)) // 1000
+
+    @classmethod
+    def _parse_time_string(cls, time_str: str) -> timedelta:
         """Convert a time string in `M:SS.sss` format to a `timedelta` object.
-        
+
         Args:
             time_str (str): Time as a string.
         """
-        minutes, seconds = map(float, time_str.split(':'))
-        return timedelta(minutes=int(minutes), seconds=seconds)
+        return timedelta(milliseconds=cls._parse_ms(time_str))
 
-    @staticmethod
-    def _format_timedelta(td: timedelta) -> str:
+    @classmethod
+    def _format_timedelta(cls, td: timedelta) -> str:
         """Convert a `timedelta` object to `M:SS.sss` format.
-        
+
         Args:
             td (timedelta): `timedelta` object to convert back to custom format."""
-        total_seconds = int(td.total_seconds())
-        milliseconds = int(td.microseconds / 1000)
-        minutes, seconds = divmod(total_seconds, 60)
-        return f"{minutes:01}:{seconds:02}.{milliseconds:03}"
-    
-    @staticmethod
-    def _format_seconds(s: float) -> str:
+        return cls._format_ms(td // timedelta(milliseconds=1))
+
+    @classmethod
+    def _format_seconds(cls, s: float) -> str:
         """Converts a time float in seconds to a formatted string.
 
         Args:
@@ -64,14 +125,16 @@ class TrackTime:
         """
         if s < 0:
             raise ValueError(f"Time should be positive.")
-        return TrackTime._format_timedelta(timedelta(seconds=s))
-    
+        return cls._format_ms(cls._seconds_to_ms(s))
+
     def _ensure_track_time(self, other):
         """Ensure the other object is either a TrackTime or a valid time string."""
         if isinstance(other, TrackTime):
             return other
-        elif isinstance(other, str) and self.validate_format(other):
-            return TrackTime(other)
+        elif isinstance(other, str):
+            ms = self._parse_ms(other)
+            if ms is not None:
+                return type(self).from_ms(ms)
         raise TypeError("Unsupported type. Must be TrackTime or valid time string format.")
 
     def get_seconds(self) -> float:
@@ -80,53 +143,54 @@ class TrackTime:
         Returns:
             float: time in seconds
         """
-        return self.time.seconds + self.time.microseconds / 1e6
-    
+        return self.ms / 1000
+
     def get_timedelta(self) -> timedelta:
-        return self.time
+        return timedelta(milliseconds=self.ms)
 
     def __add__(self, other):
         other = self._ensure_track_time(other)
-        return TrackTime(self._format_timedelta(self.time + other.time))
+        return type(self).from_ms(self.ms + other.ms)
 
     def __sub__(self, other):
         other = self._ensure_track_time(other)
-        if self.time < other.time:
-            # TODO this is a bit jank
-            return TrackTime("0:00.000")
-        return TrackTime(self._format_timedelta(self.time - other.time))
+        # Negative times aren't representable, so clamp to zero
+        return type(self).from_ms(max(self.ms - other.ms, 0))
 
     def __eq__(self, other):
         other = self._ensure_track_time(other)
-        return self.time == other.time
+        return self.ms == other.ms
 
     def __ge__(self, other):
         other = self._ensure_track_time(other)
-        return self.time >= other.time
+        return self.ms >= other.ms
 
     def __le__(self, other):
         other = self._ensure_track_time(other)
-        return self.time <= other.time
+        return self.ms <= other.ms
 
     def __lt__(self, other):
         other = self._ensure_track_time(other)
-        return self.time < other.time
+        return self.ms < other.ms
 
     def __gt__(self, other):
         other = self._ensure_track_time(other)
-        return self.time > other.time
+        return self.ms > other.ms
 
     def __str__(self):
-        return self._format_timedelta(self.time)
+        return self._format_ms(self.ms)
 
     def __repr__(self):
         return f"TrackTime({self})"
-    
+
 class TrackTimeExt(TrackTime):
     """Extension of TrackTime class to support hours in the format. Format is:
     `H:MM:SS.sss`
     """
+    __slots__ = ()
+
     TIME_FORMAT_REGEX = r"^(\d+):(\d{2}):(\d{2})\.(\d{3})$"
+    _PATTERN = re.compile(TIME_FORMAT_REGEX)
 
     def __init__(self, time_str: str):
         """Initialises a `TrackTimeExt` object.
@@ -134,55 +198,118 @@ class TrackTimeExt(TrackTime):
         Args:
             time (str): The time in the format `H:MM:SS.sss`.
         """
-        if not self.validate_format(time_str):
+        ms = self._parse_ms(time_str) if isinstance(time_str, str) else None
+        if ms is None:
             raise ValueError("Time format is invalid, should be 'H:MM:SS.sss'")
-        self.time = self._parse_time_string(time_str)
+        self.ms = ms
 
     @staticmethod
-    def validate_format(time_str: str) -> bool:
-        """Check if the given string matches the format `M:SS.sss`.
+    def _format_ms(ms: int) -> str:
+        """Convert milliseconds to `H:MM:SS.sss` format.
 
         Args:
-            time_str (str): raw time string
-
-        Returns:
-            bool: true if the format matches, otherwise false
-        """
-        return bool(re.match(TrackTimeExt.TIME_FORMAT_REGEX, time_str))
-
-    @staticmethod
-    def _parse_time_string(time_str: str) -> timedelta:
-        """Convert a time string in `M:SS.sss` format to a `timedelta` object.
-        
-        Args:
-            time_str (str): Time as a string.
-        """
-        hours, minutes, seconds = map(float, time_str.split(':'))
-        return timedelta(hours=int(hours), minutes=int(minutes), seconds=seconds)
-
-    @staticmethod
-    def _format_timedelta(td: timedelta) -> str:
-        """Convert a `timedelta` object to `M:SS.sss` format.
-        
-        Args:
-            td (timedelta): `timedelta` object to convert back to custom format."""
-        total_seconds = int(td.total_seconds())
-        milliseconds = int(td.microseconds / 1000)
-        minutes, seconds = divmod(total_seconds, 60)
+            ms (int): Time in milliseconds."""
+        seconds, milliseconds = divmod(ms, 1000)
+        minutes, seconds = divmod(seconds, 60)
         hours, minutes = divmod(minutes, 60)
         return f"{hours:01}:{minutes:02}:{seconds:02}.{milliseconds:03}"
-    
-    @staticmethod
-    def _format_seconds(s: float) -> str:
-        return TrackTimeExt._format_timedelta(timedelta(seconds=s))
-    
-    def _ensure_track_time(self, other):
-        """Ensure the other object is either a TrackTimeExt or a valid time string."""
-        if isinstance(other, TrackTimeExt):
-            return other
-        elif isinstance(other, str) and self.validate_format(other):
-            return TrackTimeExt(other)
-        raise TypeError("Unsupported type. Must be TrackTimeExt or valid time string format.")
 
     def __repr__(self):
-        return f"TrackTimeExt({self})"
\ No newline at end of file
+        return f"TrackTimeExt({self})"
+
+#region Batch functions
+MISSING_MS = -1
+_BATCH_WIDTH = 16
+
+def parse_times(times, ext: bool = False, fill: int | None = None) -> np.ndarray:
+    """Parse a whole array of time strings to integer milliseconds at once. Strings are
+    right-justified into a fixed width character grid, so the separators and digits can be checked
+    and combined column-wise rather than per string.
+
+    Args:
+        times (iterable): Time strings, in `M:SS.sss` format (or `H:MM:SS.sss` if `ext`).
+        ext (bool, optional): If true, parse the extended format with hours. Defaults to False.
+        fill (int | None, optional): Value used for invalid or missing entries. If None, an invalid
+            entry raises a ValueError instead. Defaults to None.
+
+    Raises:
+        ValueError: If an entry is invalid and no fill value is given.
+
+    Returns:
+        np.ndarray: Integer array of times in milliseconds.
+    """
+    cls = TrackTimeExt if ext else TrackTime
+    values = list(times)
+    n = len(values)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    width = _BATCH_WIDTH
+    min_len = 11 if ext else 8
+
+    # Non-strings and oversized strings are left for the scalar fallback below
+    fits = np.fromiter((isinstance(t, str) and min_len <= len(t) <= width for t in values), bool, n)
+    grid = np.array([t if ok else "" for t, ok in zip(values, fits)], dtype=f"U{width}")
+    grid = np.char.rjust(grid, width, "0").view(np.uint32).reshape(n, width).astype(np.int64) - ord("0")
+
+    seps = {-4: ".", -7: ":"}
+    if ext:
+        seps[-10] = ":"
+    sep_cols = [width + i for i in seps]
+    digit_cols = [i for i in range(width) if i not in sep_cols]
+
+    digits = grid[:, digit_cols]
+    valid = fits & ((digits >= 0) & (digits <= 9)).all(axis=1)
+    for col, sep in seps.items():
+        valid &= grid[:, col] == ord(sep) - ord("0")
+
+    def field(lo: int, hi: int) -> np.ndarray:
+        cols = grid[:, lo:hi]
+        powers = 10 ** np.arange(hi - lo - 1, -1, -1, dtype=np.int64)
+        return cols @ powers
+
+    ms = field(width - 3, width)
+    secs = field(width - 6, width - 4)
+    if ext:
+        mins = field(width - 9, width - 7) + field(0, width - 10) * 60
+    else:
+        mins = field(0, width - 7)
+    out = np.where(valid, (mins * 60 + secs) * 1000 + ms, MISSING_MS if fill is None else fill)
+
+    for i in np.flatnonzero(~valid):
+        parsed = cls._parse_ms(values[i]) if isinstance(values[i], str) else None
+        if parsed is not None:
+            out[i] = parsed
+        elif fill is None:
+            raise ValueError(f"Time format is invalid at index {i}: {values[i]!r}")
+
+    return out
+
+def format_times(ms, ext: bool = False, missing=None) -> np.ndarray:
+    """Format a whole array of millisecond times to strings.
+
+    Args:
+        ms (array-like): Times in milliseconds. Negative values and NaN are treated as missing.
+        ext (bool, optional): If true, use the extended format with hours. Defaults to False.
+        missing (optional): Value used for missing entries. Defaults to None.
+
+    Returns:
+        np.ndarray: Object array of formatted strings.
+    """
+    ms = np.asarray(ms, dtype=float)
+    valid = ~np.isnan(ms) & (ms >= 0)
+    whole = np.where(valid, ms, 0).astype(np.int64)
+
+    seconds, millis = np.divmod(whole, 1000)
+    minutes, seconds = np.divmod(seconds, 60)
+    if ext:
+        hours, minutes = np.divmod(minutes, 60)
+        strs = [f"{h}:{m:02}:{s:02}.{x:03}" for h, m, s, x in
+                zip(hours.tolist(), minutes.tolist(), seconds.tolist(), millis.tolist())]
+    else:
+        strs = [f"{m}:{s:02}.{x:03}" for m, s, x in
+                zip(minutes.tolist(), seconds.tolist(), millis.tolist())]
+
+    out = np.array(strs, dtype=object)
+    out[~valid] = missing
+    return out
+#endregion
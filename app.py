@@ -1,68 +1,232 @@
-from flask import Flask, redirect, render_template, request, url_for
+from collections.abc import Callable
+import gzip
+import json
+import multiprocessing
+import os
+
+from flask import Flask, Response, abort, jsonify, redirect, render_template, request, url_for
+from markupsafe import Markup
 import numpy as np
 
+from cache import LRUCache
+from charts import CHART_WORKERS, FORMATS, ChartRenderer, chart_key
 import db
+import profiling
+from profiling import stage
+from sheet_stats import SheetStats, SheetStatsRegistry
 from timesheet import *
+from timesheet import _standards_colours
+from wr_refresh import WRRefresher
 
 app = Flask(__name__)
+db.init_app(app)
+
+# The /debug endpoints expose profiles, request paths and SQL, so they're only served in debug mode
+# unless enabled here
+DEBUG_ENDPOINTS = os.environ.get("DEBUG_ENDPOINTS", "") not in ("", "0")
+
+# Stage timings for every request (Server-Timing header and /debug/metrics). Set a sample rate to
+# also profile a fraction of requests and keep the profiles of slow ones
+METRICS = profiling.init_app(app,
+    sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", 0)),
+    slow_ms=float(os.environ.get("PROFILE_SLOW_MS", 200)),
+    memory=os.environ.get("PROFILE_MEMORY", "") not in ("", "0"),
+    debug_endpoints=DEBUG_ENDPOINTS)
+
+# Every SQL statement is recorded (see /debug/queries). Slow ones are logged to the file (stderr if
+# unset), and with EXPLAIN_QUERIES the plan of each distinct statement is checked for full scans
+db.QUERY_LOG.configure(
+    slow_ms=float(os.environ.get("SLOW_QUERY_MS", db.SLOW_QUERY_MS)),
+    path=os.environ.get("SLOW_QUERY_LOG") or None,
+    explain=os.environ.get("EXPLAIN_QUERIES", "") not in ("", "0"))
+
+TIMESHEET_CACHE = LRUCache(maxsize=16)   # (cc, items, data version) -> timesheet page data
+SHEET_STATS = SheetStatsRegistry()      # Summary stats, updated per track as times are added/deleted
+db.add_time_listener(SHEET_STATS.pb_changed)
+API_CACHE = LRUCache(maxsize=64)        # (endpoint, args, data version) -> encoded API responses
+FRAGMENT_CACHE = LRUCache(maxsize=32)   # (fragment, args, data version) -> rendered HTML
+GZIP_MIN_SIZE = 1024                    # Smaller responses aren't worth compressing
+MAX_PAGE_SIZE = 200                     # Largest `limit` accepted by the paginated endpoints
+CHART_SERIES_CACHE = LRUCache(maxsize=8) # (track, cc, items, player, data version) -> chart times/ids
+MAX_CHART_POINTS = 2000                 # Largest `points` accepted by `/api/track_chart`
+
+# Background WR refresh, enabled by setting the interval in seconds. New WRs bump the data version so
+# every cached page is rebuilt with them
+WR_REFRESH_INTERVAL = float(os.environ.get("WR_REFRESH_INTERVAL", 0))
+WR_REFRESHER = None
+if WR_REFRESH_INTERVAL > 0 and multiprocessing.parent_process() is None:  # Not in the chart workers
+    WR_REFRESHER = WRRefresher(WR_REFRESH_INTERVAL, on_swap=lambda cc, items: db.bump_data_version()).start()
+
+@app.before_request
+def _sync_catalog():
+    """Pick up WRs swapped in by another worker process before any page is built with them."""
+    if request.endpoint != "static":
+        sync_catalog(db.get_data_version())
+
+# Charts are rendered in worker processes (0 to render in the request thread) and cached on disk
+CHART_RENDERER = ChartRenderer(workers=int(os.environ.get("CHART_WORKERS", CHART_WORKERS)))
+
+def render_fragment(template: str, key: tuple, **context) -> Markup:
+    """Render a template fragment, or get it from `FRAGMENT_CACHE` if already rendered. The key
+    must cover everything the fragment shows, including the data version.
+
+    Args:
+        template (str): Template name.
+        key (tuple): Cache key.
+
+    Returns:
+        Markup: The rendered HTML, safe to insert into another template.
+    """
+    return FRAGMENT_CACHE.get_or_compute(key, lambda: Markup(render_template(template, **context)))
+
+#region Pagination
+def _encode_cursor(*values) -> str:
+    """Page cursor: the keyset values of the last row of a page, joined by `:`. Floats are written
+    with `repr` so they round trip exactly."""
+    return ":".join(repr(v) if isinstance(v, float) else str(v) for v in values)
+
+def _decode_cursor(cursor: str, types: tuple) -> tuple:
+    """Parse a page cursor made by `_encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor is invalid.
+    """
+    try:
+        return tuple(t(value) for t, value in zip(types, cursor.split(":"), strict=True))
+    except ValueError:
+        raise ValueError(f"Args not recognised: {cursor}") from None
+
+def _page_limit() -> int:
+    """The `limit` arg of a paginated request.
+
+    Raises:
+        ValueError: If it isn't between 1 and `MAX_PAGE_SIZE`.
+    """
+    limit = request.args.get("limit", type=int)
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"Args not recognised: {limit}")
+    return limit
+
+def track_times_page(track: str, cc: str, items: str, player_id: int = db.DEFAULT_PLAYER,
+                     after: str | None = None, limit: int | None = None) -> dict:
+    """One page of a track's times, fastest first (see `db.get_times_page`), as records with the
+    position (`Num`, 1 is the PB), time and improvement over the next slower time.
+
+    Args:
+        track (str): Track name.
+        cc (str): CC.
+        items (str): Item type.
+        player_id (int, optional): Player. Defaults to `db.DEFAULT_PLAYER`.
+        after (str | None, optional): The previous page's `next` cursor. Defaults to None.
+        limit (int | None, optional): Page size. Defaults to `db.TIMES_PAGE_SIZE`.
+
+    Returns:
+        dict: The `rows`, and the `next` cursor (None on the last page).
+    """
+    limit = limit or db.TIMES_PAGE_SIZE
+    time_sec, last_id, position = _decode_cursor(after, (float, int, int)) if after else (None, None, 0)
+    # One extra row, for the improvement of the page's last time and to tell if there's another page
+    rows = db.get_times_page(track, cc, items, player_id, (time_sec, last_id) if after else None, limit + 1)
+    df = create_track_times_df([row["time_sec"] for row in rows])
+    df["Num"] += position
+    df["RowId"] = [row["id"] for row in rows]
+
+    more = len(rows) > limit
+    with stage("to_dict"):
+        records = df.iloc[:limit].to_dict(orient="records")
+    return {
+        "rows": records,
+        "next": _encode_cursor(rows[limit - 1]["time_sec"], rows[limit - 1]["id"], position + limit) if more else None,
+    }
+
+def recent_times_page(player_id: int = db.DEFAULT_PLAYER, before: str | None = None, limit: int | None = None) -> dict:
+    """One page of the most recently added times, newest first (see `db.get_recent_times`).
 
-TRACKS = [(row["tr_name"], row["tr_abbrev"]) for row in db.get_tracks()]
-TRACK_NAMES = [i[0] for i in TRACKS]
-TRACK_CODES = [i[1] for i in TRACKS]
+    Args:
+        player_id (int, optional): Player. Defaults to `db.DEFAULT_PLAYER`.
+        before (str | None, optional): The previous page's `next` cursor. Defaults to None.
+        limit (int | None, optional): Page size. Defaults to `db.RECENT_PAGE_SIZE`.
+
+    Returns:
+        dict: The `rows`, and the `next` cursor (None on the last page).
+    """
+    limit = limit or db.RECENT_PAGE_SIZE
+    before_id = _decode_cursor(before, (int,))[0] if before else None
+    rows = db.get_recent_times(limit + 1, player_id, before_id)
+    return {
+        "rows": rows[:limit],
+        "next": _encode_cursor(rows[limit - 1]["id"]) if len(rows) > limit else None,
+    }
+#endregion
 
 @app.route("/")
 def index():
     """Home page"""
     return render_template("index.html")
 
-@app.route("/timesheet", methods=["GET"])
-def timesheet():
-    """Timesheet page. Contains a large table of times data and some overall statistics at the bottom."""
-    selected_cc = request.args.get("cc", "150cc")
-    selected_items = request.args.get("items", "Shrooms")
+def build_timesheet(cc: str, items: str) -> dict:
+    """Compute everything the timesheet page shows for a given CC and item type: the timesheet
+    rows (pre-formatted, see `create_display_records`), the overall stats and the chart arguments.
+
+    Args:
+        cc (str): CC.
+        items (str): Item type.
 
+    Returns:
+        dict: Template arguments.
+    """
     # Fetch filtered data and create timesheet df
-    pbs = [row["time_str"] for row in db.get_best_times(selected_cc, selected_items)]
-    wrs = determine_wrs(selected_cc, selected_items)
-    times_df = create_timesheet_df(TRACK_NAMES, pbs, wrs, selected_cc, selected_items)
-    times_df["Code"] = TRACK_CODES
-    overall_stats = calculate_sheet_stats(times_df)
+    pbs = [row["time_str"] for row in db.get_best_times(cc, items)]
+    catalog = get_catalog()
+    times_df = create_timesheet_df(catalog.names, pbs, catalog.wrs(cc, items), cc, items)
+    times_df["Code"] = catalog.abbrevs
+    stats = SHEET_STATS.get(cc, items)
 
     # Make arguments for chart generation
-    diff_interval = 1
-    wr_diff_values = times_df["WRDiffNum"].dropna()
-    wr_bins = np.arange(0, max(wr_diff_values) + 1 if wr_diff_values.any() else 1, diff_interval)
-    wr_hist, wr_bin_edges = np.histogram(wr_diff_values, bins=wr_bins)
-
+    dists = aggregate_distributions(times_df["WRDiffNum"].to_numpy() * 1000, times_df["StandardNum"].to_numpy())
     chart_diff_args = {
-        "Labels": [f"{int(edge)}-{int(edge + 1)}" for edge in wr_bin_edges[:-1]],
-        "Counts": wr_hist.tolist(),
+        "Labels": dists.diff_labels(),
+        "Counts": dists.diff_counts.tolist(),
     }
 
-    rank_counts = {rank: 0 for rank in STANDARDS_NAMES}
-    unique_ranks, rank_frequencies = np.unique(times_df["Standard"].dropna(), return_counts=True)
-    for rank, count in zip(unique_ranks, rank_frequencies):
-        if rank in rank_counts:
-            rank_counts[rank] = count
-
     chart_rank_args = {
         "Labels": STANDARDS_NAMES,
-        "Counts": [int(rank_counts[rank]) for rank in STANDARDS_NAMES],
+        "Counts": dists.chart_rank_counts(),
+    }
+
+    return {
+        "rows": create_display_records(times_df),
+        "overall_stats": stats.summary(),
+        "chart_diff_args": chart_diff_args,
+        "chart_rank_args": chart_rank_args,
     }
 
+@app.route("/timesheet", methods=["GET"])
+def timesheet():
+    """Timesheet page. Contains a large table of times data and some overall statistics at the bottom.
+    The computed page data is cached until the times table changes."""
+    selected_cc = request.args.get("cc", "150cc")
+    selected_items = request.args.get("items", "Shrooms")
+
+    key = (selected_cc, selected_items, db.get_data_version())
+    sheet = TIMESHEET_CACHE.get_or_compute(key, lambda: build_timesheet(selected_cc, selected_items))
+    table_rows = render_fragment("components/timesheet_rows.html", ("timesheet_rows", *key),
+        rows=sheet["rows"], selected_cc=selected_cc, selected_items=selected_items)
+
     return render_template("timesheet.html",
-        times=times_df.to_dict(orient="records"),
-        overall_stats=overall_stats,
-        chart_diff_args=chart_diff_args, chart_rank_args=chart_rank_args,
+        table_rows=table_rows,
+        overall_stats=sheet["overall_stats"],
+        chart_diff_args=sheet["chart_diff_args"], chart_rank_args=sheet["chart_rank_args"],
         selected_cc=selected_cc, selected_items=selected_items,
         cc_categories=CC_CATEGORIES, item_options=ITEM_OPTIONS)
 
 @app.route("/update", methods=["GET"])
 def update():
     """Update time page. Contains a form for inserting new records into the db."""
+    recent = recent_times_page()
     return render_template("update.html",
-        recent_times=db.get_recent_times("10"),
-        track_names=TRACKS, cc_categories=CC_CATEGORIES, item_options=ITEM_OPTIONS)
+        recent_times=recent["rows"], recent_next=recent["next"],
+        track_names=[(track.name, track.abbrev) for track in get_catalog()], cc_categories=CC_CATEGORIES, item_options=ITEM_OPTIONS)
 
 @app.route("/track")
 def track():
@@ -75,30 +239,28 @@ def track():
     selected_cc = request.args.get("cc", "150cc")
     selected_items = request.args.get("items", "Shrooms")
 
-    if not track_name or track_name not in TRACK_NAMES:
+    catalog = get_catalog()
+    track_info = catalog.get(track_name)    # Name or abbreviation
+    if track_info is None:
         raise ValueError(f"Track name is invalid: {track_name}")
-
-    # Get more track info
-    tr_num, tr_abbrev = db.query_db("SELECT tr_number, tr_abbrev FROM tracks WHERE tr_name = ?", (track_name,), one=True)
+    tr_num, track_name, tr_abbrev = track_info.number, track_info.name, track_info.abbrev
 
     # Fetch WR and PB times
-    wr_list = determine_wrs(selected_cc, selected_items)
-    wr_str = wr_list[tr_num - 1] if wr_list is not None else None
-    times = db.get_times_for_track(track_name, selected_cc, selected_items)
-    df = create_track_times_df([row["time_sec"] for row in times])
-    df["RowId"] = [row["id"] for row in times]
+    wr_str = catalog.wr(selected_cc, selected_items, tr_num)
+    wr_ms = catalog.wrs_ms(selected_cc, selected_items)
+    page = track_times_page(track_name, selected_cc, selected_items)
 
     # Generate timesheet excerpt
-    pb = times[0]["time_str"] if len(times) > 0 else None
+    pb = page["rows"][0]["Time"] if page["rows"] else None
     ts_excerpt = create_ts_excerpt_df(tr_num, track_name, pb, wr_str, selected_cc, selected_items)
-    standards = determine_standards(selected_cc, selected_items)
+    standards = catalog.standards(selected_cc, selected_items)
     if standards is not None:
-        standards = [TrackTime(i).get_seconds() for i in standards.iloc[tr_num - 1][1:]]
+        standards = (standards.track_cutoffs(tr_num) / 1000).tolist()
 
     return render_template("track.html",
-        times=df.to_dict(orient="records"),
-        ts_excerpt=ts_excerpt.to_dict(orient="records"),
-        wr=[wr_str, TrackTime(wr_str).get_seconds() if wr_str else None],
+        times=page["rows"], times_next=page["next"],
+        ts_excerpt=create_display_records(ts_excerpt),
+        wr=[wr_str, wr_ms[tr_num - 1] / 1000 if wr_ms is not None else None],
         standards=standards if standards else [],
         track_name=track_name, track_abbrev=tr_abbrev,
         selected_cc=selected_cc, selected_items=selected_items,
@@ -133,9 +295,12 @@ def insert_time():
     cc = request.form.get("cc", "150cc")
     items = request.form.get("items", "Shrooms")
 
-    if not track or track not in TRACK_NAMES:   # Validate track exists
+    track_info = get_catalog().get(track)
+    if track_info is None:                  # Validate track exists
+        success = False
         error = "Track name not recognised."
     else:
+        track = track_info.name
         success = db.insert_time(track, time, cc, items)
         if not success:                         # Validate non-duplicate
             error = "Time already exists."
@@ -148,5 +313,421 @@ def insert_time():
         return redirect(url_for("track", track=track, cc=cc, items=items, success="true" if success else "false", error=error))
     return redirect(url_for("update", success="true" if success else "false", error=error))
 
+#region API
+def _ms_column(ms: np.ndarray) -> list:
+    """Convert a float array of ms (NaN for missing) to a JSON column of ints and nulls."""
+    return [None if np.isnan(t) else int(t) for t in np.asarray(ms, dtype=float).tolist()]
+
+def _encode_json(payload: dict) -> tuple:
+    """Encode an API payload as compact JSON, plus a gzipped copy if it's big enough to be worth it."""
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    return body, gzip.compress(body, 6) if len(body) >= GZIP_MIN_SIZE else None
+
+def api_response(key: tuple, build: Callable[[], dict]) -> Response:
+    """Conditional, compressed JSON response for data that only changes with the data version.
+
+    The ETag is the data version, so a client polling unchanged data gets a 304 without the payload
+    being built or even looked up. Otherwise the encoded (and gzipped) body is cached per version.
+    The gzipped representation has its own ETag, as its bytes differ; small bodies are never
+    gzipped, so either ETag of the current version is accepted.
+
+    Args:
+        key (tuple): Identifies the resource, e.g. the endpoint and its arguments.
+        build (Callable[[], dict]): Builds the payload, only called on a cache miss.
+
+    Returns:
+        Response: The response.
+    """
+    version = db.get_data_version()
+    use_gzip = "gzip" in request.accept_encodings
+    etag = f"v{version}-gz" if use_gzip else f"v{version}"
+    # A small body is sent plain even to gzip clients, so they hold the plain ETag
+    matched = next((tag for tag in (etag, f"v{version}") if request.if_none_match.contains_weak(tag)), None)
+
+    if matched is not None:
+        response = Response(status=304)
+        etag = matched
+    else:
+        body, compressed = API_CACHE.get_or_compute((*key, version), lambda: _encode_json(build()))
+        if use_gzip and compressed is not None:
+            response = Response(compressed, mimetype="application/json")
+            response.content_encoding = "gzip"
+        else:
+            response = Response(body, mimetype="application/json")
+            etag = f"v{version}"
+
+    response.set_etag(etag)
+    response.vary.add("Accept-Encoding")
+    response.cache_control.no_cache = True  # Always revalidate, the ETag makes that cheap
+    return response
+
+@app.route("/api/timesheet")
+def api_timesheet():
+    """Timesheet data as columns (one list per field, in track order). Times are integer ms, and
+    missing values are null. Includes the overall stats and rank counts.
+
+    With `as_of` (a date or `YYYY-MM-DD HH:MM:SS` UTC time), the WRs are the ones recorded at that
+    time (see `db.get_wrs_as_of`) rather than the current ones.
+    """
+    cc = request.args.get("cc", "150cc")
+    items = request.args.get("items", "Shrooms")
+    player_id = request.args.get("player", db.DEFAULT_PLAYER, type=int)
+    as_of = request.args.get("as_of")
+    if cc not in CC_CATEGORIES or items not in ITEM_OPTIONS:
+        raise ValueError(f"Args not recognised: {cc}, {items}")
+
+    def build() -> dict:
+        catalog = get_catalog()
+        track_names, track_codes = list(catalog.names), list(catalog.abbrevs)
+        standards = catalog.standards(cc, items)
+        pb_ms = times_to_ms([row["time_str"] for row in db.get_best_times(cc, items, player_id)])
+        if as_of is None:
+            wr_ms = catalog.wrs_ms(cc, items)
+            stats = SHEET_STATS.get(cc, items, player_id)
+        else:
+            historical = {row["track"]: row["time_ms"] for row in db.get_wrs_as_of(cc, items, as_of)}
+            wr_ms = np.array([historical.get(name, np.nan) for name in track_names], dtype=float)
+            stats = SheetStats(wr_ms, standards, pb_ms)
+        cols = compute_timesheet_columns(pb_ms, wr_ms, standards)
+        return {
+            "cc": cc,
+            "items": items,
+            "player": player_id,
+            "as_of": as_of,
+            "columns": {
+                "track_no": list(range(1, len(track_names) + 1)),
+                "track": track_names,
+                "code": track_codes,
+                "pb_ms": _ms_column(pb_ms),
+                "wr_ms": _ms_column(cols["WRNum"] * 1000),
+                "wr_diff_ms": _ms_column(cols["WRDiffMs"]),
+                "wr_diff_norm": [None if np.isnan(x) else x for x in cols["WRDiffNorm"].tolist()],
+                "standard": [None if isinstance(x, float) else x for x in cols["Standard"].tolist()],
+                "standard_num": _ms_column(cols["StandardNum"]),
+                "standard_diff_ms": _ms_column(cols["StandardDiffMs"]),
+            },
+            "stats": stats.summary(),
+            "rank_counts": dict(zip(STANDARDS_NAMES, stats.chart_rank_counts())),
+        }
+
+    return api_response(("timesheet", cc, items, player_id, as_of), build)
+
+@app.route("/api/wr_changes")
+def api_wr_changes():
+    """The WRs that fell after `since` (and at or before `until`, default now), with the old and new
+    times in ms. Times are dates or `YYYY-MM-DD HH:MM:SS` UTC times."""
+    cc = request.args.get("cc", "150cc")
+    items = request.args.get("items", "Shrooms")
+    since = request.args.get("since", "1970-01-01 00:00:00")
+    until = request.args.get("until")
+    if cc not in CC_CATEGORIES or items not in ITEM_OPTIONS:
+        raise ValueError(f"Args not recognised: {cc}, {items}")
+
+    def build() -> dict:
+        rows = db.get_wr_diff(cc, items, since, until)
+        return {
+            "cc": cc,
+            "items": items,
+            "columns": {
+                "track": [row["track"] for row in rows],
+                "old_ms": [TrackTime(row["old_time"]).ms if row["old_time"] else None for row in rows],
+                "new_ms": [TrackTime(row["new_time"]).ms for row in rows],
+                "fetched_at": [row["fetched_at"] for row in rows],
+            },
+        }
+
+    return api_response(("wr_changes", cc, items, since, until), build)
+
+@app.route("/api/track")
+def api_track():
+    """A track's times as columns (`id`, `time_ms`, fastest first), plus the WR and the standards
+    cut-offs in ms.
+
+    Raises:
+        ValueError: If the track name is invalid.
+    """
+    track_name = request.args.get("track")
+    cc = request.args.get("cc", "150cc")
+    items = request.args.get("items", "Shrooms")
+    player_id = request.args.get("player", db.DEFAULT_PLAYER, type=int)
+    catalog = get_catalog()
+    track_info = catalog.get(track_name)    # Name or abbreviation
+    if track_info is None:
+        raise ValueError(f"Track name is invalid: {track_name}")
+    if cc not in CC_CATEGORIES or items not in ITEM_OPTIONS:
+        raise ValueError(f"Args not recognised: {cc}, {items}")
+    track_name, tr_num = track_info.name, track_info.number
+
+    def build() -> dict:
+        times = db.get_times_for_track(track_name, cc, items, player_id)
+        wrs = catalog.wrs_ms(cc, items)
+        standards = catalog.standards(cc, items)
+        return {
+            "track": track_name,
+            "track_no": tr_num,
+            "cc": cc,
+            "items": items,
+            "player": player_id,
+            "wr_ms": int(wrs[tr_num - 1]) if wrs is not None else None,
+            "standards_ms": standards.track_cutoffs(tr_num).tolist() if standards is not None else [],
+            "columns": {
+                "id": [row["id"] for row in times],
+                "time_ms": [TrackTime._seconds_to_ms(row["time_sec"]) for row in times],
+            },
+        }
+
+    return api_response(("track", track_name, cc, items, player_id), build)
+
+def track_chart_series(track: str, cc: str, items: str, player_id: int = db.DEFAULT_PLAYER) -> tuple:
+    """A track's times in ms and their ids as arrays, fastest first, cached per data version so
+    zooming around the chart doesn't query all the times each time."""
+    def load() -> tuple:
+        times = db.get_times_for_track(track, cc, items, player_id)
+        return (
+            np.array([TrackTime._seconds_to_ms(row["time_sec"]) for row in times], dtype=np.int64),
+            np.array([row["id"] for row in times], dtype=np.int64),
+        )
+
+    return CHART_SERIES_CACHE.get_or_compute((track, cc, items, player_id, db.get_data_version()), load)
+
+@app.route("/api/track_chart")
+def api_track_chart():
+    """The PB progression chart's data for a track as columns (`num`, `time_ms`, and `pb`, whether
+    it was a PB improvement), slowest first and downsampled to at most `points` points (see
+    `create_track_chart_df`). Pass `start` and `end` (inclusive, numbered from 1 like `num`) to get
+    a window at a higher resolution, e.g. when zooming. `total` is the number of times.
+
+    Raises:
+        ValueError: If any of the args are invalid.
+    """
+    track_name = request.args.get("track")
+    cc = request.args.get("cc", "150cc")
+    items = request.args.get("items", "Shrooms")
+    player_id = request.args.get("player", db.DEFAULT_PLAYER, type=int)
+    start = request.args.get("start", type=int)
+    end = request.args.get("end", type=int)
+    points = request.args.get("points", CHART_POINTS, type=int)
+    track_info = get_catalog().get(track_name)  # Name or abbreviation
+    if track_info is None:
+        raise ValueError(f"Track name is invalid: {track_name}")
+    if cc not in CC_CATEGORIES or items not in ITEM_OPTIONS:
+        raise ValueError(f"Args not recognised: {cc}, {items}")
+    if not 2 <= points <= MAX_CHART_POINTS:
+        raise ValueError(f"Args not recognised: {points}")
+    if (start is not None and start < 1) or (start is not None and end is not None and end < start):
+        raise ValueError(f"Args not recognised: {start}, {end}")
+
+    def build() -> dict:
+        times, ids = track_chart_series(track_info.name, cc, items, player_id)
+        chart_df = create_track_chart_df(times, ids, points, start, end)
+        return {
+            "track": track_info.name,
+            "cc": cc,
+            "items": items,
+            "player": player_id,
+            "total": len(times),
+            "columns": {
+                "num": chart_df["Num"].tolist(),
+                "time_ms": chart_df["TimeMs"].tolist(),
+                "pb": chart_df["PB"].tolist(),
+            },
+        }
+
+    return api_response(("track_chart", track_info.name, cc, items, player_id, start, end, points), build)
+
+@app.route("/api/track_times")
+def api_track_times():
+    """A page of a track's times as columns (`id`, `position` where 1 is the PB, `time` and `impr`,
+    the improvement over the next slower time), fastest first. Pass the `next` cursor back as
+    `after` to get the following page; it's null on the last page. At most `limit` rows per page.
+
+    Raises:
+        ValueError: If any of the args are invalid.
+    """
+    track_name = request.args.get("track")
+    cc = request.args.get("cc", "150cc")
+    items = request.args.get("items", "Shrooms")
+    player_id = request.args.get("player", db.DEFAULT_PLAYER, type=int)
+    after = request.args.get("after")
+    limit = _page_limit()
+    track_info = get_catalog().get(track_name)  # Name or abbreviation
+    if track_info is None:
+        raise ValueError(f"Track name is invalid: {track_name}")
+    if cc not in CC_CATEGORIES or items not in ITEM_OPTIONS:
+        raise ValueError(f"Args not recognised: {cc}, {items}")
+
+    def build() -> dict:
+        page = track_times_page(track_info.name, cc, items, player_id, after, limit)
+        rows = page["rows"]
+        return {
+            "track": track_info.name,
+            "cc": cc,
+            "items": items,
+            "player": player_id,
+            "columns": {
+                "id": [row["RowId"] for row in rows],
+                "position": [row["Num"] for row in rows],
+                "time": [row["Time"] for row in rows],
+                "impr": [row["Impr"] for row in rows],
+            },
+            "next": page["next"],
+        }
+
+    return api_response(("track_times", track_info.name, cc, items, player_id, after, limit), build)
+
+@app.route("/api/recent_times")
+def api_recent_times():
+    """A page of the most recently added times as columns (`id`, `track`, `code`, `time`, `cc` and
+    `items`), newest first. Pass the `next` cursor back as `before` to get the following page; it's
+    null on the last page. At most `limit` rows per page.
+
+    Raises:
+        ValueError: If any of the args are invalid.
+    """
+    player_id = request.args.get("player", db.DEFAULT_PLAYER, type=int)
+    before = request.args.get("before")
+    limit = _page_limit()
+
+    def build() -> dict:
+        page = recent_times_page(player_id, before, limit)
+        rows = page["rows"]
+        return {
+            "player": player_id,
+            "columns": {
+                "id": [row["id"] for row in rows],
+                "track": [row["track"] for row in rows],
+                "code": [row["tr_abbrev"] for row in rows],
+                "time": [row["time_str"] for row in rows],
+                "cc": [row["cc"] for row in rows],
+                "items": [row["items"] for row in rows],
+            },
+            "next": page["next"],
+        }
+
+    return api_response(("recent_times", player_id, before, limit), build)
+
+@app.route("/api/distribution")
+def api_distribution():
+    """WR diff histogram and standard counts over every player's PBs, for one track or all of them
+    (see `aggregate_distributions`). Buckets are `bucket_ms` wide, 1 s by default; narrow buckets
+    are widened so there are at most `MAX_DIFF_BUCKETS`, and the width used is in the response.
+
+    Raises:
+        ValueError: If any of the args are invalid.
+    """
+    cc = request.args.get("cc", "150cc")
+    items = request.args.get("items", "Shrooms")
+    track_name = request.args.get("track")
+    bucket_ms = request.args.get("bucket_ms", DIFF_BUCKET_MS, type=int)
+    if cc not in CC_CATEGORIES or items not in ITEM_OPTIONS:
+        raise ValueError(f"Args not recognised: {cc}, {items}")
+    catalog = get_catalog()
+    if track_name is not None:
+        track_info = catalog.get(track_name)    # Name or abbreviation
+        if track_info is None:
+            raise ValueError(f"Track name is invalid: {track_name}")
+        track_name = track_info.name
+
+    def build() -> dict:
+        rows = db.get_all_best_times(cc, items, track_name)
+        tracks = np.fromiter((row[0] - 1 for row in rows), dtype=np.int64, count=len(rows))
+        pb_ms = np.fromiter((row[1] for row in rows), dtype=float, count=len(rows)) * 1000
+        wrs = catalog.wrs_ms(cc, items)
+        cols = compute_timesheet_columns(pb_ms, wrs[tracks] if wrs is not None else None,
+                                         catalog.standards(cc, items), tracks)
+        dists = aggregate_distributions(cols["WRDiffMs"], cols["StandardNum"], bucket_ms=bucket_ms)
+        return {
+            "cc": cc,
+            "items": items,
+            "track": track_name,
+            "pbs": len(rows),
+            "bucket_ms": dists.bucket_ms,
+            "wr_diff_counts": dists.diff_counts.tolist(),
+            "rank_counts": dict(zip(STANDARDS_NAMES + ["Unranked"], dists.rank_counts.tolist())),
+        }
+
+    return api_response(("distribution", cc, items, track_name, bucket_ms), build)
+#endregion
+
+@app.route("/debug/queries")
+def debug_queries():
+    """SQL statements run since startup, with calls, time and rows per normalised statement and call
+    site (slowest in total first), and the statements whose plans have full scans, if checked. A 404
+    unless in debug mode or `DEBUG_ENDPOINTS` is set, as it shows the SQL and source locations."""
+    if not (DEBUG_ENDPOINTS or app.debug):
+        abort(404)
+    return jsonify({
+        "queries": db.QUERY_LOG.summary(),
+        "full_scans": db.QUERY_LOG.full_scans(),
+    })
+
+#region Charts
+def chart_data(kind: str, cc: str, items: str, player_id: int, track_name: str | None,
+               bucket_ms: int = DIFF_BUCKET_MS) -> dict:
+    """Gather the data a chart is drawn from (see `charts.CHART_KINDS`).
+
+    Raises:
+        ValueError: If the chart kind or track name is invalid.
+    """
+    catalog = get_catalog()
+    if kind == "wr_diffs":
+        diffs = SHEET_STATS.get(cc, items, player_id).diffs
+        dists = aggregate_distributions(diffs, np.full(len(diffs), np.nan), bucket_ms=bucket_ms)
+        return {"counts": dists.diff_counts.tolist(), "bucket_ms": dists.bucket_ms}
+    if kind == "ranks":
+        return {
+            "counts": SHEET_STATS.get(cc, items, player_id).chart_rank_counts(),
+            "names": STANDARDS_NAMES,
+            "colours": _standards_colours(),
+        }
+    if kind == "track":
+        track_info = catalog.get(track_name)    # Name or abbreviation
+        if track_info is None:
+            raise ValueError(f"Track name is invalid: {track_name}")
+        times = db.get_times_for_track(track_info.name, cc, items, player_id)
+        wrs = catalog.wrs_ms(cc, items)
+        standards = catalog.standards(cc, items)
+        return {
+            "track": track_info.name,
+            "pb_ms": TrackTime._seconds_to_ms(times[0]["time_sec"]) if times else None,
+            "wr_ms": int(wrs[track_info.number - 1]) if wrs is not None else None,
+            "cutoffs_ms": standards.track_cutoffs(track_info.number).tolist() if standards is not None else [],
+            "names": STANDARDS_NAMES,
+            "colours": _standards_colours(),
+        }
+    raise ValueError(f"Args not recognised: {kind}")
+
+@app.route("/chart/<kind>.<fmt>")
+def chart(kind: str, fmt: str):
+    """Chart image (PNG or SVG) for reports and embeds: `wr_diffs` (histogram of WR diffs, with
+    buckets of `bucket_ms`), `ranks` (tracks per standard) or `track` (PB and WR against the
+    standards, needs `track`).
+
+    Images are rendered off the request thread and cached on disk by a hash of the data they're
+    drawn from, which is also the ETag, so an unchanged chart is never rendered twice.
+
+    Raises:
+        ValueError: If any of the args are invalid.
+    """
+    cc = request.args.get("cc", "150cc")
+    items = request.args.get("items", "Shrooms")
+    player_id = request.args.get("player", db.DEFAULT_PLAYER, type=int)
+    if cc not in CC_CATEGORIES or items not in ITEM_OPTIONS or fmt not in FORMATS:
+        raise ValueError(f"Args not recognised: {cc}, {items}, {fmt}")
+
+    data = chart_data(kind, cc, items, player_id, request.args.get("track"),
+                      request.args.get("bucket_ms", DIFF_BUCKET_MS, type=int))
+    key = chart_key(kind, fmt, data)
+    if request.if_none_match.contains(key):
+        response = Response(status=304)
+    else:
+        with stage("charts.render"):
+            image = CHART_RENDERER.render(kind, fmt, data, key)
+        response = Response(image, mimetype=FORMATS[fmt])
+    response.set_etag(key)
+    response.cache_control.no_cache = True
+    return response
+#endregion
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,301 @@
+"""Benchmark suite for the parsing, timesheet, db and route hot paths. Runs entirely offline against a
+synthetic database built with `generate_times`, so results can be compared between commits.
+
+Usage:
+    python benchmarks/run.py [--attempts N] [--out FILE] [--filter TEXT] [--startup]
+    python benchmarks/run.py --compare OLD.json NEW.json
+
+Synthetic databases are cached in `benchmarks/data/` by size, and results are written as JSON to
+`benchmarks/results/` by default.
+"""
+import argparse
+from datetime import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, "benchmarks", "data")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# The app modules use paths relative to the repo root (schema, CSVs)
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import numpy as np
+
+import db
+import generate_times
+import outreach
+from sheet_stats import SheetStats
+import timesheet as ts
+from TrackTime import TrackTime, format_times, parse_times
+
+#region Harness
+def bench(func, min_time: float = 0.2, rounds: int = 5) -> dict:
+    """Time a function. Each round calls it enough times to take at least `min_time` seconds (as
+    estimated from a warm-up call), and the per-call time of each round is recorded.
+
+    Args:
+        func (Callable): Function to time, called with no arguments.
+        min_time (float, optional): Minimum seconds per round. Defaults to 0.2.
+        rounds (int, optional): Number of rounds. Defaults to 5.
+
+    Returns:
+        dict: Per-call seconds (`median`, `min`) and the number of calls per round.
+    """
+    start = time.perf_counter()
+    func()
+    once = max(time.perf_counter() - start, 1e-7)
+    number = max(1, int(min_time / once))
+
+    per_call = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        per_call.append((time.perf_counter() - start) / number)
+    return {"median": statistics.median(per_call), "min": min(per_call), "number": number}
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+#endregion
+
+#region Synthetic data
+def build_db(attempts: int, rebuild: bool = False) -> str:
+    """Build (or reuse) a synthetic database with roughly the given number of attempts, generated
+    straight into the db for every cc and item combination, spread over as many synthetic players as
+    needed. Repeated attempts by a player can collide on the UNIQUE constraint, so the final row count
+    may be slightly lower.
+
+    Args:
+        attempts (int): Target number of rows in the times table.
+        rebuild (bool, optional): If true, rebuild even if a cached db exists. Defaults to False.
+
+    Returns:
+        str: Path to the db file.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"bench_{attempts}.db")
+    db.close_all()
+    db.DB_FILE = path
+    if os.path.exists(path) and not rebuild:
+        return path
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    db.init_db()
+    db.init_tracks_from_csv("data/track_names.csv")
+
+    # Roughly 10 attempts per track for each player and combination
+    per_player = len(ts.CC_CATEGORIES) * len(ts.ITEM_OPTIONS) * 96 * 10
+    players = -(-attempts // per_player)
+    stats = generate_times.write_db(players, seed=0, limit=attempts, defer_indexes=attempts >= 100000)
+    print(f"Built {path}: ", end="")
+    db.print_import_stats(stats)
+    return path
+#endregion
+
+#region Benchmarks
+def wr_page_fixtures() -> dict:
+    """WR pages to benchmark parsing on: the pages saved by the last WR refresh (see
+    `outreach.cached_page`) where there are any, otherwise a page laid out like mkwrs's, built from
+    the current WRs.
+
+    Returns:
+        dict: CC -> page HTML.
+    """
+    pages = {}
+    for cc, url in [("150cc", outreach.WRS_150_URL), ("200cc", outreach.WRS_200_URL)]:
+        page = outreach.cached_page(url)
+        if page is None:
+            wrs = ts.get_catalog().wr_frame(cc, "Shrooms")
+            # mkwrs writes times as M'SS"mmm
+            times = [time.replace(":", "'").replace(".", '"') for time in wrs[1]]
+            rows = "".join(
+                f'<tr><td><a href="wrs.php?track={track}">{track}</a></td>'
+                f'<td><a href="display.php?track={track}">{time}</a></td>'
+                f'<td>Player</td><td><img src="flag.png"></td><td>2025-02-25</td><td>1</td></tr>\n'
+                for track, time in zip(wrs[0], times)
+            )
+            nav = "".join(f'<li><a href="page{i}.php">Page {i}</a></li>' for i in range(50))
+            footer = "".join(f"<tr><td>Row {i}</td><td>Value {i}</td></tr>\n" for i in range(500))
+            page = (f"<html><head><title>WRs</title></head><body><table><tr><td><ul>{nav}</ul></td></tr></table>"
+                    f"<table><tr><th>Track</th><th>Time</th><th>Player</th><th>Nation</th><th>Date</th>"
+                    f"<th>Days</th></tr>\n{rows}</table><table>{footer}</table></body></html>")
+        pages[cc] = page
+    return pages
+
+def parse_wrs_table_soup(html: str) -> list:
+    """The previous BeautifulSoup implementation of `outreach.parse_wrs_table`, as a reference."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    wr_times = []
+    for row in soup.find_all("table")[1].find_all("tr")[1:]:
+        col = row.find_all("td")
+        time = col[1].text.strip()
+        if "*" not in time:
+            wr_times.append((col[0].text.strip(), time.replace("'", ":").replace('"', ".")))
+    return wr_times
+
+def benchmarks(cc: str = "150cc", items: str = "Shrooms") -> dict:
+    """Set up the benchmark functions against the current db.
+
+    Returns:
+        dict: Benchmark name -> function.
+    """
+    import app as webapp
+    client = webapp.app.test_client()
+
+    time_strs = format_times(np.random.default_rng(0).integers(60000, 180000, 10000)).tolist()
+    time_ms = parse_times(time_strs)
+    a, b = TrackTime("1:06.243"), TrackTime("0:59.100")
+
+    tracks = [row["tr_name"] for row in db.get_tracks()]
+    pbs = [row["time_str"] for row in db.get_best_times(cc, items)]
+    wrs = ts.determine_wrs(cc, items)
+    sheet = ts.create_timesheet_df(tracks, pbs, wrs, cc, items)
+
+    # The track with the longest history is the worst case for the track page
+    busiest = db.query_db("""
+        SELECT track, COUNT(*) AS n FROM track_times WHERE cc = ? AND items = ?
+        GROUP BY track ORDER BY n DESC LIMIT 1
+    """, (cc, items), one=True)
+    busiest = busiest["track"] if busiest else tracks[0]
+    busiest_rows = db.get_times_for_track(busiest, cc, items)
+    busiest_secs = [row["time_sec"] for row in busiest_rows]
+    busiest_ms = np.array([TrackTime._seconds_to_ms(t) for t in busiest_secs])
+    busiest_ids = np.array([row["id"] for row in busiest_rows])
+    standards = list(ts.determine_standards(cc, items).iloc[0, 1:])
+    last_player = db.query_db("SELECT MAX(id) FROM players", one=True)[0]
+    stats = SheetStats(ts.times_to_ms(wrs), ts.compile_standards(cc, items), ts.times_to_ms(pbs))
+    pb_ms = [int(t) for t in ts.times_to_ms(pbs)[:2]]
+    wr_pages = wr_page_fixtures()
+    for cc_page, page in wr_pages.items():
+        if outreach.parse_wrs_table(page) != parse_wrs_table_soup(page):
+            raise ValueError(f"WR parsers disagree on the {cc_page} page")
+
+    return {
+        "tracktime.parse_scalar_10k": lambda: [TrackTime(t) for t in time_strs],
+        "tracktime.parse_batch_10k": lambda: parse_times(time_strs),
+        "tracktime.format_scalar_10k": lambda: [TrackTime._format_ms(t) for t in time_ms.tolist()],
+        "tracktime.format_batch_10k": lambda: format_times(time_ms),
+        "tracktime.arithmetic": lambda: (a + b, a - b, a < b, a == "1:06.243"),
+        "timesheet.calculate_standard": lambda: ts.calculate_standard(a, standards),
+        "timesheet.create_timesheet_df": lambda: ts.create_timesheet_df(tracks, pbs, wrs, cc, items),
+        "timesheet.create_track_times_df": lambda: ts.create_track_times_df(busiest_secs),
+        "timesheet.create_track_chart_df": lambda: ts.create_track_chart_df(busiest_ms, busiest_ids),
+        "timesheet.calculate_sheet_stats": lambda: ts.calculate_sheet_stats(sheet),
+        "timesheet.create_display_records": lambda: ts.create_display_records(sheet),
+        "timesheet.aggregate_distributions": lambda: ts.aggregate_distributions(sheet["WRDiffNum"].to_numpy() * 1000,
+                                                                                sheet["StandardNum"].to_numpy()),
+        "sheet_stats.set_pb": lambda: (stats.set_pb(0, pb_ms[1]), stats.set_pb(0, pb_ms[0])),
+        "sheet_stats.summary": lambda: stats.summary(),
+        "outreach.parse_wrs_table_150cc": lambda: outreach.parse_wrs_table(wr_pages["150cc"]),
+        "outreach.parse_wrs_table_200cc": lambda: outreach.parse_wrs_table(wr_pages["200cc"]),
+        "outreach.parse_wrs_table_soup_150cc": lambda: parse_wrs_table_soup(wr_pages["150cc"]),
+        "db.get_best_times": lambda: db.get_best_times(cc, items),
+        "db.get_times_for_track": lambda: db.get_times_for_track(busiest, cc, items),
+        "db.get_times_page": lambda: db.get_times_page(busiest, cc, items, limit=db.TIMES_PAGE_SIZE + 1),
+        "db.get_recent_times": lambda: db.get_recent_times(db.RECENT_PAGE_SIZE + 1, before=2 ** 62),
+        "db.get_track_leaderboard": lambda: db.get_track_leaderboard(busiest, cc, items),
+        "db.get_track_position": lambda: db.get_track_position(last_player, busiest, cc, items),
+        "db.get_overall_position": lambda: db.get_overall_position(last_player, cc, items),
+        "route.timesheet": lambda: client.get(f"/timesheet?cc={cc}&items={items}"),
+        "route.timesheet_uncached": lambda: (webapp.TIMESHEET_CACHE.clear(), webapp.FRAGMENT_CACHE.clear(),
+                                             client.get(f"/timesheet?cc={cc}&items={items}")),
+        "route.api_timesheet": lambda: (webapp.API_CACHE.clear(), client.get(f"/api/timesheet?cc={cc}&items={items}")),
+        "route.api_timesheet_304": lambda: client.get(f"/api/timesheet?cc={cc}&items={items}", headers={
+            "If-None-Match": f'"v{db.get_data_version()}"'}),
+        "route.api_distribution": lambda: (webapp.API_CACHE.clear(), client.get(f"/api/distribution?cc={cc}&items={items}")),
+        "route.chart_cached": lambda: client.get(f"/chart/ranks.png?cc={cc}&items={items}"),
+        "route.track": lambda: client.get("/track", query_string={"track": busiest, "cc": cc, "items": items}),
+    }
+
+def run(attempts: int, name_filter: str | None = None, min_time: float = 0.2) -> dict:
+    """Build the synthetic db and run every benchmark.
+
+    Args:
+        attempts (int): Synthetic db size.
+        name_filter (str | None, optional): Only run benchmarks containing this text. Defaults to None.
+        min_time (float, optional): Minimum seconds per round. Defaults to 0.2.
+
+    Returns:
+        dict: Results document, ready to be saved as JSON.
+    """
+    build_db(attempts)
+    results = {}
+    for name, func in benchmarks().items():
+        if name_filter and name_filter not in name:
+            continue
+        results[name] = bench(func, min_time=min_time)
+        print(f"{name:<36} {results[name]['median'] * 1e6:12.1f} us")
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "attempts": attempts,
+            "rows": db.query_db("SELECT COUNT(*) FROM track_times", one=True)[0],
+        },
+        "results": results,
+    }
+
+def compare(old_path: str, new_path: str):
+    """Print the per-benchmark speedup between two results files.
+
+    Args:
+        old_path (str): Baseline results JSON.
+        new_path (str): New results JSON.
+    """
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    print(f"{'benchmark':<36} {'old (us)':>12} {'new (us)':>12} {'speedup':>8}")
+    for name in sorted(set(old["results"]) | set(new["results"])):
+        if name not in old["results"] or name not in new["results"]:
+            print(f"{name:<36} {'(missing in one file)':>34}")
+            continue
+        o, n = old["results"][name]["median"], new["results"][name]["median"]
+        print(f"{name:<36} {o * 1e6:12.1f} {n * 1e6:12.1f} {o / n:7.2f}x")
+#endregion
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--attempts", type=int, default=10000, help="synthetic db size (e.g. 10000 to 10000000)")
+    parser.add_argument("--out", help="results JSON path (default: benchmarks/results/<commit>_<attempts>.json)")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per timing round")
+    parser.add_argument("--startup", action="store_true", help="also run the startup benchmark")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit()
+
+    doc = run(args.attempts, args.filter, args.min_time)
+    if args.startup:
+        import startup
+        doc["startup"] = startup.run()
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{doc['meta']['commit'] or 'local'}_{args.attempts}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(doc, f, indent=2)
+    print(f"Results written to {out}")
@@ -0,0 +1,80 @@
+"""Startup-time benchmark. Times importing the app's entry points in fresh interpreters, which is
+what every worker restart and CLI invocation pays before doing any real work.
+
+Usage:
+    python benchmarks/startup.py [--runs N] [--importtime]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["TrackTime", "timesheet", "db", "app", "generate_times"]
+
+def time_import(module: str, runs: int = 5) -> dict:
+    """Time `import module` in a fresh interpreter, several times.
+
+    Args:
+        module (str): Module name, relative to the repo root.
+        runs (int, optional): Number of interpreters to start. Defaults to 5.
+
+    Returns:
+        dict: Wall times in seconds (`min`, `median`, `max`), including interpreter startup.
+    """
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], cwd=ROOT, check=True)
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "median": statistics.median(times), "max": max(times)}
+
+def heaviest_imports(module: str, n: int = 15) -> list:
+    """Use `-X importtime` to find the imports with the largest cumulative time.
+
+    Args:
+        module (str): Module name.
+        n (int, optional): Number of entries to return. Defaults to 15.
+
+    Returns:
+        list: `(cumulative_us, package)` tuples, largest first.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, check=True, capture_output=True, text=True
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, package = line[len("import time:"):].split("|")
+        entries.append((int(cumulative), package.strip()))
+    return sorted(entries, reverse=True)[:n]
+
+def run(runs: int = 5) -> dict:
+    """Run the startup benchmark for every module in `MODULES`.
+
+    Returns:
+        dict: Module name -> timings, see `time_import`.
+    """
+    baseline = time_import("sys", runs)
+    results = {"<interpreter>": baseline}
+    for module in MODULES:
+        results[module] = time_import(module, runs)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="interpreters to start per module")
+    parser.add_argument("--importtime", action="store_true", help="also list the heaviest imports of app")
+    args = parser.parse_args()
+
+    for module, t in run(args.runs).items():
+        print(f"{module:<16} median {t['median'] * 1000:8.1f} ms   min {t['min'] * 1000:8.1f} ms")
+
+    if args.importtime:
+        print("\nHeaviest imports for app (cumulative):")
+        for us, package in heaviest_imports("app"):
+            print(f"{us / 1000:8.1f} ms  {package}")
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+import threading
+
+class LRUCache:
+    """Small thread-safe least-recently-used cache with a bounded number of entries. Used for caching
+    computed page data; keys should include a data version (see `db.get_data_version`) so entries
+    for stale data are never hit and simply age out.
+    """
+
+    def __init__(self, maxsize: int = 32):
+        """Initialises an empty cache.
+
+        Args:
+            maxsize (int, optional): Maximum number of entries before the least recently used is
+                evicted. Defaults to 32.
+        """
+        if maxsize < 1:
+            raise ValueError("Cache size should be at least 1.")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=None):
+        """Get a value from the cache, marking it as recently used.
+
+        Args:
+            key (Hashable): Cache key.
+            default (optional): Returned if the key isn't cached. Defaults to None.
+        """
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: Hashable, value):
+        """Add or replace a value, evicting the least recently used entry if full.
+
+        Args:
+            key (Hashable): Cache key.
+            value: Value to cache.
+        """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]):
+        """Get a value from the cache, or compute and cache it on a miss. The computation runs
+        outside the lock, so two concurrent misses may both compute; the last one wins.
+
+        Args:
+            key (Hashable): Cache key.
+            compute (Callable[[], object]): Function producing the value.
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
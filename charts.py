@@ -0,0 +1,339 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+
+CHART_CACHE_DIR = "data/chart_cache"
+CHART_CACHE_MAX_BYTES = 64 * 1024 * 1024
+CHART_WORKERS = 2
+RENDER_TIMEOUT = 60         # Seconds
+CHART_VERSION = 2           # Bump when the drawing code changes, so cached images are re-rendered
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+DPI = 100
+
+#region Drawing
+# Each function draws one kind of chart from plain data (so the arguments can be sent to a worker
+# process) onto a new Agg figure. Figures are created directly rather than through pyplot, which keeps
+# no global state, so nothing needs closing and nothing can leak between renders.
+
+def _figure(width: float, height: float):
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(width, height), dpi=DPI, layout="constrained")
+    return fig, fig.subplots()
+
+def draw_wr_diffs(counts: list, bucket_ms: int = 1000):
+    """Histogram of the WR diffs, in seconds.
+
+    Args:
+        counts (list): Count per bucket, as `Distributions.diff_counts`.
+        bucket_ms (int, optional): Bucket width in ms. Defaults to 1000.
+    """
+    fig, ax = _figure(6, 4)
+    width = bucket_ms / 1000
+    ax.bar([i * width for i in range(len(counts))], counts, width=width, align="edge",
+           color="#4c72b0", edgecolor="white")
+    ax.set_xlabel("WR Diff (s)")
+    ax.set_ylabel("Count")
+    ax.grid(axis="y", alpha=0.3)
+    return fig
+
+def draw_ranks(counts: list, names: list, colours: list):
+    """Horizontal bar chart of the number of tracks in each standard.
+
+    Args:
+        counts (list): Count per standard.
+        names (list): Standard names, best first.
+        colours (list): Colour per standard.
+    """
+    fig, ax = _figure(6, max(3, 0.3 * len(names)))
+    ax.barh(names, counts, color=colours)
+    ax.invert_yaxis()                   # Best standard at the top
+    ax.set_xlabel("Count")
+    ax.grid(axis="x", alpha=0.3)
+    return fig
+
+def draw_track(track: str, pb_ms: int | None, wr_ms: int | None, cutoffs_ms: list, names: list, colours: list):
+    """The PB and WR of a track against the standards, drawn as shaded bands up to the PB's band.
+
+    Args:
+        track (str): Track name.
+        pb_ms (int | None): PB in ms.
+        wr_ms (int | None): WR in ms.
+        cutoffs_ms (list): Standards cut-offs in ms, best first (may be empty).
+        names (list): Standard names.
+        colours (list): Colour per standard.
+    """
+    fig, ax = _figure(8, 2.5)
+    points = [t / 1000 for t in (pb_ms, wr_ms) if t is not None]
+    cutoffs = [t / 1000 for t in cutoffs_ms]
+    if not points and not cutoffs:
+        ax.text(0.5, 0.5, "No times", ha="center", va="center", transform=ax.transAxes)
+        ax.set_axis_off()
+        return fig
+
+    # Each band is (previous cut-off, cut-off], and the first band starts at the WR. Stop after the
+    # band containing the PB, like the track page
+    pb = pb_ms / 1000 if pb_ms is not None else None
+    left = lower = min(points + cutoffs[:1]) - 0.5
+    for i, cutoff in enumerate(cutoffs):
+        ax.axvspan(lower, cutoff, facecolor=colours[i], alpha=0.5)
+        ax.text((lower + cutoff) / 2, 0.02, names[i], transform=ax.get_xaxis_transform(),
+                ha="center", va="bottom", rotation=90, fontsize=8)
+        lower = cutoff
+        if pb is None or cutoff >= pb:
+            break
+    right = max(points + [lower]) + 0.5
+
+    for value, label, marker in [(pb_ms, "PB", "D"), (wr_ms, "WR", "*")]:
+        if value is not None:
+            ax.plot([value / 1000], [0.5], marker=marker, markersize=10, color="k", linestyle="none", label=label,
+                    transform=ax.get_xaxis_transform())
+    ax.set_xlim(left, right)
+    ax.set_yticks([])
+    ax.set_xlabel("Time (s)")
+    ax.set_title(track)
+    ax.legend(loc="upper right")
+    return fig
+
+CHART_KINDS = {
+    "wr_diffs": draw_wr_diffs,
+    "ranks": draw_ranks,
+    "track": draw_track,
+}
+
+def render_chart(kind: str, fmt: str, data: dict) -> bytes:
+    """Render a chart to image bytes.
+
+    Args:
+        kind (str): Chart kind, a key of `CHART_KINDS`.
+        fmt (str): Image format, a key of `FORMATS`.
+        data (dict): Keyword arguments for the drawing function.
+
+    Raises:
+        ValueError: If the kind or format is not recognised.
+
+    Returns:
+        bytes: The image.
+    """
+    if kind not in CHART_KINDS or fmt not in FORMATS:
+        raise ValueError(f"Args not recognised: {kind}, {fmt}")
+    fig = CHART_KINDS[kind](**data)
+    buffer = io.BytesIO()
+    # No timestamps or software versions, so the same data gives the same bytes
+    metadata = {"Date": None} if fmt == "svg" else {"Software": None}
+    fig.savefig(buffer, format=fmt, metadata=metadata)
+    return buffer.getvalue()
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+    matplotlib.rcParams["svg.hashsalt"] = "charts"     # Stable SVG element ids
+#endregion
+
+#region Cache
+def chart_key(kind: str, fmt: str, data: dict) -> str:
+    """Content address of a chart: a hash of everything that goes into drawing it.
+
+    Args:
+        kind (str): Chart kind.
+        fmt (str): Image format.
+        data (dict): Keyword arguments for the drawing function. Must be JSON serialisable.
+
+    Returns:
+        str: Hex digest.
+    """
+    content = json.dumps([CHART_VERSION, kind, fmt, data], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(content.encode()).hexdigest()
+
+class ChartCache:
+    """Content-addressed disk cache of rendered images, bounded in total size. Files are named by
+    their `chart_key`, so an entry can never be stale: changed data simply has a different key, and
+    the old image ages out. Eviction is least recently used, using the file modification times (which
+    are bumped on every hit), so several processes can share the directory.
+    """
+
+    def __init__(self, directory: str = CHART_CACHE_DIR, max_bytes: int = CHART_CACHE_MAX_BYTES):
+        """Initialises a cache. The directory is created on first write.
+
+        Args:
+            directory (str, optional): Cache directory. Defaults to `CHART_CACHE_DIR`.
+            max_bytes (int, optional): Total size to evict down to. Defaults to `CHART_CACHE_MAX_BYTES`.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str, fmt: str) -> str:
+        return os.path.join(self.directory, f"{key}.{fmt}")
+
+    def get(self, key: str, fmt: str) -> bytes | None:
+        """Get a cached image, marking it as recently used.
+
+        Args:
+            key (str): Chart key.
+            fmt (str): Image format.
+
+        Returns:
+            bytes | None: The image, or None if it isn't cached.
+        """
+        path = self._path(key, fmt)
+        try:
+            with open(path, "rb") as f:
+                image = f.read()
+            os.utime(path)
+        except FileNotFoundError:   # Also if evicted between the read and the touch
+            self.misses += 1
+            return None
+        self.hits += 1
+        return image
+
+    def set(self, key: str, fmt: str, image: bytes):
+        """Add an image, then evict the least recently used images while over the size limit.
+
+        Args:
+            key (str): Chart key.
+            fmt (str): Image format.
+            image (bytes): The image.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key, fmt)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(image)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used images until the cache fits in `max_bytes`."""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def size(self) -> int:
+        """Total size of the cached images in bytes."""
+        if not os.path.isdir(self.directory):
+            return 0
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if not entry.name.endswith(".tmp"))
+#endregion
+
+#region Renderer
+class ChartRenderer:
+    """Renders charts in a pool of worker processes, so a slow matplotlib render doesn't hold up a
+    web worker's other requests (or the GIL), with the results kept in a `ChartCache`. Concurrent
+    requests for the same chart share one render.
+    """
+
+    def __init__(self, cache: ChartCache | None = None, workers: int = CHART_WORKERS, timeout: float = RENDER_TIMEOUT):
+        """Initialises a renderer. The worker processes are started on the first render.
+
+        Args:
+            cache (ChartCache | None, optional): Image cache. Defaults to a `ChartCache` with the default settings.
+            workers (int, optional): Number of worker processes. If 0, charts are rendered in the
+                calling thread. Defaults to `CHART_WORKERS`.
+            timeout (float, optional): Seconds to wait for a render. Defaults to `RENDER_TIMEOUT`.
+        """
+        self.cache = cache if cache is not None else ChartCache()
+        self.workers = workers
+        self.timeout = timeout
+        self._pool = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """The worker pool, started on first use. Under the lock, so concurrent first renders can't
+        each start one (and leak all but the last)."""
+        with self._lock:
+            if self._pool is None:
+                # Spawn rather than fork, since forking a threaded web server can deadlock
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_worker)
+            return self._pool
+
+    def render(self, kind: str, fmt: str, data: dict, key: str | None = None) -> bytes:
+        """Get a chart, from the cache if possible, otherwise rendering and caching it.
+
+        Args:
+            kind (str): Chart kind, a key of `CHART_KINDS`.
+            fmt (str): Image format, a key of `FORMATS`.
+            data (dict): Keyword arguments for the drawing function.
+            key (str | None, optional): The chart's `chart_key`, if already computed. Defaults to None.
+
+        Raises:
+            ValueError: If the kind or format is not recognised.
+
+        Returns:
+            bytes: The image.
+        """
+        if kind not in CHART_KINDS or fmt not in FORMATS:
+            raise ValueError(f"Args not recognised: {kind}, {fmt}")
+        key = key or chart_key(kind, fmt, data)
+        image = self.cache.get(key, fmt)
+        if image is not None:
+            return image
+
+        if self.workers == 0:
+            _init_worker()
+            image = render_chart(kind, fmt, data)
+            self.cache.set(key, fmt, image)
+            return image
+
+        with self._lock:
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._pending[key] = future
+        if not owner:
+            return future.result(self.timeout)
+
+        try:
+            pool = self._get_pool()
+            try:
+                image = pool.submit(render_chart, kind, fmt, data).result(self.timeout)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); start a fresh pool next time
+                with self._lock:
+                    if self._pool is pool:
+                        self._pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+            self.cache.set(key, fmt, image)
+            future.set_result(image)
+            return image
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+#endregion
@@ -0,0 +1,345 @@
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+import db
+from timesheet import CC_CATEGORIES, ITEM_OPTIONS, STANDARDS_NAMES, get_catalog
+from TrackTime import format_times
+
+EXPORT_DIR = "data/export"
+MANIFEST_FILE = "manifest.json"
+FORMAT_VERSION = 1
+FORMATS = ["npy", "parquet"]
+EXPORT_CHUNK_SIZE = 100000
+
+#region Schema
+def _code(column: str, categories: list) -> str:
+    """SQL expression mapping a text column to its 0-based category code."""
+    cases = " ".join(f"WHEN '{value}' THEN {i}" for i, value in enumerate(categories))
+    return f"CASE {column} {cases} END"
+
+# Table -> (query, columns) for the tables read from the db. Columns are `(name, dtype, categories)`:
+# categorical columns hold integer codes into the named category list (see `_categories`), and
+# `"str"` columns are stored as fixed-width strings. Times are integer ms
+DB_TABLES = {
+    "track_times": (f"""
+        SELECT tt.id, tt.player_id, t.tr_number - 1, CAST(ROUND(tt.time_sec * 1000) AS INTEGER),
+            {_code("tt.cc", CC_CATEGORIES)}, {_code("tt.items", ITEM_OPTIONS)}
+        FROM track_times tt
+        JOIN tracks t ON t.tr_name = tt.track
+        ORDER BY tt.id
+    """, [("id", "int64", None), ("player_id", "int32", None), ("track", "int16", "track"),
+          ("time_ms", "int32", None), ("cc", "int8", "cc"), ("items", "int8", "items")]),
+    "personal_bests": (f"""
+        SELECT pb.player_id, {_code("pb.cc", CC_CATEGORIES)}, {_code("pb.items", ITEM_OPTIONS)},
+            t.tr_number - 1, pb.time_id, CAST(ROUND(pb.time_sec * 1000) AS INTEGER)
+        FROM personal_bests pb
+        JOIN tracks t ON t.tr_name = pb.track
+        ORDER BY pb.player_id, pb.cc, pb.items, t.tr_number
+    """, [("player_id", "int32", None), ("cc", "int8", "cc"), ("items", "int8", "items"),
+          ("track", "int16", "track"), ("time_id", "int64", None), ("time_ms", "int32", None)]),
+    "players": ("""
+        SELECT id, name FROM players ORDER BY id
+    """, [("id", "int32", None), ("name", "str", None)]),
+    "wr_snapshots": (f"""
+        SELECT {_code("w.cc", CC_CATEGORIES)}, {_code("w.items", ITEM_OPTIONS)}, t.tr_number - 1,
+            CAST(strftime('%s', w.fetched_at) AS INTEGER), w.source_name, w.time_ms
+        FROM wr_snapshots w
+        JOIN tracks t ON t.tr_name = w.track
+        ORDER BY w.fetched_at, w.cc, w.items, t.tr_number
+    """, [("cc", "int8", "cc"), ("items", "int8", "items"), ("track", "int16", "track"),
+          ("fetched_at", "datetime64[s]", None), ("source_name", "str", None), ("time_ms", "int32", None)]),
+}
+
+# The current WRs and standards come from the track catalog rather than the db
+CATALOG_TABLES = {
+    "wrs": [("cc", "int8", "cc"), ("items", "int8", "items"), ("track", "int16", "track"), ("time_ms", "int32", None)],
+    "standards": [("cc", "int8", "cc"), ("items", "int8", "items"), ("track", "int16", "track"),
+                  ("rank", "int8", "rank"), ("cutoff_ms", "int32", None)],
+}
+
+def _categories() -> dict:
+    return {"track": list(get_catalog().names), "cc": CC_CATEGORIES, "items": ITEM_OPTIONS, "rank": STANDARDS_NAMES}
+#endregion
+
+#region Export
+def _save(path: str, values, dtype: str) -> np.ndarray:
+    array = np.asarray(values, dtype=dtype if dtype != "str" else str)
+    if dtype == "str" and array.size == 0:
+        array = array.astype("U1")
+    np.save(path, array)
+    return array
+
+def _export_query(conn, directory: str, query: str, columns: list) -> int:
+    """Write one table's columns as `.npy` files. Numeric columns are filled in place on disk a chunk
+    at a time, so memory use doesn't grow with the table."""
+    os.makedirs(directory)
+    paths = [os.path.join(directory, f"{name}.npy") for name, _, _ in columns]
+    n = conn.execute(f"SELECT COUNT(*) FROM ({query})").fetchone()[0]
+    cur = conn.cursor()
+    cur.row_factory = None      # Plain tuples
+    cur.execute(query)
+
+    if n == 0 or any(dtype == "str" for _, dtype, _ in columns):
+        # Small tables (or ones with text, which need their width known first): in one go
+        values = list(zip(*cur.fetchall())) or [[] for _ in columns]
+        for path, (_, dtype, _), col in zip(paths, columns, values):
+            _save(path, col, dtype)
+        return n
+
+    outputs = [np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(n,))
+               for path, (_, dtype, _) in zip(paths, columns)]
+    start = 0
+    while rows := cur.fetchmany(EXPORT_CHUNK_SIZE):
+        block = np.array(rows, dtype=np.int64)
+        for j, output in enumerate(outputs):
+            output[start:start + len(rows)] = block[:, j]
+        start += len(rows)
+    for output in outputs:
+        output.flush()
+    return n
+
+def _export_catalog(directory: str) -> dict:
+    """Write the current WRs and standards tables. Returns table -> row count."""
+    catalog = get_catalog()
+    tables = {"wrs": [], "standards": []}
+    for cc_code, cc in enumerate(CC_CATEGORIES):
+        for items_code, items in enumerate(ITEM_OPTIONS):
+            wrs = catalog.wrs_ms(cc, items)
+            if wrs is not None:
+                tracks = np.arange(len(wrs))
+                tables["wrs"].append([np.full(len(wrs), cc_code), np.full(len(wrs), items_code), tracks, wrs])
+            standards = catalog.standards(cc, items)
+            if standards is not None:
+                tracks, ranks = np.indices(standards.cutoffs.shape)
+                size = standards.cutoffs.size
+                tables["standards"].append([np.full(size, cc_code), np.full(size, items_code),
+                                            tracks.ravel(), ranks.ravel(), standards.cutoffs.ravel()])
+
+    counts = {}
+    for table, parts in tables.items():
+        columns = CATALOG_TABLES[table]
+        os.makedirs(os.path.join(directory, table))
+        for j, (name, dtype, _) in enumerate(columns):
+            values = np.concatenate([part[j] for part in parts]) if parts else []
+            _save(os.path.join(directory, table, f"{name}.npy"), values, dtype)
+        counts[table] = sum(len(part[0]) for part in parts)
+    return counts
+
+def _write_parquet(directory: str, manifest: dict):
+    """Convert each exported table to a Parquet file, with categorical columns dictionary-encoded.
+    Requires `pyarrow`."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    categories = manifest["categories"]
+    for table, info in manifest["tables"].items():
+        arrays = load_arrays(directory, table, mmap=True)
+        fields = {}
+        for name, col in info["columns"].items():
+            if col["categories"] is not None:
+                fields[name] = pa.DictionaryArray.from_arrays(pa.array(arrays[name]),
+                                                              pa.array(categories[col["categories"]]))
+            else:
+                fields[name] = pa.array(arrays[name])
+        pq.write_table(pa.table(fields), os.path.join(directory, f"{table}.parquet"))
+        del arrays
+        shutil.rmtree(os.path.join(directory, table))
+
+def export_dataset(path: str = EXPORT_DIR, fmt: str = "npy") -> dict:
+    """Export the times, PBs, players and WR history from the db, plus the current WRs and standards,
+    to a columnar dataset for offline analysis (see `load_table`). Columns are typed: times are
+    integer ms, and tracks, CCs, item types and standards are categorical.
+
+    The db tables are read in a single transaction, so the dataset is a consistent snapshot even
+    while the app is writing. The dataset is written next to `path` and then moved into place,
+    replacing any previous export.
+
+    Args:
+        path (str, optional): Dataset directory. Defaults to `EXPORT_DIR`.
+        fmt (str, optional): `"npy"` (one memory-mappable `.npy` file per column) or `"parquet"`
+            (one file per table, requires `pyarrow`). Defaults to `"npy"`.
+
+    Raises:
+        ValueError: If the format is not recognised.
+
+    Returns:
+        dict: The dataset manifest.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Args not recognised: {fmt}")
+
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    tables = {}
+
+    conn = db.get_db()
+    conn.execute("BEGIN")
+    try:
+        version = conn.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()[0]
+        for table, (query, columns) in DB_TABLES.items():
+            tables[table] = _export_query(conn, os.path.join(tmp_path, table), query, columns)
+    finally:
+        conn.commit()
+    tables.update(_export_catalog(tmp_path))
+
+    all_columns = {**{table: columns for table, (_, columns) in DB_TABLES.items()}, **CATALOG_TABLES}
+    manifest = {
+        "version": FORMAT_VERSION,
+        "format": fmt,
+        "exported_at": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        "data_version": int(version),
+        "categories": _categories(),
+        "tables": {
+            table: {
+                "rows": rows,
+                "columns": {name: {"dtype": dtype, "categories": cats} for name, dtype, cats in all_columns[table]},
+            }
+            for table, rows in tables.items()
+        },
+    }
+    if fmt == "parquet":
+        _write_parquet(tmp_path, manifest)
+    with open(os.path.join(tmp_path, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(path):
+        old_path = f"{path}.old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path)
+    else:
+        os.replace(tmp_path, path)
+    return manifest
+#endregion
+
+#region Load
+def read_manifest(path: str = EXPORT_DIR) -> dict:
+    """Read a dataset's manifest: its format, tables, row counts, column types and categories."""
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        return json.load(f)
+
+def load_arrays(path: str, table: str, mmap: bool = True) -> dict:
+    """Load a table of an `npy` dataset as raw NumPy arrays, with categorical columns as their codes
+    (see the manifest for the categories).
+
+    Args:
+        path (str): Dataset directory.
+        table (str): Table name.
+        mmap (bool, optional): If true, the arrays are read-only memory maps of the files, so nothing
+            is read until it's used and the OS can share the pages between processes. Defaults to True.
+
+    Returns:
+        dict: Column name -> array.
+    """
+    directory = os.path.join(path, table)
+    arrays = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".npy"):
+            arrays[name[:-4]] = np.load(os.path.join(directory, name), mmap_mode="r" if mmap else None)
+    return arrays
+
+def load_table(path: str = EXPORT_DIR, table: str = "track_times", columns: list = None,
+               mmap: bool = True) -> DataFrame:
+    """Load a table of a dataset as a DataFrame, with categorical columns as `pd.Categorical`.
+
+    For `npy` datasets the numeric columns are memory-mapped and wrapped without copying. For
+    `parquet` datasets the file is memory-mapped and converted with `pyarrow`.
+
+    Args:
+        path (str, optional): Dataset directory. Defaults to `EXPORT_DIR`.
+        table (str, optional): Table name. Defaults to `"track_times"`.
+        columns (list, optional): Columns to load. Defaults to None (all).
+        mmap (bool, optional): If true, memory-map the files. Defaults to True.
+
+    Raises:
+        ValueError: If the table isn't in the dataset.
+
+    Returns:
+        DataFrame: The table.
+    """
+    manifest = read_manifest(path)
+    if table not in manifest["tables"]:
+        raise ValueError(f"Table not in dataset: {table}")
+    info = manifest["tables"][table]["columns"]
+    columns = list(info) if columns is None else columns
+
+    if manifest["format"] == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_table(os.path.join(path, f"{table}.parquet"), columns=columns, memory_map=mmap).to_pandas()
+
+    arrays = load_arrays(path, table, mmap)
+    data = {}
+    for name in columns:
+        cats = info[name]["categories"]
+        if cats is not None:
+            data[name] = pd.Categorical.from_codes(arrays[name], categories=manifest["categories"][cats])
+        else:
+            data[name] = arrays[name]
+    return DataFrame(data, copy=False)
+#endregion
+
+#region Import
+def import_dataset(path: str = EXPORT_DIR, defer_indexes: bool | None = None) -> dict:
+    """Load a dataset's players, times and WR history into the db, e.g. to restore an export or move
+    it to another machine. Rows that already exist are skipped. The PB tables are rebuilt from the
+    times by the triggers, and time strings are re-formatted from the ms times (`M:SS.sss`).
+
+    Args:
+        path (str, optional): Dataset directory. Defaults to `EXPORT_DIR`.
+        defer_indexes (bool | None, optional): See `db.import_times`. Defaults to None (only for
+            large datasets).
+
+    Returns:
+        dict: Times import stats (see `db.import_times`), plus `players` and `wr_snapshots` added.
+    """
+    players = load_table(path, "players")
+    db.add_players(zip(players["id"].tolist(), players["name"].tolist()))
+
+    times = load_table(path, "track_times")
+    if defer_indexes is None:
+        defer_indexes = len(times) >= EXPORT_CHUNK_SIZE
+
+    def rows():
+        for start in range(0, len(times), EXPORT_CHUNK_SIZE):
+            part = times.iloc[start:start + EXPORT_CHUNK_SIZE]
+            ms = part["time_ms"].to_numpy()
+            yield from zip(part["track"].astype(str).tolist(), format_times(ms).tolist(), (ms / 1000).tolist(),
+                           part["cc"].astype(str).tolist(), part["items"].astype(str).tolist(),
+                           part["player_id"].tolist())
+
+    stats = db.import_times(rows(), prepared=True, defer_indexes=defer_indexes)
+    stats["players"] = len(players)
+
+    wrs = load_table(path, "wr_snapshots")
+    stats["wr_snapshots"] = db.import_wr_snapshots(zip(
+        wrs["cc"].astype(str).tolist(), wrs["items"].astype(str).tolist(), wrs["track"].astype(str).tolist(),
+        pd.Series(wrs["fetched_at"]).dt.strftime("%Y-%m-%d %H:%M:%S").tolist(), wrs["source_name"].tolist(),
+        format_times(wrs["time_ms"].to_numpy()).tolist(), wrs["time_ms"].tolist(),
+    ))
+    return stats
+#endregion
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the db to a columnar dataset, or import one.")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", nargs="?", default=EXPORT_DIR)
+    parser.add_argument("--format", choices=FORMATS, default="npy", help="export format")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        manifest = export_dataset(args.path, args.format)
+        for table, info in manifest["tables"].items():
+            print(f"{table}: {info['rows']} rows")
+    else:
+        stats = import_dataset(args.path)
+        db.print_import_stats(stats)
+        print(f"{stats['players']} players, {stats['wr_snapshots']} WR snapshots added.")
@@ -1,31 +1,339 @@
+from collections.abc import Callable, Iterable
 import csv
+from datetime import date, datetime, timezone
+from functools import lru_cache
+import glob
+from itertools import islice
+import os
+from queue import Empty, Full, LifoQueue
+import re
 import sqlite3
 from sqlite3 import Connection
+import sys
+import threading
+import time
 
+from flask import Flask, g, has_app_context
+
+from profiling import add_time, timed
 from timesheet import CC_CATEGORIES, ITEM_OPTIONS
-from TrackTime import TrackTime
+from TrackTime import MISSING_MS, TrackTime, parse_times
 
 DB_FILE = "track_times.db"
+POOL_SIZE = 8
+STATEMENT_CACHE_SIZE = 256
+IMPORT_CHUNK_SIZE = 50000
+DEFAULT_PLAYER = 1
+TIMES_PAGE_SIZE = 50        # Rows per page of a track's times, see `get_times_page`
+RECENT_PAGE_SIZE = 10       # Rows per page of the recent times, see `get_recent_times`
+BASE_TABLES = ["tracks", "players", "track_times", "wr_snapshots"]  # Tables that hold data, see `rebuild_db`
+SLOW_QUERY_MS = 100
+FULL_SCAN_TABLES = ("track_times",)  # Tables that `EXPLAIN QUERY PLAN` checks flag full scans of
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -20000,       # Negative is KiB, so ~20 MB of page cache
+    "mmap_size": 268435456,     # 256 MB
+    "temp_store": "MEMORY",
+}
 
-def get_db() -> Connection:
-    """Get the db connection.
+_time_listeners = []        # Called after `insert_time` / `delete_time`, see `add_time_listener`
+_pools = {}                 # DB path -> LifoQueue of idle connections, for app contexts
+_pools_lock = threading.Lock()
+_local = threading.local()  # DB path -> connection, for code outside an app context
 
-    See: https://flask.palletsprojects.com/en/stable/patterns/sqlite3/
+#region Query instrumentation
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PARAM_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+_NOT_ALIASES = {"WHERE", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "NATURAL", "ON", "USING",
+                "INDEXED", "NOT", "GROUP", "ORDER", "LIMIT", "WINDOW", "UNION", "EXCEPT", "INTERSECT",
+                "SET", "VALUES", "DEFAULT", "RETURNING"}
+
+@lru_cache(maxsize=1024)
+def normalise_query(sql: str) -> str:
+    """Normalise a statement so that the same query with different literals or parameter list
+    lengths is counted once: whitespace is collapsed, literals replaced by `?`, and lists of
+    parameters by `(...)`.
+
+    Args:
+        sql (str): SQL statement.
+
+    Returns:
+        str: Normalised statement.
+    """
+    sql = _LITERALS.sub("?", _WHITESPACE.sub(" ", sql).strip())
+    return _PARAM_LISTS.sub("(...)", sql)
+
+def _call_site() -> str:
+    """The code that ran the current statement: the first frame outside the instrumentation (and
+    `query_db`)."""
+    frame = sys._getframe(3)
+    while frame.f_back is not None and frame.f_code in _INTERNAL_CODE:
+        frame = frame.f_back
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+
+def _table_names(sql: str, table: str) -> set:
+    """The table's name and any aliases it has in a statement, as they appear in query plans."""
+    names = {table}
+    for match in re.finditer(rf"\b{table}\b(?:\s+(?:AS\s+)?(\w+))?", sql, re.IGNORECASE):
+        alias = match.group(1)
+        if alias and alias.upper() not in _NOT_ALIASES:
+            names.add(alias)
+    return names
+
+class QueryLog:
+    """Records every statement run on the db's connections: calls, time and rows per normalised
+    statement and call site, a log of slow statements, and optionally the query plan of every
+    distinct statement, flagging full scans of large tables (see `FULL_SCAN_TABLES`). Thread safe.
+
+    Times are the `execute` call, plus fetching the rows for `query_db`. Rows are those fetched for
+    `query_db`, or changed for writes (-1 if unknown).
+    """
+
+    def __init__(self, slow_ms: float = SLOW_QUERY_MS, path: str | None = None, explain: bool = False):
+        """Initialises a query log.
+
+        Args:
+            slow_ms (float, optional): Statements at least this slow are logged. Defaults to
+                `SLOW_QUERY_MS`.
+            path (str | None, optional): File to append the slow query log to. Defaults to stderr.
+            explain (bool, optional): Check the query plan of each distinct statement. Defaults to False.
+        """
+        self.configure(slow_ms, path, explain)
+        self._stats = {}
+        self.plans = {}
+        self._lock = threading.Lock()
+
+    def configure(self, slow_ms: float = SLOW_QUERY_MS, path: str | None = None, explain: bool = False):
+        """Change the settings (see `__init__`)."""
+        self.slow_ms = slow_ms
+        self.path = path
+        self.explain = explain
+
+    def record(self, conn: Connection, sql: str, args, seconds: float, rows: int):
+        """Record a statement that has been run.
+
+        Args:
+            conn (Connection): Connection it ran on, for `EXPLAIN QUERY PLAN`.
+            sql (str): SQL statement.
+            args: Its parameters, or None if it can't be explained with them (`executemany`).
+            seconds (float): Time taken.
+            rows (int): Rows fetched or changed.
+        """
+        query = normalise_query(sql)
+        site = _call_site()
+        with self._lock:
+            entry = self._stats.get((query, site))
+            if entry is None:
+                entry = self._stats[(query, site)] = [0, 0.0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3] += max(rows, 0)
+            explain = self.explain and query not in self.plans
+            if explain:
+                self.plans[query] = None    # Claimed, so other threads don't explain it too
+        add_time("sql", seconds)
+
+        if seconds * 1000 >= self.slow_ms:
+            self._log(f"{datetime.now():%Y-%m-%d %H:%M:%S} {seconds * 1000:.1f} ms rows={rows} {site} | {query}")
+        if explain:
+            self._explain(conn, sql, query, args, site)
+
+    def _explain(self, conn: Connection, sql: str, query: str, args, site: str):
+        plan, scans = [], []
+        if args is not None and sql.lstrip().upper().startswith(_EXPLAINABLE):
+            try:
+                plan = [row[3] for row in Connection.execute(conn, f"EXPLAIN QUERY PLAN {sql}", args)]
+            except sqlite3.Error as e:
+                plan = [f"EXPLAIN failed: {e}"]
+            for table in FULL_SCAN_TABLES:
+                names = _table_names(sql, table)
+                scans += [detail for detail in plan
+                          if detail.startswith("SCAN ") and detail.split()[1] in names and "INDEX" not in detail]
+        with self._lock:
+            self.plans[query] = {"plan": plan, "full_scans": scans, "site": site}
+        if scans:
+            self._log(f"{datetime.now():%Y-%m-%d %H:%M:%S} FULL SCAN ({'; '.join(scans)}) {site} | {query}")
+
+    def _log(self, line: str):
+        if self.path is None:
+            print(line, file=sys.stderr)
+            return
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def summary(self) -> list:
+        """Stats per normalised statement and call site, slowest in total first.
+
+        Returns:
+            list: Dicts of query, site, calls, total_ms, mean_ms, max_ms and rows.
+        """
+        with self._lock:
+            items = list(self._stats.items())
+        out = [{
+            "query": query, "site": site, "calls": calls, "total_ms": total * 1000,
+            "mean_ms": total / calls * 1000, "max_ms": longest * 1000, "rows": rows,
+        } for (query, site), (calls, total, longest, rows) in items]
+        return sorted(out, key=lambda q: q["total_ms"], reverse=True)
+
+    def full_scans(self) -> dict:
+        """Normalised statement -> plan info, for the statements with flagged full scans."""
+        with self._lock:
+            return {query: info for query, info in self.plans.items() if info and info["full_scans"]}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.plans.clear()
+
+QUERY_LOG = QueryLog()
+
+class InstrumentedConnection(Connection):
+    """Connection that records every statement it runs in `QUERY_LOG`."""
+
+    def execute(self, sql: str, parameters=(), /):
+        start = time.perf_counter()
+        cur = super().execute(sql, parameters)
+        QUERY_LOG.record(self, sql, parameters, time.perf_counter() - start, cur.rowcount)
+        return cur
+
+    def executemany(self, sql: str, parameters, /):
+        start = time.perf_counter()
+        cur = super().executemany(sql, parameters)
+        QUERY_LOG.record(self, sql, None, time.perf_counter() - start, cur.rowcount)
+        return cur
+
+    def executescript(self, script: str, /):
+        start = time.perf_counter()
+        cur = super().executescript(script)
+        QUERY_LOG.record(self, script, None, time.perf_counter() - start, -1)
+        return cur
+
+    def query(self, sql: str, parameters=()) -> list:
+        """Run a statement and fetch all of its rows, timing both."""
+        start = time.perf_counter()
+        cur = super().execute(sql, parameters)
+        rows = cur.fetchall()
+        cur.close()
+        QUERY_LOG.record(self, sql, parameters, time.perf_counter() - start, len(rows))
+        return rows
+#endregion
+
+#region Connections
+def _connect(path: str, shared: bool = False) -> Connection:
+    """Open a new connection with the row factory, statement cache and pragmas set.
+
+    Args:
+        path (str): DB file path.
+        shared (bool, optional): If true, the connection may be handed between threads (one at a
+            time) by the pool. Defaults to False.
 
     Returns:
         Connection: Connection object.
     """
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(path, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=not shared,
+                           factory=InstrumentedConnection)
     conn.row_factory = sqlite3.Row
+    for pragma, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
     return conn
 
-def close_db(conn: Connection):
-    """Close the db connection.
+def _get_pool(path: str) -> LifoQueue:
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = LifoQueue(maxsize=POOL_SIZE)
+        return _pools[path]
+
+def get_db() -> Connection:
+    """Get the db connection. Connections are reused rather than opened per query:
+    - Inside a Flask app context, a connection is checked out of a small pool on first use and
+      returned when the context is torn down (see `init_app`).
+    - Otherwise, each thread keeps one connection open per DB file.
+
+    See: https://flask.palletsprojects.com/en/stable/patterns/sqlite3/
+
+    Returns:
+        Connection: Connection object.
+    """
+    if has_app_context():
+        conn = g.get("_db_conn")
+        if conn is None:
+            try:
+                conn = _get_pool(DB_FILE).get_nowait()
+            except Empty:
+                conn = _connect(DB_FILE, shared=True)
+            g._db_conn = conn
+            g._db_path = DB_FILE
+        return conn
+
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    if DB_FILE not in conns:
+        conns[DB_FILE] = _connect(DB_FILE)
+    return conns[DB_FILE]
+
+def release_db(exception: BaseException | None = None):
+    """Return the app context's connection to the pool. Any transaction left open (e.g. by an
+    exception mid-request) is rolled back first. Registered as an app context teardown by
+    `init_app`.
 
     Args:
-        conn (Connection): Connection object.
+        exception (BaseException | None, optional): Exception that ended the context, if any.
+    """
+    conn = g.pop("_db_conn", None)
+    path = g.pop("_db_path", DB_FILE)
+    if conn is None:
+        return
+    if conn.in_transaction:
+        conn.rollback()
+    try:
+        _get_pool(path).put_nowait(conn)
+    except Full:
+        conn.close()
+
+def close_db(conn: Connection | None = None):
+    """Close db connections held by the current thread (and app context, if any), or only the given
+    connection. Closed connections are reopened by the next `get_db`.
+
+    Args:
+        conn (Connection | None, optional): Connection object. Defaults to all of this thread's.
+    """
+    if has_app_context() and g.get("_db_conn") is not None and conn in (None, g._db_conn):
+        g.pop("_db_conn").close()
+        g.pop("_db_path", None)
+
+    conns = getattr(_local, "conns", {})
+    for path, c in list(conns.items()):
+        if conn is None or c is conn:
+            c.close()
+            del conns[path]
+
+def close_all():
+    """Close this thread's connections and every idle pooled connection, e.g. at shutdown or before
+    replacing the DB file."""
+    close_db()
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        while True:
+            try:
+                pool.get_nowait().close()
+            except Empty:
+                break
+
+def init_app(app: Flask):
+    """Register the connection pool with a Flask app.
+
+    Args:
+        app (Flask): The app.
     """
-    conn.close()
+    app.teardown_appcontext(release_db)
+#endregion
 
 def query_db(query: str, args: tuple = (), one: bool = False) -> tuple:
     """Function for interacting with the db given a query and optional arguments.
@@ -38,20 +346,152 @@ def query_db(query: str, args: tuple = (), one: bool = False) -> tuple:
     Returns:
         tuple: Result of the query.
     """
-    conn = get_db()
-    cur = conn.execute(query, args)
-    rows = cur.fetchall()
-    cur.close()
-    close_db(conn)
+    rows = get_db().query(query, args)
     return (rows[0] if rows else None) if one else rows
 
+# Frames skipped when finding a statement's call site
+_INTERNAL_CODE = {f.__code__ for f in (InstrumentedConnection.execute, InstrumentedConnection.executemany,
+                                       InstrumentedConnection.executescript, InstrumentedConnection.query,
+                                       query_db)}
+
+@timed()
+def get_data_version() -> int:
+    """Get the data version, which increases every time the times table is written to (or the WRs
+    are refreshed, see `bump_data_version`). Stored in the db so that it is shared between worker
+    processes.
+
+    Returns:
+        int: Data version.
+    """
+    row = query_db("SELECT value FROM meta WHERE key = 'data_version'", one=True)
+    return row[0] if row else 0
+
+def _bump_data_version(conn: Connection) -> int:
+    """Increment the data version as part of the connection's current transaction.
+
+    Args:
+        conn (Connection): Connection object.
+
+    Returns:
+        int: The new data version.
+    """
+    row = conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'data_version' RETURNING value").fetchone()
+    return row[0] if row else 0
+
+def bump_data_version() -> int:
+    """Increment the data version on its own, e.g. when reference data that computed pages depend on
+    has changed. Invalidates everything cached by data version.
+
+    Returns:
+        int: The new data version.
+    """
+    conn = get_db()
+    version = _bump_data_version(conn)
+    conn.commit()
+    return version
+
+def claim_task(name: str, interval: float) -> bool:
+    """Claim a periodic task's current run, so with several worker processes only one of them runs
+    it each interval. The time of the last run is kept in `meta` and claimed with a single
+    conditional update, so exactly one claimant wins.
+
+    Args:
+        name (str): Task name.
+        interval (float): Seconds between runs. A second of slack allows for timer jitter.
+
+    Returns:
+        bool: True if claimed, False if another process ran it within the interval.
+    """
+    now_ms = int(time.time() * 1000)
+    key = f"{name}_claimed_at"
+    conn = get_db()
+    conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, 0)", (key,))
+    claimed = conn.execute("UPDATE meta SET value = ? WHERE key = ? AND value <= ?",
+                           (now_ms, key, now_ms - int(interval * 1000) + 1000)).rowcount
+    conn.commit()
+    return claimed == 1
+
+def add_time_listener(listener: Callable[[int, str, str, str, int], None]):
+    """Register a function to be called after a single time is inserted or deleted (by `insert_time`
+    or `delete_time`), once the change is committed. Lets in-memory state be updated for just the
+    affected track rather than rebuilt. Bulk imports don't notify listeners, so listeners should
+    also watch for the data version jumping by more than one.
+
+    Args:
+        listener (Callable[[int, str, str, str, int], None]): Called with the `player_id`, `cc`,
+            `items` and `track` of the time, and the new data version.
+    """
+    _time_listeners.append(listener)
+
+def _notify_time_listeners(player_id: int, cc: str, items: str, track: str, version: int):
+    for listener in _time_listeners:
+        listener(player_id, cc, items, track, version)
+
 def init_db():
     """Initialise the db based on the schema file."""
     conn = get_db()
     with open("schema.sql", "r") as f:
         conn.executescript(f.read())
     conn.commit()
-    close_db(conn)
+
+def rebuild_db():
+    """Re-create an existing db from the schema file while keeping its data, e.g. to pick up new
+    columns, indexes, tables or triggers. The base tables are renamed out of the way, the schema is
+    applied, and the columns each old table shares with its new version are copied back (which also
+    repopulates the PB and leaderboard tables through the triggers). New columns take their defaults.
+    """
+    with open("schema.sql", "r") as f:     # Before renaming anything, so a missing file loses nothing
+        schema = f.read()
+    conn = get_db()
+    existing = {row["name"] for row in query_db("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    tables = [table for table in BASE_TABLES if table in existing]
+
+    for table in tables:
+        conn.execute(f"DROP TABLE IF EXISTS _old_{table}")
+        conn.execute(f"ALTER TABLE {table} RENAME TO _old_{table}")
+    conn.commit()
+    conn.executescript(schema)
+
+    conn.execute("BEGIN")
+    for table in tables:
+        new_cols = [row["name"] for row in query_db(f"PRAGMA table_info({table})")]
+        old_cols = {row["name"] for row in query_db(f"PRAGMA table_info(_old_{table})")}
+        cols = ", ".join(col for col in new_cols if col in old_cols)
+        # Copy in insertion order, or key order for tables without a rowid
+        sql = query_db("SELECT sql FROM sqlite_master WHERE name = ?", (f"_old_{table}",), one=True)["sql"]
+        order = "" if "WITHOUT ROWID" in sql.upper() else " ORDER BY rowid"
+        conn.execute(f"INSERT OR REPLACE INTO {table} ({cols}) SELECT {cols} FROM _old_{table}{order}")
+        conn.execute(f"DROP TABLE _old_{table}")
+    conn.commit()
+
+def rebuild_personal_bests():
+    """Recompute the `personal_bests` and `player_totals` tables from scratch. The triggers keep them
+    in sync normally, so this is only needed if they were modified directly, or after a bulk import
+    with deferred indexes. Relies on SQLite taking bare columns from the `MIN()` row, which lets the
+    grouping walk the covering index without a sort. The totals are refilled by the triggers on
+    `personal_bests`."""
+    conn = get_db()
+    conn.executescript("""
+        BEGIN;
+        UPDATE meta SET value = value + 1 WHERE key = 'data_version';
+        DELETE FROM personal_bests;
+        DELETE FROM player_totals;
+        INSERT INTO personal_bests (player_id, cc, items, track, time_id, time_str, time_sec)
+            SELECT player_id, cc, items, track, id, time_str, MIN(time_sec)
+            FROM track_times
+            GROUP BY player_id, cc, items, track;
+        COMMIT;
+    """)
+
+def add_players(players: Iterable[tuple]):
+    """Add players to the players table, ignoring any ids or names that already exist.
+
+    Args:
+        players (Iterable[tuple]): `(id, name)` pairs.
+    """
+    conn = get_db()
+    conn.executemany("INSERT OR IGNORE INTO players (id, name) VALUES (?, ?)", players)
+    conn.commit()
 
 def init_tracks_from_csv(path: str):
     """Insert track information into the table given a CSV file path.
@@ -68,9 +508,124 @@ def init_tracks_from_csv(path: str):
             tracks
         )
     conn.commit()
-    close_db(conn)
 
-def init_times_from_csv(path: str, cc: str = "150cc", items: str = "Shrooms"):
+#region Bulk import
+def _prepare_times_chunk(chunk: list, cc: str | None, items: str | None, tracks: set,
+                         player_id: int = DEFAULT_PLAYER) -> list:
+    """Validate and convert a chunk of raw CSV rows into `track_times` rows. Times are parsed for the
+    whole chunk at once, and invalid rows are dropped.
+
+    Args:
+        chunk (list): Raw rows, `(track, time_str)` if `cc` is given, else `(track, time_str, cc, items)`.
+        cc (str | None): CC for every row, or None to read it from the rows.
+        items (str | None): Item type for every row, or None to read it from the rows.
+        tracks (set): Known track names. If empty, track names aren't checked.
+        player_id (int, optional): Player the times belong to. Defaults to `DEFAULT_PLAYER`.
+
+    Returns:
+        list: Rows in the format `(track, time_str, time_sec, cc, items, player_id)`.
+    """
+    width = 2 if cc is not None else 4
+    chunk = [[field.strip() for field in row] for row in chunk if len(row) >= width]
+    times_ms = parse_times([row[1] for row in chunk], fill=MISSING_MS)
+
+    out = []
+    for row, ms in zip(chunk, times_ms.tolist()):
+        row_cc, row_items = (cc, items) if cc is not None else (row[2], row[3])
+        if ms == MISSING_MS or row_cc not in CC_CATEGORIES or row_items not in ITEM_OPTIONS:
+            continue
+        if tracks and row[0] not in tracks:
+            continue
+        out.append((row[0], row[1], ms / 1000, row_cc, row_items, player_id))
+    return out
+
+def import_times(rows: Iterable, cc: str | None = None, items: str | None = None,
+                 chunk_size: int = IMPORT_CHUNK_SIZE, defer_indexes: bool = False,
+                 progress: Callable[[dict], None] | None = None, prepared: bool = False,
+                 player_id: int = DEFAULT_PLAYER) -> dict:
+    """Streaming bulk import into the times table. Rows are pulled lazily from the given iterable,
+    validated and converted a chunk at a time, and each chunk is committed on its own, so memory use
+    is bounded by the chunk size and one bad row can't abort the whole import. Rows that already
+    exist (i.e. hit the UNIQUE constraint) are counted as duplicates and skipped.
+
+    For very large loads, `defer_indexes` drops the secondary index and the PB triggers for the
+    duration of the import, then recreates them and rebuilds `personal_bests` once at the end.
+
+    Args:
+        rows (Iterable): Raw rows, e.g. a `csv.reader`. See `_prepare_times_chunk` for the format.
+        cc (str | None, optional): CC for every row, or None if the rows include it. Defaults to None.
+        items (str | None, optional): Item type for every row, or None if the rows include it.
+            Defaults to None.
+        chunk_size (int, optional): Rows per transaction. Defaults to `IMPORT_CHUNK_SIZE`.
+        defer_indexes (bool, optional): If true, defer index and trigger maintenance to the end.
+            Defaults to False.
+        progress (Callable[[dict], None] | None, optional): Called with the running stats after each
+            chunk. Defaults to None.
+        prepared (bool, optional): If true, the rows are already validated and in the final
+            `(track, time_str, time_sec, cc, items, player_id)` format (e.g. from `generate_times`),
+            so no conversion is done. Defaults to False.
+        player_id (int, optional): Player the times belong to, unless prepared. Defaults to
+            `DEFAULT_PLAYER`.
+
+    Raises:
+        ValueError: If the given cc or items is invalid.
+
+    Returns:
+        dict: Import stats: `read`, `inserted`, `duplicates`, `rejected`, `seconds` and `rows_per_sec`.
+    """
+    if (cc is None) != (items is None):
+        raise ValueError("CC and item type should be given together.")
+    if cc is not None and (cc not in CC_CATEGORIES or items not in ITEM_OPTIONS):
+        raise ValueError(f"Invalid CC or item type: {cc} | {items}")
+
+    conn = get_db()
+    tracks = {row["tr_name"] for row in query_db("SELECT tr_name FROM tracks")}
+    stats = {"read": 0, "inserted": 0, "duplicates": 0, "rejected": 0, "seconds": 0.0, "rows_per_sec": 0.0}
+    start = time.perf_counter()
+
+    deferred = []
+    if defer_indexes:
+        deferred = query_db("""
+            SELECT type, name, sql FROM sqlite_master
+            WHERE tbl_name = 'track_times' AND type IN ('index', 'trigger') AND sql IS NOT NULL
+        """)
+        for row in deferred:
+            conn.execute(f"DROP {row['type'].upper()} IF EXISTS {row['name']}")
+        conn.commit()
+
+    try:
+        rows = iter(rows)
+        while chunk := list(islice(rows, chunk_size)):
+            prepared_rows = chunk if prepared else _prepare_times_chunk(chunk, cc, items, tracks, player_id)
+            cur = conn.executemany(
+                """INSERT OR IGNORE INTO track_times (track, time_str, time_sec, cc, items, player_id)
+                VALUES (?, ?, ?, ?, ?, ?)""",
+                prepared_rows
+            )
+            if cur.rowcount:
+                _bump_data_version(conn)
+            conn.commit()
+
+            stats["read"] += len(chunk)
+            stats["inserted"] += cur.rowcount
+            stats["duplicates"] += len(prepared_rows) - cur.rowcount
+            stats["rejected"] += len(chunk) - len(prepared_rows)
+            stats["seconds"] = time.perf_counter() - start
+            stats["rows_per_sec"] = stats["read"] / stats["seconds"] if stats["seconds"] else 0.0
+            if progress is not None:
+                progress(stats)
+    finally:
+        if deferred:
+            for row in deferred:
+                conn.execute(row["sql"])
+            conn.commit()
+            rebuild_personal_bests()
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["rows_per_sec"] = stats["read"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+def init_times_from_csv(path: str, cc: str = "150cc", items: str = "Shrooms", **kwargs) -> dict:
     """Insert some preset times into the time table in the db given a CSV file path.
 
     The CSV file should have rows in the following format: `track_name, time_str`.
@@ -80,39 +635,42 @@ def init_times_from_csv(path: str, cc: str = "150cc", items: str = "Shrooms"):
         path (str): CSV file path.
         cc (str, optional): CC. Defaults to "150cc".
         items (str, optional): Item type. Defaults to "Shrooms".
+        **kwargs: Passed on to `import_times`.
+
+    Returns:
+        dict: Import stats, see `import_times`.
     """
-    if cc not in CC_CATEGORIES or items not in ITEM_OPTIONS:
-        raise ValueError(f"Invalid CC or item type: {cc} | {items}")
-    
-    conn = get_db()
-    with open(path) as f:
-        r = csv.reader(f)
-        times = [(row[0], row[1], TrackTime(row[1]).get_seconds(), cc, items) for row in r]
-        conn.executemany(
-            "INSERT INTO track_times (track, time_str, time_sec, cc, items) VALUES (?, ?, ?, ?, ?)", 
-            times
-        )
-    conn.commit()
-    close_db(conn)
+    with open(path, newline="") as f:
+        return import_times(csv.reader(f), cc, items, **kwargs)
 
-def init_dummy_times(path: str):
-    """Insert randomly generated dummy times into the db given a CSV file path.
+def init_dummy_times(path: str, **kwargs) -> dict:
+    """Insert randomly generated dummy times into the db given a CSV file path. Rows should be in the
+    format `track_name, time_str, cc, items`.
 
     Args:
         path (str): CSV file path.
+        **kwargs: Passed on to `import_times`.
+
+    Returns:
+        dict: Import stats, see `import_times`.
     """
-    conn = get_db()
-    with open(path) as f:
-        r = csv.reader(f)
-        times = [(row[0], row[1], TrackTime(row[1]).get_seconds(), row[2], row[3]) for row in r]
-        conn.executemany(
-            "INSERT INTO track_times (track, time_str, time_sec, cc, items) VALUES (?, ?, ?, ?, ?)", 
-            times
-        )
-    conn.commit()
-    close_db(conn)
+    with open(path, newline="") as f:
+        return import_times(csv.reader(f), **kwargs)
 
-def insert_time(track: str, time: str, cc: str, items: str):
+def print_import_stats(stats: dict):
+    """Print the stats from `import_times` on one line.
+
+    Args:
+        stats (dict): Import stats.
+    """
+    print(
+        f"{stats['read']} rows read, {stats['inserted']} inserted, {stats['duplicates']} duplicates, "
+        f"{stats['rejected']} rejected in {stats['seconds']:.2f}s ({stats['rows_per_sec']:.0f} rows/s)"
+    )
+#endregion
+
+@timed()
+def insert_time(track: str, time: str, cc: str, items: str, player_id: int = DEFAULT_PLAYER):
     """Insert a time in to the times table in the db. Given time should be formatting as the typical
     `M:SS.sss` format, gets converted automatically by this function as necessary.
 
@@ -121,6 +679,7 @@ def insert_time(track: str, time: str, cc: str, items: str):
         time (str): Time in string format.
         cc (str): CC.
         items (str): Item type.
+        player_id (int, optional): Player the time belongs to. Defaults to `DEFAULT_PLAYER`.
     """
     # Formatting the time
     time_sec = TrackTime(time).get_seconds()
@@ -128,17 +687,19 @@ def insert_time(track: str, time: str, cc: str, items: str):
     conn = get_db()
     try:
         conn.execute(
-            "INSERT INTO track_times (track, time_str, time_sec, cc, items) VALUES (?, ?, ?, ?, ?)",
-            (track, time, time_sec, cc, items),
+            "INSERT INTO track_times (track, time_str, time_sec, cc, items, player_id) VALUES (?, ?, ?, ?, ?, ?)",
+            (track, time, time_sec, cc, items, player_id),
         )
+        version = _bump_data_version(conn)
         conn.commit()
     except sqlite3.IntegrityError:
-        close_db(conn)
+        conn.rollback()
         return False
-    
-    close_db(conn)
+
+    _notify_time_listeners(player_id, cc, items, track, version)
     return True
 
+@timed()
 def delete_time(id: str):
     """Deletes an entry from the times table given an ID.
 
@@ -146,9 +707,14 @@ def delete_time(id: str):
         id (str): ID of the entry.
     """
     conn = get_db()
-    conn.execute("DELETE FROM track_times WHERE id = ?", (id,))
+    deleted = conn.execute(
+        "DELETE FROM track_times WHERE id = ? RETURNING player_id, cc, items, track", (id,)
+    ).fetchall()
+    version = _bump_data_version(conn) if deleted else None
     conn.commit()
-    close_db(conn)
+
+    if deleted:
+        _notify_time_listeners(*deleted[0], version)
 
 #region Get queries
 def get_tracks() -> tuple:
@@ -159,58 +725,69 @@ def get_tracks() -> tuple:
     """
     return query_db("SELECT * FROM tracks ORDER BY tr_number")
 
-def get_recent_times(n: str) -> tuple:
-    """Gets the n most recent additions to the track_times table.
+@timed()
+def get_recent_times(n: int = RECENT_PAGE_SIZE, player_id: int = DEFAULT_PLAYER, before: int | None = None) -> tuple:
+    """Gets the n most recent additions to the track_times table. Paginated by keyset: pass the id
+    of the last row of a page as `before` to get the next page, which seeks straight to it in the
+    index, so every page costs the same however far back it is.
 
     Args:
-        n (str): Number of entries to get.
+        n (int, optional): Number of entries to get. Defaults to `RECENT_PAGE_SIZE`.
+        player_id (int, optional): Player. Defaults to `DEFAULT_PLAYER`.
+        before (int | None, optional): Only get entries older than this id. Defaults to None.
 
     Returns:
-        tuple: Tuple containing Row objects from the db.
+        tuple: Tuple containing Row objects from the db, newest first.
     """
-    query = """
+    query = f"""
         SELECT tt.id, tt.track, t.tr_abbrev, tt.time_str, tt.cc, tt.items
         FROM track_times tt
         JOIN tracks t ON tt.track = t.tr_name
-        ORDER BY id DESC
+        WHERE tt.player_id = ? {"AND tt.id < ?" if before is not None else ""}
+        ORDER BY tt.id DESC
         LIMIT ?
     """
-    return query_db(query, (n,))
+    args = (player_id, before, n) if before is not None else (player_id, n)
+    return query_db(query, args)
 
-def get_best_times(cc: str, items: str) -> tuple:
-    """Gets the current PBs from the times table in the db, for a given CC and item type. Query does
-    a left outer join on the tracks table, so all tracks are included regardless of whether there
-    are any respective saved times. Missing times are returned as NULL for `best_time_sec` and `"-"`
-    for `time_str`.
+@timed()
+def get_best_times(cc: str, items: str, player_id: int = DEFAULT_PLAYER) -> tuple:
+    """Gets the current PBs for a given CC and item type from the `personal_bests` table, which is
+    maintained by triggers on the times table. Query does a left outer join from the tracks table, so
+    all tracks are included regardless of whether there are any respective saved times. Missing
+    times are returned as NULL for `best_time_sec` and `"-"` for `time_str`.
 
     Args:
         cc (str): CC.
         items (str): Item type.
+        player_id (int, optional): Player. Defaults to `DEFAULT_PLAYER`.
 
     Returns:
         tuple: Tuple containing Row objects from the db.
     """
     query = """
         SELECT t.tr_name AS track, 
-            COALESCE(MIN(tt.time_sec), NULL) AS best_time_sec, 
-            COALESCE(tt.time_str, '-') AS time_str
+            pb.time_sec AS best_time_sec, 
+            COALESCE(pb.time_str, '-') AS time_str
         FROM tracks t
-        LEFT JOIN track_times tt 
-            ON t.tr_name = tt.track 
-            AND tt.cc = ? 
-            AND tt.items = ?
-        GROUP BY t.tr_name
+        LEFT JOIN personal_bests pb
+            ON pb.player_id = ?
+            AND pb.cc = ?
+            AND pb.items = ?
+            AND pb.track = t.tr_name
         ORDER BY t.tr_number
     """
-    return query_db(query, (cc, items))
+    return query_db(query, (player_id, cc, items))
 
-def get_times_for_track(name: str, cc: str, items: str) -> tuple:
+@timed()
+def get_times_for_track(name: str, cc: str, items: str, player_id: int = DEFAULT_PLAYER) -> tuple:
     """Gets the times for a given track combination.
 
     Args:
         name (str): Track name.
         cc (str): Speed.
         items (str): Item type.
+        player_id (int, optional): Player. Defaults to `DEFAULT_PLAYER`.
 
     Returns:
         tuple: Tuple containing Row objects from the db.
@@ -218,13 +795,445 @@ def get_times_for_track(name: str, cc: str, items: str) -> tuple:
     query = """
         SELECT id, time_str, time_sec
         FROM track_times
-        WHERE track = ? AND cc = ? and items = ?
-        ORDER BY time_sec
+        WHERE player_id = ? AND cc = ? AND items = ? AND track = ?
+        ORDER BY time_sec, id
+    """
+    return query_db(query, (player_id, cc, items, name))
+
+@timed()
+def get_times_page(name: str, cc: str, items: str, player_id: int = DEFAULT_PLAYER,
+                   after: tuple | None = None, limit: int = TIMES_PAGE_SIZE) -> tuple:
+    """Gets a page of the times for a given track combination, fastest first. Paginated by keyset
+    over `(time_sec, id)`: pass the values of the last row of a page as `after` to get the next page,
+    which seeks straight to it in `idx_track_times_lookup`, so every page costs the same however
+    many times there are.
+
+    Args:
+        name (str): Track name.
+        cc (str): Speed.
+        items (str): Item type.
+        player_id (int, optional): Player. Defaults to `DEFAULT_PLAYER`.
+        after (tuple | None, optional): `(time_sec, id)` of the last row of the previous page.
+            Defaults to None, for the first page.
+        limit (int, optional): Maximum number of rows. Defaults to `TIMES_PAGE_SIZE`.
+
+    Returns:
+        tuple: Tuple containing Row objects from the db.
+    """
+    query = f"""
+        SELECT id, time_str, time_sec
+        FROM track_times
+        WHERE player_id = ? AND cc = ? AND items = ? AND track = ? {"AND (time_sec, id) > (?, ?)" if after else ""}
+        ORDER BY time_sec, id
+        LIMIT ?
+    """
+    return query_db(query, (player_id, cc, items, name, *(after or ()), limit))
+#endregion
+
+#region Leaderboards
+def get_players() -> tuple:
+    """Get all rows from the players table in the db.
+
+    Returns:
+        tuple: Tuple containing Row objects.
+    """
+    return query_db("SELECT * FROM players ORDER BY id")
+
+@timed()
+def get_track_leaderboard(track: str, cc: str, items: str, limit: int = 10, offset: int = 0) -> tuple:
+    """Gets a page of the leaderboard for a track, i.e. every player's PB in order. Tied times share
+    a position. The rows are read in order from `idx_personal_bests_rank`, so there's no sort step.
+
+    Args:
+        track (str): Track name.
+        cc (str): CC.
+        items (str): Item type.
+        limit (int, optional): Page size. Defaults to 10.
+        offset (int, optional): Number of rows to skip. Defaults to 0.
+
+    Returns:
+        tuple: Row objects with `position`, `player_id`, `name`, `time_str`, `time_sec`.
+    """
+    query = """
+        SELECT RANK() OVER (ORDER BY pb.time_sec) AS position,
+            pb.player_id, p.name, pb.time_str, pb.time_sec
+        FROM personal_bests pb
+        JOIN players p ON p.id = pb.player_id
+        WHERE pb.cc = ? AND pb.items = ? AND pb.track = ?
+        ORDER BY pb.time_sec, pb.player_id
+        LIMIT ? OFFSET ?
+    """
+    return query_db(query, (cc, items, track, limit, offset))
+
+@timed()
+def get_track_position(player_id: int, track: str, cc: str, items: str) -> dict | None:
+    """Gets a player's position on a track leaderboard and the gap to the player directly above.
+    Doesn't rank the whole board: the position is a count over an index range and the player above
+    is a single index seek, so this stays fast with any number of players.
+
+    Args:
+        player_id (int): Player.
+        track (str): Track name.
+        cc (str): CC.
+        items (str): Item type.
+
+    Returns:
+        dict | None: `position`, `players`, `time_str`, `time_sec`, `above_player_id` and `gap_ms`
+            (both None if first), or None if the player has no time on the track.
+    """
+    pb = query_db("""
+        SELECT time_str, time_sec FROM personal_bests
+        WHERE player_id = ? AND cc = ? AND items = ? AND track = ?
+    """, (player_id, cc, items, track), one=True)
+    if pb is None:
+        return None
+
+    counts = query_db("""
+        SELECT SUM(time_sec < ?) AS faster, COUNT(*) AS players FROM personal_bests
+        WHERE cc = ? AND items = ? AND track = ?
+    """, (pb["time_sec"], cc, items, track), one=True)
+    above = query_db("""
+        SELECT player_id, time_sec FROM personal_bests
+        WHERE cc = ? AND items = ? AND track = ? AND time_sec < ?
+        ORDER BY time_sec DESC
+        LIMIT 1
+    """, (cc, items, track, pb["time_sec"]), one=True)
+
+    return {
+        "position": counts["faster"] + 1,
+        "players": counts["players"],
+        "time_str": pb["time_str"],
+        "time_sec": pb["time_sec"],
+        "above_player_id": above["player_id"] if above else None,
+        "gap_ms": round((pb["time_sec"] - above["time_sec"]) * 1000) if above else None,
+    }
+
+@timed()
+def get_all_best_times(cc: str, items: str, track: str | None = None) -> tuple:
+    """Gets every player's PBs for a given CC and item type, for one track or all of them, e.g. for
+    distributions across players. Reads only the leaderboard index.
+
+    Args:
+        cc (str): CC.
+        items (str): Item type.
+        track (str | None, optional): Track name. Defaults to None (all tracks).
+
+    Returns:
+        tuple: Tuple containing Row objects of `(tr_number, time_sec)`.
+    """
+    query = """
+        SELECT t.tr_number, pb.time_sec
+        FROM personal_bests pb
+        JOIN tracks t ON t.tr_name = pb.track
+        WHERE pb.cc = ? AND pb.items = ?
+    """
+    if track is None:
+        return query_db(query, (cc, items))
+    return query_db(query + " AND pb.track = ?", (cc, items, track))
+
+@timed()
+def get_overall_leaderboard(cc: str, items: str, limit: int = 10, offset: int = 0) -> tuple:
+    """Gets a page of the overall leaderboard for a CC and item type, ranked by the sum of PBs. Only
+    players with a time on every track are ranked. Sums are kept in `player_totals` by triggers.
+
+    Args:
+        cc (str): CC.
+        items (str): Item type.
+        limit (int, optional): Page size. Defaults to 10.
+        offset (int, optional): Number of rows to skip. Defaults to 0.
+
+    Returns:
+        tuple: Row objects with `position`, `player_id`, `name`, `total_ms`.
+    """
+    query = """
+        SELECT RANK() OVER (ORDER BY pt.total_ms) AS position,
+            pt.player_id, p.name, pt.total_ms
+        FROM player_totals pt
+        JOIN players p ON p.id = pt.player_id
+        WHERE pt.cc = ? AND pt.items = ? AND pt.tracks = (SELECT COUNT(*) FROM tracks)
+        ORDER BY pt.total_ms, pt.player_id
+        LIMIT ? OFFSET ?
+    """
+    return query_db(query, (cc, items, limit, offset))
+
+@timed()
+def get_overall_position(player_id: int, cc: str, items: str) -> dict | None:
+    """Gets a player's position on the overall leaderboard and the gap to the player directly above,
+    in the same way as `get_track_position`.
+
+    Args:
+        player_id (int): Player.
+        cc (str): CC.
+        items (str): Item type.
+
+    Returns:
+        dict | None: `position`, `players`, `total_ms`, `above_player_id` and `gap_ms` (both None if
+            first), or None if the player doesn't have a time on every track.
+    """
+    n_tracks = query_db("SELECT COUNT(*) FROM tracks", one=True)[0]
+    total = query_db("""
+        SELECT total_ms FROM player_totals
+        WHERE player_id = ? AND cc = ? AND items = ? AND tracks = ?
+    """, (player_id, cc, items, n_tracks), one=True)
+    if total is None:
+        return None
+
+    counts = query_db("""
+        SELECT SUM(total_ms < ?) AS faster, COUNT(*) AS players FROM player_totals
+        WHERE cc = ? AND items = ? AND tracks = ?
+    """, (total["total_ms"], cc, items, n_tracks), one=True)
+    above = query_db("""
+        SELECT player_id, total_ms FROM player_totals
+        WHERE cc = ? AND items = ? AND tracks = ? AND total_ms < ?
+        ORDER BY total_ms DESC
+        LIMIT 1
+    """, (cc, items, n_tracks, total["total_ms"]), one=True)
+
+    return {
+        "position": counts["faster"] + 1,
+        "players": counts["players"],
+        "total_ms": total["total_ms"],
+        "above_player_id": above["player_id"] if above else None,
+        "gap_ms": total["total_ms"] - above["total_ms"] if above else None,
+    }
+#endregion
+
+#region WR snapshots
+def _timestamp(when: str | date | datetime | None) -> str:
+    """Normalise a time to the `YYYY-MM-DD HH:MM:SS` (UTC) format used in `wr_snapshots`. A bare date
+    means the end of that day, so "as of" a date includes everything fetched on it.
+
+    Args:
+        when (str | date | datetime | None): Time, or None for now.
+
+    Returns:
+        str: Timestamp.
+    """
+    if when is None:
+        when = datetime.now(timezone.utc)
+    if isinstance(when, datetime):
+        if when.tzinfo is not None:
+            when = when.astimezone(timezone.utc)
+        return when.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(when, date):
+        when = when.isoformat()
+    return f"{when} 23:59:59" if len(when) == 10 else when
+
+def record_wrs(cc: str, items: str, wrs: list, fetched_at: str | datetime | None = None) -> int:
+    """Add a WR snapshot. Only the tracks whose WR differs from the latest one are stored, so the
+    history grows with the number of WR changes rather than the number of fetches.
+
+    Args:
+        cc (str): CC.
+        items (str): Item type.
+        wrs (list): `(source_name, time_str)` rows in track order, one per track (e.g. a WRs DF's rows).
+        fetched_at (str | datetime | None, optional): When the WRs were fetched. Defaults to now.
+
+    Raises:
+        ValueError: If the cc or items is invalid, or there isn't one WR per track.
+
+    Returns:
+        int: Number of WRs that changed.
     """
-    return query_db(query, (name, cc, items))
+    if cc not in CC_CATEGORIES or items not in ITEM_OPTIONS:
+        raise ValueError(f"Args not recognised: {cc}, {items}")
+    tracks = [row["tr_name"] for row in get_tracks()]
+    wrs = [tuple(row) for row in wrs]
+    if len(wrs) != len(tracks):
+        raise ValueError(f"WRs have unexpected length: {len(wrs)}")
+
+    fetched_at = _timestamp(fetched_at)
+    time_ms = parse_times([row[1] for row in wrs])
+    rows = [(cc, items, track, fetched_at, source, time_str, ms)
+            for track, (source, time_str), ms in zip(tracks, wrs, time_ms.tolist())]
+
+    conn = get_db()
+    cur = conn.executemany("""
+        INSERT OR IGNORE INTO wr_snapshots (cc, items, track, fetched_at, source_name, time_str, time_ms)
+        SELECT ?1, ?2, ?3, ?4, ?5, ?6, ?7
+        WHERE NOT EXISTS (
+            SELECT 1 FROM wr_latest
+            WHERE cc = ?1 AND items = ?2 AND track = ?3 AND time_ms = ?7 AND source_name = ?5
+        )
+    """, rows)
+    conn.commit()
+    return cur.rowcount
+
+@timed()
+def get_latest_wrs(cc: str, items: str) -> tuple:
+    """Get the current WRs, in track order. Reads `wr_latest`, which is maintained by a trigger.
+
+    Args:
+        cc (str): CC.
+        items (str): Item type.
+
+    Returns:
+        tuple: Row objects with `track`, `source_name`, `time_str`, `time_ms`, `fetched_at`. Empty if
+            there are no snapshots.
+    """
+    query = """
+        SELECT w.track, w.source_name, w.time_str, w.time_ms, w.fetched_at
+        FROM tracks t
+        JOIN wr_latest w ON w.cc = ? AND w.items = ? AND w.track = t.tr_name
+        ORDER BY t.tr_number
+    """
+    return query_db(query, (cc, items))
+
+@timed()
+def get_wrs_as_of(cc: str, items: str, when: str | date | datetime) -> tuple:
+    """Get the WRs as they were at a point in time, in track order. Tracks without a WR by then are
+    left out.
+
+    Args:
+        cc (str): CC.
+        items (str): Item type.
+        when (str | date | datetime): Time. A date (or `YYYY-MM-DD` string) means the end of that day.
+
+    Returns:
+        tuple: Row objects as in `get_latest_wrs`.
+    """
+    query = """
+        SELECT w.track, w.source_name, w.time_str, w.time_ms, w.fetched_at
+        FROM tracks t
+        JOIN wr_snapshots w ON w.cc = :cc AND w.items = :items AND w.track = t.tr_name
+            AND w.fetched_at = (
+                SELECT MAX(fetched_at) FROM wr_snapshots
+                WHERE cc = :cc AND items = :items AND track = t.tr_name AND fetched_at <= :when
+            )
+        ORDER BY t.tr_number
+    """
+    return query_db(query, {"cc": cc, "items": items, "when": _timestamp(when)})
+
+@timed()
+def get_wr_diff(cc: str, items: str, start: str | date | datetime, end: str | date | datetime | None = None) -> tuple:
+    """Get the WRs that fell between two points in time, i.e. the tracks with a new WR after `start`
+    and at or before `end`, with the old and new times.
+
+    Args:
+        cc (str): CC.
+        items (str): Item type.
+        start (str | date | datetime): Start time (exclusive).
+        end (str | date | datetime | None, optional): End time (inclusive). Defaults to now.
+
+    Returns:
+        tuple: Row objects with `track`, `old_time`, `new_time`, `diff_ms` (the improvement, NULL if
+            there was no WR before) and `fetched_at` (of the new WR), in track order.
+    """
+    query = """
+        SELECT t.tr_name AS track, old.time_str AS old_time, new.time_str AS new_time,
+            old.time_ms - new.time_ms AS diff_ms, new.fetched_at
+        FROM tracks t
+        JOIN wr_snapshots new ON new.cc = :cc AND new.items = :items AND new.track = t.tr_name
+            AND new.fetched_at = (
+                SELECT MAX(fetched_at) FROM wr_snapshots
+                WHERE cc = :cc AND items = :items AND track = t.tr_name AND fetched_at <= :end
+            )
+        LEFT JOIN wr_snapshots old ON old.cc = :cc AND old.items = :items AND old.track = t.tr_name
+            AND old.fetched_at = (
+                SELECT MAX(fetched_at) FROM wr_snapshots
+                WHERE cc = :cc AND items = :items AND track = t.tr_name AND fetched_at <= :start
+            )
+        WHERE new.fetched_at > :start AND (old.time_ms IS NULL OR old.time_ms != new.time_ms)
+        ORDER BY t.tr_number
+    """
+    return query_db(query, {"cc": cc, "items": items, "start": _timestamp(start), "end": _timestamp(end)})
+
+def import_wr_snapshots(rows: Iterable[tuple]) -> int:
+    """Restore WR history rows as they are, e.g. from an export. Rows that are already stored are
+    skipped; `wr_latest` is kept up to date by the trigger.
+
+    Args:
+        rows (Iterable[tuple]): `(cc, items, track, fetched_at, source_name, time_str, time_ms)` rows.
+
+    Returns:
+        int: Number of rows added.
+    """
+    conn = get_db()
+    cur = conn.executemany("""
+        INSERT OR IGNORE INTO wr_snapshots (cc, items, track, fetched_at, source_name, time_str, time_ms)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    if cur.rowcount:
+        _bump_data_version(conn)
+    conn.commit()
+    return cur.rowcount
+
+def import_wr_csvs(pattern: str = "data/*_wrs_*.csv", items: str = "Shrooms") -> dict:
+    """One-time import of the dated WR CSV snapshots (e.g. `data/150cc_wrs_25_02_2025.csv`) into the
+    db, oldest first, each as fetched at the start of its date. Safe to re-run: snapshots that are
+    already stored don't add anything.
+
+    Args:
+        pattern (str, optional): Glob pattern for the CSVs. Defaults to `"data/*_wrs_*.csv"`.
+        items (str, optional): Item type of the CSVs. Defaults to "Shrooms".
+
+    Returns:
+        dict: Path -> number of WRs that changed.
+    """
+    snapshots = []
+    for path in glob.glob(pattern):
+        cc, date_part = os.path.basename(path)[:-4].split("_wrs_", 1)
+        fetched_at = datetime.strptime(date_part, "%d_%m_%Y")
+        snapshots.append((fetched_at, cc, path))
+
+    results = {}
+    for fetched_at, cc, path in sorted(snapshots):
+        with open(path, newline="") as f:
+            results[path] = record_wrs(cc, items, [row for row in csv.reader(f) if row], fetched_at)
+    return results
 #endregion
 
+def check_query_plans() -> dict:
+    """Run each read query once with query plan checks on (see `QueryLog`), e.g. after changing the
+    schema or queries, to catch full scans of large tables before they get slow.
+
+    Returns:
+        dict: Normalised statement -> plan info, for the statements with full scans.
+    """
+    explain = QUERY_LOG.explain
+    QUERY_LOG.explain = True
+    try:
+        track = get_tracks()[0]["tr_name"]
+        cc, items = CC_CATEGORIES[0], ITEM_OPTIONS[0]
+        get_recent_times()
+        get_recent_times(before=2 ** 62)
+        get_best_times(cc, items)
+        get_times_for_track(track, cc, items)
+        get_times_page(track, cc, items)
+        get_times_page(track, cc, items, after=(0.0, 0))
+        get_track_leaderboard(track, cc, items)
+        get_track_position(DEFAULT_PLAYER, track, cc, items)
+        get_all_best_times(cc, items)
+        get_all_best_times(cc, items, track)
+        get_overall_leaderboard(cc, items)
+        get_overall_position(DEFAULT_PLAYER, cc, items)
+        get_latest_wrs(cc, items)
+        get_wrs_as_of(cc, items, datetime.now(timezone.utc))
+        get_wr_diff(cc, items, date(2000, 1, 1))
+    finally:
+        QUERY_LOG.explain = explain
+    return QUERY_LOG.full_scans()
+
 if __name__ in "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        # Upgrade an existing db to the current schema, keeping the data
+        rebuild_db()
+        print("DB rebuilt.")
+        sys.exit()
+    if len(sys.argv) > 1 and sys.argv[1] == "check-plans":
+        # List the queries that scan a whole large table
+        QUERY_LOG.slow_ms = float("inf")
+        scans = check_query_plans()
+        for query, info in scans.items():
+            print(f"{info['site']}: {'; '.join(info['full_scans'])}\n    {query}")
+        print(f"{len(scans)} queries with full scans.")
+        sys.exit()
+    if len(sys.argv) > 1 and sys.argv[1] == "import-wrs":
+        # Load the WR CSV snapshots into the db
+        for path, changed in import_wr_csvs().items():
+            print(f"{path}: {changed} WRs changed.")
+        sys.exit()
+
     # Caution: running this file directly will initialise the database
     tracks_path = "data/track_names.csv"
     dummy_times_path = "data/times_dummy_data.csv"
@@ -235,8 +1244,11 @@ if __name__ in "__main__":
     print("DB initialised.")
     init_tracks_from_csv(tracks_path)
     print("Track table populated.")
+    import_wr_csvs()
+    print("WR snapshots imported.")
 
     # These functions can be swapped to use dummy data or not
-    init_dummy_times(dummy_times_path)
-    # init_times_from_csv(times_path)
-    print("Times table populated.")
\ No newline at end of file
+    stats = init_dummy_times(dummy_times_path)
+    # stats = init_times_from_csv(times_path)
+    print("Times table populated.")
+    print_import_stats(stats)
\ No newline at end of file
@@ -1,12 +1,210 @@
+import argparse
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+import csv
+from functools import lru_cache
+
 import numpy as np
-import pandas as pd
 from pandas import DataFrame
 
-from TrackTime import TrackTime
-from timesheet import CC_CATEGORIES, ITEM_OPTIONS, determine_wrs
+from TrackTime import format_times
+from timesheet import CC_CATEGORIES, ITEM_OPTIONS, get_catalog
 
 rng = np.random.default_rng(0)
-TRACK_NAMES = [row for row in pd.read_csv("data/track_names.csv", header=None).iloc[:, 3]]
+CHUNK_ROWS = 200000     # Approximate rows generated per chunk
+
+def _track_names() -> list:
+    """Track names, in track order."""
+    return list(get_catalog().names)
+
+def __getattr__(name: str):
+    """Lazily provide `TRACK_NAMES` (PEP 562)."""
+    if name == "TRACK_NAMES":
+        return _track_names()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+@lru_cache(maxsize=None)
+def _wrs_ms(cc: str, items: str) -> np.ndarray:
+    """WRs (ms) used as the baseline for dummy times."""
+    wrs = get_catalog().wrs_ms(cc, "Shrooms") # Assuming nita wrs don't exist
+    if items == "NITA":
+        wrs = wrs + 5000 # Offset to account for shrooms roughly
+    return wrs
+
+def generate_attempts(cc: str, items: str, players: int = 1, gen: np.random.Generator = None,
+                      first_player: int = 0, low: int = 5, high: int = 15) -> dict:
+    """Generate dummy time improvements for every track, for a number of players at once. Every
+    random draw is done as a whole array, and the improvements for each (player, track) group are
+    accumulated with a single cumulative sum.
+
+    For each group, the first diff to the WR is normally distributed, the number of improvements is
+    uniform in `[low, high)`, and each improvement adds an exponentially distributed amount.
+
+    Args:
+        cc (str): CC.
+        items (str): Item type.
+        players (int, optional): Number of players. Defaults to 1.
+        gen (np.random.Generator, optional): Random generator. Defaults to the module's `rng`.
+        first_player (int, optional): Id of the first player, for chunked generation. Defaults to 0.
+        low (int, optional): Minimum improvements per track. Defaults to 5.
+        high (int, optional): Maximum improvements per track (exclusive). Defaults to 15.
+
+    Returns:
+        dict: Aligned arrays for `player`, `track` (0-based track index) and `time_ms`.
+    """
+    if cc not in CC_CATEGORIES or items not in ITEM_OPTIONS:
+        raise ValueError(f"Invalid args: {cc}, {items}")
+    gen = rng if gen is None else gen
+
+    wrs = _wrs_ms(cc, items)
+    groups = players * len(wrs)
+    counts = gen.integers(low, high, size=groups) # Rand int for number of improvements
+    initial = np.maximum(0.5, gen.normal(7, 2, size=groups)) # Normal dist for initial wr diff
+    steps = np.maximum(0.1, gen.exponential(1, size=counts.sum())) # Exponential distribution for diffs
+
+    # Running sum of the steps within each group
+    group = np.repeat(np.arange(groups), counts)
+    totals = np.cumsum(steps)
+    starts = np.concatenate(([0.0], totals))[np.cumsum(counts) - counts]
+    diff = initial[group] + totals - starts[group]
+
+    track = group % len(wrs)
+    time_ms = wrs[track] + np.round(diff * 1e6).astype(np.int64) // 1000
+    return {"player": group // len(wrs) + first_player, "track": track, "time_ms": time_ms}
+
+#region Chunked generation
+def _chunk_task(task: tuple) -> tuple:
+    """Generate one chunk. Top level so it can run in a process pool."""
+    seed, combo, chunk, cc, items, first_player, players = task
+    gen = np.random.default_rng([seed, combo, chunk])
+    return cc, items, generate_attempts(cc, items, players, gen, first_player)
+
+def iter_chunks(players: int = 1, seed: int = 0, chunk_rows: int = CHUNK_ROWS,
+                workers: int = 1) -> Iterator[tuple]:
+    """Generate dummy attempts for every cc and item combination in chunks of players, so memory use
+    is bounded by the chunk size. Each chunk has its own generator seeded from `(seed, combination,
+    chunk)`, so the output is reproducible and doesn't depend on the number of workers.
+
+    Args:
+        players (int, optional): Number of players. Defaults to 1.
+        seed (int, optional): Base seed. Defaults to 0.
+        chunk_rows (int, optional): Approximate rows per chunk. Defaults to `CHUNK_ROWS`.
+        workers (int, optional): Number of processes to generate with. Defaults to 1 (in process).
+
+    Yields:
+        tuple: `(cc, items, arrays)`, with the arrays as given by `generate_attempts`.
+    """
+    per_player = len(_track_names()) * 10
+    chunk_players = max(1, chunk_rows // per_player)
+    tasks = [
+        (seed, combo, chunk, cc, items, first, min(chunk_players, players - first))
+        for combo, (cc, items) in enumerate((cc, items) for cc in CC_CATEGORIES for items in ITEM_OPTIONS)
+        for chunk, first in enumerate(range(0, players, chunk_players))
+    ]
+
+    if workers <= 1:
+        for task in tasks:
+            yield _chunk_task(task)
+        return
+
+    # Keep a bounded number of chunks in flight, yielding them in order
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(_chunk_task, task))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def iter_rows(chunks: Iterator[tuple], limit: int | None = None) -> Iterator[tuple]:
+    """Flatten generated chunks into `(track, time_str, time_sec, cc, items, player_id)` rows. Player
+    ids are the generated player index + 1, so player 0 is the db's default player.
+
+    Args:
+        chunks (Iterator[tuple]): Chunks from `iter_chunks`.
+        limit (int | None, optional): Stop after this many rows. Defaults to None.
+    """
+    names = np.array(_track_names(), dtype=object)
+    emitted = 0
+    for cc, items, arrays in chunks:
+        time_strs = format_times(arrays["time_ms"]).tolist()
+        time_secs = (arrays["time_ms"] / 1000).tolist()
+        player_ids = (arrays["player"] + 1).tolist()
+        for track, time_str, time_sec, player_id in zip(names[arrays["track"]].tolist(), time_strs,
+                                                        time_secs, player_ids):
+            if limit is not None and emitted >= limit:
+                return
+            emitted += 1
+            yield track, time_str, time_sec, cc, items, player_id
+
+def write_db(players: int = 1, seed: int = 0, workers: int = 1, limit: int | None = None,
+             defer_indexes: bool = True) -> dict:
+    """Generate dummy attempts straight into the db (see `db.DB_FILE`), without going through a CSV.
+    Players are added as `Player N` if they don't exist yet.
+
+    Args:
+        players (int, optional): Number of players. Defaults to 1.
+        seed (int, optional): Base seed. Defaults to 0.
+        workers (int, optional): Number of generator processes. Defaults to 1.
+        limit (int | None, optional): Maximum number of rows. Defaults to None.
+        defer_indexes (bool, optional): See `db.import_times`. Defaults to True.
+
+    Returns:
+        dict: Import stats, see `db.import_times`.
+    """
+    import db
+    db.add_players((i, f"Player {i}") for i in range(2, players + 1))
+    rows = iter_rows(iter_chunks(players, seed, workers=workers), limit)
+    return db.import_times(rows, defer_indexes=defer_indexes, prepared=True)
+
+def write_csv(path: str, players: int = 1, seed: int = 0, workers: int = 1, limit: int | None = None) -> int:
+    """Generate dummy attempts into a CSV with rows `track, time_str, cc, items` (the format read by
+    `db.init_dummy_times`).
+
+    Returns:
+        int: Number of rows written.
+    """
+    count = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        for track, time_str, _, cc, items, _ in iter_rows(iter_chunks(players, seed, workers=workers), limit):
+            writer.writerow((track, time_str, cc, items))
+            count += 1
+    return count
+
+def write_parquet(path: str, players: int = 1, seed: int = 0, workers: int = 1) -> int:
+    """Generate dummy attempts into a Parquet file, one row group per chunk. Requires `pyarrow`.
+
+    Returns:
+        int: Number of rows written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    names = pa.array(_track_names()).dictionary_encode()
+    count = 0
+    writer = None
+    try:
+        for cc, items, arrays in iter_chunks(players, seed, workers=workers):
+            n = len(arrays["time_ms"])
+            table = pa.table({
+                "player": pa.array(arrays["player"], type=pa.int32()),
+                "track": pa.DictionaryArray.from_arrays(pa.array(arrays["track"], type=pa.int8()), names.dictionary),
+                "time_ms": pa.array(arrays["time_ms"], type=pa.int32()),
+                "cc": pa.array([cc] * n).dictionary_encode(),
+                "items": pa.array([items] * n).dictionary_encode(),
+            })
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            count += n
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+#endregion
 
 def create_dummy_list(cc: str, items: str) -> list:
     """Creates a list of dummy track times (and improvements) for a given CC and item type.
@@ -20,28 +218,10 @@ def create_dummy_list(cc: str, items: str) -> list:
     Returns:
         list: List of dummy time records.
     """
-    if cc not in CC_CATEGORIES or items not in ITEM_OPTIONS:
-        raise ValueError(f"Invalid args: {cc}, {items}")
-
-    low, high = 5, 15
+    arrays = generate_attempts(cc, items)
+    names = np.array(_track_names(), dtype=object)[arrays["track"]].tolist()
+    return [[track, time, cc, items] for track, time in zip(names, format_times(arrays["time_ms"]).tolist())]
 
-    wrs = [TrackTime(wr).get_seconds() for wr in determine_wrs(cc, "Shrooms")] # Assuming nita wrs don't exist
-    if items == "NITA":
-        wrs = [wr + 5 for wr in wrs] # Offset to account for shrooms roughly
-    
-    dummy = []
-    for num, track in enumerate(TRACK_NAMES):
-        wr = wrs[num]
-        diff = max(0.5, rng.normal(7, 2)) # Normal dist for initial wr diff
-        num_times = rng.integers(low, high) # Rand int for number of improvements
-        for i in range(num_times):
-            diff += max(0.1, rng.exponential(1)) # Exponential distribution for diffs
-            time = wr + diff
-            row = [track, TrackTime._format_seconds(time), cc, items]
-            dummy.append(row)
-
-    return dummy
-        
 def create_dummy_csv_all(save_file: bool = False, filename: str = None) -> DataFrame:
     """Convenience function for creating dummy data for each category combination.
 
@@ -58,7 +238,7 @@ def create_dummy_csv_all(save_file: bool = False, filename: str = None) -> DataF
             dummy.extend(create_dummy_list(cc, item))
 
     df = DataFrame(dummy)
-    
+
     if save_file:
         filename = filename if filename is not None else "data/times_dummy_data.csv"
         df.to_csv(filename, header=False, index=False)
@@ -66,4 +246,22 @@ def create_dummy_csv_all(save_file: bool = False, filename: str = None) -> DataF
     return df
 
 if __name__ in "__main__":
-    create_dummy_csv_all(save_file=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate dummy times data.")
+    parser.add_argument("--players", type=int, help="generate this many players in chunks (default: the dummy CSV)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="generator processes")
+    parser.add_argument("--limit", type=int, help="maximum number of rows")
+    parser.add_argument("--db", action="store_true", help="write straight into the db instead of a file")
+    parser.add_argument("--out", help="output file, .csv or .parquet")
+    args = parser.parse_args()
+
+    if args.players is None:
+        create_dummy_csv_all(save_file=True)
+    elif args.db:
+        import db
+        db.print_import_stats(write_db(args.players, args.seed, args.workers, args.limit))
+    elif args.out and args.out.endswith(".parquet"):
+        print(f"{write_parquet(args.out, args.players, args.seed, args.workers)} rows written.")
+    else:
+        path = args.out or "data/times_dummy_data.csv"
+        print(f"{write_csv(path, args.players, args.seed, args.workers, args.limit)} rows written.")
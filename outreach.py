@@ -1,31 +1,187 @@
-from bs4 import BeautifulSoup
+import hashlib
+from html.parser import HTMLParser
+import json
+import os
+
 import requests
 from typing import Literal
 
 WRS_150_URL = "https://mkwrs.com/mk8dx/wrs.php"
 WRS_200_URL = "https://mkwrs.com/mk8dx/wrs_200.php"
+HTTP_CACHE_DIR = "data/http_cache"
+HTTP_TIMEOUT = 30   # Seconds
+PARSE_CHUNK_SIZE = 4096  # Characters fed to the parser at a time, so it can stop soon after the table
+
+def _cache_paths(url: str, cache_dir: str) -> tuple:
+    key = hashlib.sha256(url.encode()).hexdigest()[:32]
+    return os.path.join(cache_dir, f"{key}.json"), os.path.join(cache_dir, f"{key}.body")
+
+def cached_page(url: str, cache_dir: str = HTTP_CACHE_DIR) -> str | None:
+    """The last response for a URL saved by `fetch_page`, or None if there isn't one."""
+    body_path = _cache_paths(url, cache_dir)[1]
+    if not os.path.exists(body_path):
+        return None
+    with open(body_path, encoding="utf-8") as f:
+        return f.read()
+
+def fetch_page(url: str, cache_dir: str | None = None, timeout: float = HTTP_TIMEOUT) -> str:
+    """GET a page as text. If a cache directory is given, the last response is kept on disk along
+    with its `ETag`/`Last-Modified` headers, and the request is made conditional on them; a
+    `304 Not Modified` is then answered from the cache without downloading the page again.
+
+    Args:
+        url (str): URL.
+        cache_dir (str | None, optional): Directory for cached responses. Defaults to None (no cache).
+        timeout (float, optional): Request timeout in seconds. Defaults to `HTTP_TIMEOUT`.
+
+    Raises:
+        requests.HTTPError: If the response is an error.
 
-def fetch_wrs(cc: str, items: str) -> list:
+    Returns:
+        str: Page text.
+    """
+    headers = {}
+    meta = None
+    if cache_dir is not None:
+        meta_path, body_path = _cache_paths(url, cache_dir)
+        if os.path.exists(meta_path) and os.path.exists(body_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = requests.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and meta is not None:
+        with open(body_path, encoding="utf-8") as f:
+            return f.read()
+    response.raise_for_status()
+
+    if cache_dir is not None:
+        # Write the body before the headers, each via a rename, so a crash can't leave a cache entry
+        # whose headers claim a body that isn't there
+        os.makedirs(cache_dir, exist_ok=True)
+        for path, content in [
+            (body_path, response.text),
+            (meta_path, json.dumps({
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            })),
+        ]:
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(f"{path}.tmp", path)
+
+    return response.text
+
+def fetch_wrs(cc: str, items: str, cache_dir: str | None = None) -> list:
     if items == "Shrooms":
-        return fetch_wrs_shrooms(cc)
+        return fetch_wrs_shrooms(cc, cache_dir)
     elif items == "NITA":
         return fetch_wrs_nita(cc)
     else:
         raise ValueError(f"Item type is not recognised: {items}")
 
-def fetch_wrs_shrooms(cc: Literal["150cc", "200cc"] = "150cc") -> list:
+def fetch_wrs_shrooms(cc: Literal["150cc", "200cc"] = "150cc", cache_dir: str | None = None) -> list:
     url = WRS_150_URL if cc == "150cc" else WRS_200_URL
-    # Should probably put a try-except
-    response = requests.get(url)
-    response.raise_for_status()
+    return parse_wrs_table(fetch_page(url, cache_dir))
+
+class WRTableParser(HTMLParser):
+    """Event-based extractor for one table of a mkwrs page. Only the rows of the wanted table are
+    kept (as lists of stripped cell texts, header row included), and `done` is set once it closes,
+    so the caller can stop feeding the rest of the page. `tables_seen` counts the tables opened so
+    far, which tells the caller whether the page had the wanted table at all.
+    """
+
+    def __init__(self, table: int = 1):
+        """Initialises a parser.
+
+        Args:
+            table (int, optional): Index of the table in document order, counting nested tables.
+                Defaults to 1, the WRs table.
+        """
+        super().__init__()
+        self.table = table
+        self.rows = []
+        self.done = False
+        self.tables_seen = 0
+        self._depth = 0             # Table nesting depth inside the wanted table, 0 if outside
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            if self._depth:
+                self._depth += 1
+            elif self.tables_seen == self.table:
+                self._depth = 1
+            self.tables_seen += 1
+        elif self._depth == 1:
+            if tag == "tr":
+                self._end_row()
+                self._row = []
+            elif tag in ("td", "th") and self._row is not None:
+                self._end_cell()
+                self._cell = [] if tag == "td" else None
+
+    def handle_endtag(self, tag):
+        if not self._depth:
+            return
+        if tag == "table":
+            self._depth -= 1
+            if not self._depth:
+                self._end_row()
+                self.done = True
+        elif self._depth == 1:
+            if tag in ("td", "th"):
+                self._end_cell()
+            elif tag == "tr":
+                self._end_row()
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def _end_cell(self):
+        if self._cell is not None:
+            self._row.append("".join(self._cell).strip())
+            self._cell = None
+
+    def _end_row(self):
+        if self._row is not None:
+            self._end_cell()
+            self.rows.append(self._row)
+            self._row = None
+
+def parse_wrs_table(html: str, table: int = 1) -> list:
+    """Get the `(track, time)` rows from the WRs table of a mkwrs page. The page is parsed
+    incrementally and parsing stops as soon as the table closes, so the rest of the page is never
+    looked at. Works for any page whose WR table has the track in the first column and the time in
+    the second.
+
+    Args:
+        html (str): Page HTML.
+        table (int, optional): Index of the WRs table on the page. Defaults to 1.
+
+    Returns:
+        list: WR rows, with times in `M:SS.sss` format.
+    """
+    parser = WRTableParser(table)
+    for start in range(0, len(html), PARSE_CHUNK_SIZE):
+        parser.feed(html[start:start + PARSE_CHUNK_SIZE])
+        if parser.done:
+            break
+    else:
+        parser.close()
+    if parser.tables_seen <= table:
+        raise ValueError(f"WR table not found: page has {parser.tables_seen} tables")
 
-    soup = BeautifulSoup(response.text, "html.parser")
-    wr_table = soup.find_all("table")[1]
     wr_times = []
-    for row in wr_table.find_all("tr")[1:]:
-        col = row.find_all("td")
-        track = col[0].text.strip()
-        time = col[1].text.strip()
+    for col in parser.rows[1:]:
+        track = col[0]
+        time = col[1]
 
         if "*" not in time:
             # Change format: M'SS"mmm -> M:SS.mmm
@@ -35,4 +191,4 @@ def fetch_wrs_shrooms(cc: Literal["150cc", "200cc"] = "150cc") -> list:
     return wr_times
 
 def fetch_wrs_nita(cc: Literal["150cc", "200cc"] = "150cc") -> list:
-    raise NotImplementedError()
\ No newline at end of file
+    raise NotImplementedError()
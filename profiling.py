@@ -0,0 +1,295 @@
+from collections import deque
+from collections.abc import Callable
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+import io
+import math
+import random
+import threading
+import time
+
+HISTOGRAM_MIN = 1e-5        # Seconds; the smallest bucket is everything up to 10 us
+HISTOGRAM_RATIO = 1.05      # Bucket growth factor, so percentiles are within ~2.5%
+HISTOGRAM_BUCKETS = 400     # Up to ~3 minutes
+MAX_SAMPLES = 20            # Slow request profiles kept for `/debug/metrics`
+PROFILE_TOP = 30            # Functions/lines listed per profile
+
+_timings = ContextVar("timings", default=None)  # Stage -> [seconds, calls] for the current request
+
+#region Stage timing
+@contextmanager
+def stage(name: str):
+    """Time a block as a stage of the current request. Repeated stages are summed. Outside of a
+    request (e.g. in scripts) this does nothing.
+
+    Args:
+        name (str): Stage name, e.g. `"db.get_times_for_track"`.
+    """
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        entry = timings.setdefault(name, [0.0, 0])
+        entry[0] += time.perf_counter() - start
+        entry[1] += 1
+
+def timed(name: str | None = None) -> Callable:
+    """Decorator to time every call of a function as a request stage (see `stage`).
+
+    Args:
+        name (str | None, optional): Stage name. Defaults to `module.function`.
+    """
+    def decorator(func: Callable) -> Callable:
+        label = name or f"{func.__module__}.{func.__name__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = _timings.get()
+            if timings is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                entry = timings.setdefault(label, [0.0, 0])
+                entry[0] += time.perf_counter() - start
+                entry[1] += 1
+        return wrapper
+    return decorator
+
+def add_time(name: str, seconds: float):
+    """Add time measured elsewhere to a stage of the current request, if any.
+
+    Args:
+        name (str): Stage name.
+        seconds (float): Time to add.
+    """
+    timings = _timings.get()
+    if timings is not None:
+        entry = timings.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+def start_request() -> dict:
+    """Start collecting stage timings for the current context. Returns the timings dict."""
+    timings = {}
+    _timings.set(timings)
+    return timings
+
+def end_request() -> dict:
+    """Stop collecting stage timings for the current context. Returns the timings collected."""
+    timings = _timings.get()
+    _timings.set(None)
+    return timings or {}
+#endregion
+
+#region Metrics
+class LatencyHistogram:
+    """Latency histogram with logarithmic buckets, so percentiles can be read off any number of
+    samples in constant memory. Values are in seconds.
+    """
+
+    def __init__(self):
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def _bucket(seconds: float) -> int:
+        if seconds <= HISTOGRAM_MIN:
+            return 0
+        return min(int(math.log(seconds / HISTOGRAM_MIN, HISTOGRAM_RATIO)) + 1, HISTOGRAM_BUCKETS - 1)
+
+    def add(self, seconds: float):
+        self.counts[self._bucket(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        """Approximate `q`th percentile (0-100) in seconds: the upper bound of its bucket, capped at
+        the max seen. NaN if empty."""
+        if self.count == 0:
+            return math.nan
+        rank = math.ceil(q / 100 * self.count)
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= max(rank, 1):
+                return min(HISTOGRAM_MIN * HISTOGRAM_RATIO ** i, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        """Count, and mean/p50/p95/p99/max in ms."""
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else None,
+            **{f"p{q}_ms": self.percentile(q) * 1000 if self.count else None for q in (50, 95, 99)},
+            "max_ms": self.max * 1000,
+        }
+
+class RequestMetrics:
+    """Latency histograms per route and stage (the whole request is the `total` stage), plus
+    profiles of sampled slow requests. Thread safe.
+    """
+
+    def __init__(self, max_samples: int = MAX_SAMPLES):
+        self._histograms = {}
+        self.samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def record(self, route: str, timings: dict, total: float):
+        """Add one request's stage timings (as collected by `stage`) and total time in seconds."""
+        with self._lock:
+            for name, (seconds, _) in [*timings.items(), ("total", (total, 1))]:
+                key = (route, name)
+                if key not in self._histograms:
+                    self._histograms[key] = LatencyHistogram()
+                self._histograms[key].add(seconds)
+
+    def add_sample(self, sample: dict):
+        with self._lock:
+            self.samples.append(sample)
+
+    def summary(self) -> dict:
+        """Route -> stage -> histogram summary (see `LatencyHistogram.summary`)."""
+        with self._lock:
+            out = {}
+            for (route, name), histogram in sorted(self._histograms.items()):
+                out.setdefault(route, {})[name] = histogram.summary()
+            return out
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self.samples.clear()
+#endregion
+
+#region Flask integration
+def server_timing(timings: dict, total: float) -> str:
+    """Format stage timings (seconds) as a `Server-Timing` header value, in ms."""
+    parts = [f"{name};dur={seconds * 1000:.2f}" for name, (seconds, _) in timings.items()]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+def _profile_stats(profiler) -> str:
+    import pstats
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+    return out.getvalue()
+
+def init_app(app, metrics: RequestMetrics | None = None, sample_rate: float = 0.0, slow_ms: float = 200,
+             memory: bool = False, debug_endpoints: bool = False) -> RequestMetrics:
+    """Instrument a Flask app: every response gets a `Server-Timing` header with its stage timings,
+    timings are aggregated per route and stage, and `/debug/metrics` serves the percentiles.
+
+    `/debug/metrics` shows profiles and request paths, so it's a 404 unless `debug_endpoints` is
+    set or the app is in debug mode.
+
+    Optionally, a random sample of requests is profiled with `cProfile` (and `tracemalloc`, which
+    traces every allocation in the process while enabled), and the profiles of the ones slower than
+    `slow_ms` are kept for `/debug/metrics?samples=1`. Profiling slows the sampled requests down
+    considerably, so keep the rate low under load.
+
+    Args:
+        app (Flask): The app.
+        metrics (RequestMetrics | None, optional): Where to aggregate. Defaults to a new one.
+        sample_rate (float, optional): Fraction of requests to profile. Defaults to 0 (off).
+        slow_ms (float, optional): Sampled requests at least this slow are kept. Defaults to 200.
+        memory (bool, optional): Also trace allocations of sampled requests. Defaults to False.
+        debug_endpoints (bool, optional): Serve `/debug/metrics` outside of debug mode. Defaults
+            to False.
+
+    Returns:
+        RequestMetrics: The metrics.
+    """
+    from flask import abort, g, jsonify, request, before_render_template, template_rendered
+
+    metrics = metrics if metrics is not None else RequestMetrics()
+    if memory and sample_rate > 0:
+        import tracemalloc
+        tracemalloc.start()
+
+    @app.before_request
+    def _start():
+        g.request_start = time.perf_counter()
+        start_request()
+        if sample_rate > 0 and random.random() < sample_rate:
+            import cProfile
+            g.profiler = cProfile.Profile()
+            if memory:
+                import tracemalloc
+                g.memory_snapshot = tracemalloc.take_snapshot()
+            g.profiler.enable()
+
+    @app.after_request
+    def _finish(response):
+        start = g.pop("request_start", None)
+        if start is None:
+            return response
+        total = time.perf_counter() - start
+        timings = end_request()
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            if total * 1000 >= slow_ms:
+                sample = {
+                    "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "route": request.endpoint,
+                    "path": request.full_path,
+                    "total_ms": total * 1000,
+                    "stages_ms": {name: seconds * 1000 for name, (seconds, _) in timings.items()},
+                    "profile": _profile_stats(profiler),
+                }
+                before = g.pop("memory_snapshot", None)
+                if before is not None:
+                    import tracemalloc
+                    diff = tracemalloc.take_snapshot().compare_to(before, "lineno")
+                    sample["allocations"] = [str(stat) for stat in diff[:PROFILE_TOP]]
+                metrics.add_sample(sample)
+
+        metrics.record(request.endpoint or "<unmatched>", timings, total)
+        response.headers["Server-Timing"] = server_timing(timings, total)
+        return response
+
+    @app.teardown_request
+    def _cleanup(exception=None):
+        # In case the request failed before `_finish`
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+        end_request()
+
+    # Template rendering has no single function to wrap, so time it with Flask's signals
+    def _render_start(sender, template, context, **extra):
+        g.render_start = time.perf_counter()
+
+    def _render_end(sender, template, context, **extra):
+        start = g.pop("render_start", None)
+        if start is not None:
+            add_time("render", time.perf_counter() - start)
+
+    # Strong references, since the receivers are local functions
+    before_render_template.connect(_render_start, app, weak=False)
+    template_rendered.connect(_render_end, app, weak=False)
+
+    @app.route("/debug/metrics")
+    def debug_metrics():
+        """Latency percentiles (ms) per route and stage since startup. With `samples=1`, also the
+        profiles of sampled slow requests."""
+        if not (debug_endpoints or app.debug):
+            abort(404)
+        out = {"routes": metrics.summary()}
+        if request.args.get("samples"):
+            with metrics._lock:
+                out["samples"] = list(metrics.samples)
+        return jsonify(out)
+
+    return metrics
+#endregion
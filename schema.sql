@@ -1,4 +1,15 @@
+DROP TRIGGER IF EXISTS wr_snapshots_latest;
+DROP TRIGGER IF EXISTS track_times_pb_insert;
+DROP TRIGGER IF EXISTS track_times_pb_delete;
+DROP INDEX IF EXISTS idx_track_times_lookup;
+DROP INDEX IF EXISTS idx_track_times_recent;
+DROP TABLE IF EXISTS wr_latest;
+DROP TABLE IF EXISTS wr_snapshots;
+DROP TABLE IF EXISTS player_totals;
+DROP TABLE IF EXISTS personal_bests;
+DROP TABLE IF EXISTS meta;
 DROP TABLE IF EXISTS tracks;
+DROP TABLE IF EXISTS players;
 DROP TABLE IF EXISTS track_times;
 
 CREATE TABLE tracks (
@@ -9,13 +20,164 @@ CREATE TABLE tracks (
     tr_abbrev TEXT UNIQUE NOT NULL
 );
 
+CREATE TABLE players (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL
+);
+
+-- Player 1 owns all times unless another player is given
+INSERT INTO players (id, name) VALUES (1, 'Me');
+
 CREATE TABLE track_times (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
+    player_id INTEGER NOT NULL DEFAULT 1,
     track TEXT NOT NULL,
     time_str TEXT NOT NULL,
     time_sec REAL NOT NULL,
     cc TEXT NOT NULL,
     items TEXT NOT NULL,
+    FOREIGN KEY (player_id) REFERENCES players(id),
     FOREIGN KEY (track) REFERENCES tracks(tr_name),
-    UNIQUE(track, time_str, cc, items)
+    UNIQUE(player_id, track, time_str, cc, items)
+);
+
+-- Covering index for get_times_for_track and get_times_page (filter and ORDER BY time_sec, id
+-- without a sort step or table lookups, so a page seeks straight to its keyset cursor).
+-- Partitioned by player
+CREATE INDEX idx_track_times_lookup ON track_times (player_id, cc, items, track, time_sec, id, time_str);
+
+-- For get_recent_times: newest first per player, seeking to the cursor id
+CREATE INDEX idx_track_times_recent ON track_times (player_id, id);
+
+-- Current PB per (player, cc, items, track), kept in sync with track_times by the triggers below
+CREATE TABLE personal_bests (
+    player_id INTEGER NOT NULL,
+    cc TEXT NOT NULL,
+    items TEXT NOT NULL,
+    track TEXT NOT NULL,
+    time_id INTEGER NOT NULL,
+    time_str TEXT NOT NULL,
+    time_sec REAL NOT NULL,
+    PRIMARY KEY (player_id, cc, items, track)
+) WITHOUT ROWID;
+
+-- Per-track leaderboards: positions and gaps are index range counts and seeks
+CREATE INDEX idx_personal_bests_rank ON personal_bests (cc, items, track, time_sec, player_id);
+
+CREATE TRIGGER track_times_pb_insert AFTER INSERT ON track_times
+BEGIN
+    INSERT INTO personal_bests (player_id, cc, items, track, time_id, time_str, time_sec)
+    VALUES (NEW.player_id, NEW.cc, NEW.items, NEW.track, NEW.id, NEW.time_str, NEW.time_sec)
+    ON CONFLICT (player_id, cc, items, track) DO UPDATE SET
+        time_id = excluded.time_id,
+        time_str = excluded.time_str,
+        time_sec = excluded.time_sec
+    WHERE excluded.time_sec < personal_bests.time_sec;
+END;
+
+-- Only deleting the PB itself needs work: promote the next best time (if any)
+CREATE TRIGGER track_times_pb_delete AFTER DELETE ON track_times
+WHEN OLD.id = (
+    SELECT time_id FROM personal_bests
+    WHERE player_id = OLD.player_id AND cc = OLD.cc AND items = OLD.items AND track = OLD.track
+)
+BEGIN
+    DELETE FROM personal_bests
+    WHERE player_id = OLD.player_id AND cc = OLD.cc AND items = OLD.items AND track = OLD.track;
+
+    INSERT INTO personal_bests (player_id, cc, items, track, time_id, time_str, time_sec)
+    SELECT player_id, cc, items, track, id, time_str, time_sec
+    FROM track_times
+    WHERE player_id = OLD.player_id AND cc = OLD.cc AND items = OLD.items AND track = OLD.track
+    ORDER BY time_sec, id
+    LIMIT 1;
+END;
+
+-- Sum of PBs per (player, cc, items) for the overall leaderboard, kept in sync with personal_bests.
+-- Totals are whole ms so repeated updates can't accumulate float error
+CREATE TABLE player_totals (
+    player_id INTEGER NOT NULL,
+    cc TEXT NOT NULL,
+    items TEXT NOT NULL,
+    tracks INTEGER NOT NULL,
+    total_ms INTEGER NOT NULL,
+    PRIMARY KEY (player_id, cc, items)
+) WITHOUT ROWID;
+
+CREATE INDEX idx_player_totals_rank ON player_totals (cc, items, tracks, total_ms, player_id);
+
+CREATE TRIGGER personal_bests_totals_insert AFTER INSERT ON personal_bests
+BEGIN
+    INSERT INTO player_totals (player_id, cc, items, tracks, total_ms)
+    VALUES (NEW.player_id, NEW.cc, NEW.items, 1, CAST(ROUND(NEW.time_sec * 1000) AS INTEGER))
+    ON CONFLICT (player_id, cc, items) DO UPDATE SET
+        tracks = tracks + 1,
+        total_ms = total_ms + excluded.total_ms;
+END;
+
+CREATE TRIGGER personal_bests_totals_update AFTER UPDATE OF time_sec ON personal_bests
+BEGIN
+    UPDATE player_totals
+    SET total_ms = total_ms
+        + CAST(ROUND(NEW.time_sec * 1000) AS INTEGER) - CAST(ROUND(OLD.time_sec * 1000) AS INTEGER)
+    WHERE player_id = NEW.player_id AND cc = NEW.cc AND items = NEW.items;
+END;
+
+CREATE TRIGGER personal_bests_totals_delete AFTER DELETE ON personal_bests
+BEGIN
+    UPDATE player_totals
+    SET tracks = tracks - 1,
+        total_ms = total_ms - CAST(ROUND(OLD.time_sec * 1000) AS INTEGER)
+    WHERE player_id = OLD.player_id AND cc = OLD.cc AND items = OLD.items;
+END;
+
+-- WR history, append-only: a row for a track each time its WR changes (so the first snapshot of a
+-- (cc, items) has every track). The WR as of any time is the latest row at or before it, found with
+-- one primary key seek per track. Times are UTC 'YYYY-MM-DD HH:MM:SS'. source_name is the track name
+-- as on the WR site, which differs slightly from tracks.tr_name for some tracks
+CREATE TABLE wr_snapshots (
+    cc TEXT NOT NULL,
+    items TEXT NOT NULL,
+    track TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    source_name TEXT NOT NULL,
+    time_str TEXT NOT NULL,
+    time_ms INTEGER NOT NULL,
+    PRIMARY KEY (cc, items, track, fetched_at),
+    FOREIGN KEY (track) REFERENCES tracks(tr_name)
+) WITHOUT ROWID;
+
+-- Current WR per (cc, items, track), kept in sync with wr_snapshots by the trigger below
+CREATE TABLE wr_latest (
+    cc TEXT NOT NULL,
+    items TEXT NOT NULL,
+    track TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    source_name TEXT NOT NULL,
+    time_str TEXT NOT NULL,
+    time_ms INTEGER NOT NULL,
+    PRIMARY KEY (cc, items, track)
+) WITHOUT ROWID;
+
+CREATE TRIGGER wr_snapshots_latest AFTER INSERT ON wr_snapshots
+BEGIN
+    INSERT INTO wr_latest (cc, items, track, fetched_at, source_name, time_str, time_ms)
+    VALUES (NEW.cc, NEW.items, NEW.track, NEW.fetched_at, NEW.source_name, NEW.time_str, NEW.time_ms)
+    ON CONFLICT (cc, items, track) DO UPDATE SET
+        fetched_at = excluded.fetched_at,
+        source_name = excluded.source_name,
+        time_str = excluded.time_str,
+        time_ms = excluded.time_ms
+    WHERE excluded.fetched_at >= wr_latest.fetched_at;
+END;
+
+-- Counters shared by every process using the db. data_version is bumped by each write in db.py and
+-- used as a cache key for computed pages. It starts at the current time in ms so that re-creating
+-- the db never reuses a version from before
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
 );
+
+INSERT INTO meta (key, value)
+VALUES ('data_version', CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER));
@@ -0,0 +1,210 @@
+from bisect import bisect_left, insort
+import threading
+
+import numpy as np
+
+import db
+from profiling import timed
+from timesheet import STANDARDS_NAMES, StandardsMatrix, get_catalog
+from TrackTime import TrackTime, TrackTimeExt
+
+class SheetStats:
+    """Timesheet statistics for one player and (cc, items), kept up to date one track at a time
+    rather than recomputed from the whole timesheet. Gives the same results as
+    `calculate_sheet_stats`.
+
+    Everything is kept in integer milliseconds, so the running sums (and sum of squares, for the
+    standard deviation) are exact no matter how many updates are applied. The WR diffs are also
+    kept in a sorted list for the median; it holds at most one entry per track, so an update is a
+    binary search plus a small move.
+    """
+
+    def __init__(self, wr_ms: np.ndarray | None, standards: StandardsMatrix | None, pb_ms: np.ndarray = None):
+        """Initialises the stats for a timesheet.
+
+        Args:
+            wr_ms (np.ndarray | None): WRs for every track in ms (NaN if missing), or None if there
+                are no WRs.
+            standards (StandardsMatrix | None): Compiled standards, or None if there are no standards.
+            pb_ms (np.ndarray, optional): Initial PBs for every track in ms, NaN if missing.
+                Defaults to None (no PBs).
+        """
+        n = len(wr_ms) if wr_ms is not None else len(pb_ms)
+        self._wr = [None if np.isnan(t) else int(t) for t in wr_ms.tolist()] if wr_ms is not None else [None] * n
+        self._standards = standards
+        self._pb = [None] * n
+        self._rank = [None] * n
+
+        self.wr_total = sum(t for t in self._wr if t is not None)
+        self.pb_total = 0
+        self.pb_count = 0
+        self.diff_total = 0
+        self.diff_sq_total = 0
+        self.diffs = []                                         # Sorted WR diffs, for the median
+        self.rank_total = 0
+        self.rank_counts = [0] * (len(standards.names) + 1 if standards is not None else 0)
+
+        if pb_ms is not None:
+            for track, pb in enumerate(pb_ms.tolist()):
+                if not np.isnan(pb):
+                    self.set_pb(track, int(pb))
+
+    def __len__(self) -> int:
+        return len(self._pb)
+
+    def _diff(self, track: int) -> int | None:
+        pb, wr = self._pb[track], self._wr[track]
+        return max(pb - wr, 0) if pb is not None and wr is not None else None
+
+    def _apply(self, track: int, sign: int):
+        """Add (`sign=1`) or remove (`sign=-1`) the current PB of a track from the totals."""
+        pb = self._pb[track]
+        if pb is None:
+            return
+        self.pb_total += sign * pb
+        self.pb_count += sign
+
+        diff = self._diff(track)
+        if diff is not None:
+            self.diff_total += sign * diff
+            self.diff_sq_total += sign * diff * diff
+            if sign > 0:
+                insort(self.diffs, diff)
+            else:
+                del self.diffs[bisect_left(self.diffs, diff)]
+
+        rank = self._rank[track]
+        if rank is not None:
+            self.rank_total += sign * rank
+            self.rank_counts[rank - 1] += sign
+
+    def set_pb(self, track: int, pb_ms: int | None):
+        """Set (or clear) the PB of a track, updating every statistic.
+
+        Args:
+            track (int): 0-based track index.
+            pb_ms (int | None): New PB in ms, or None if the track no longer has a PB.
+        """
+        if self._pb[track] == pb_ms:
+            return
+        self._apply(track, -1)
+
+        self._pb[track] = pb_ms
+        self._rank[track] = None
+        if pb_ms is not None and self._standards is not None:
+            rank, _, _ = self._standards.rank(np.array([pb_ms]), np.array([track]))
+            self._rank[track] = int(rank[0])
+        self._apply(track, 1)
+
+    def median_diff_ms(self) -> float:
+        """Median WR diff in ms, NaN if there are none."""
+        n = len(self.diffs)
+        if n == 0:
+            return np.nan
+        mid = n // 2
+        return float(self.diffs[mid]) if n % 2 else (self.diffs[mid - 1] + self.diffs[mid]) / 2
+
+    def std_diff_ms(self) -> float:
+        """Sample standard deviation of the WR diffs in ms, NaN if there are fewer than two."""
+        n = len(self.diffs)
+        if n < 2:
+            return np.nan
+        return float(np.sqrt((n * self.diff_sq_total - self.diff_total ** 2) / (n * (n - 1))))
+
+    def chart_rank_counts(self) -> list:
+        """Number of tracks in each standard (excluding unranked), in `STANDARDS_NAMES` order."""
+        return self.rank_counts[:-1] if self.rank_counts else [0] * len(STANDARDS_NAMES)
+
+    def summary(self) -> dict | None:
+        """The statistics in the format given by `calculate_sheet_stats`.
+
+        Returns:
+            dict | None: The statistics of interest. Returns None if there are no PBs.
+        """
+        if self.pb_count == 0:
+            return None
+
+        stats = {}
+        stats["Total PB Time"] = TrackTimeExt._format_ms(self.pb_total)
+        stats["Total WR Time"] = TrackTimeExt._format_ms(self.wr_total)
+        stats["Total Diff"] = TrackTimeExt._format_ms(self.diff_total)
+
+        if self._standards is not None:
+            stnd_avg = self.rank_total / self.pb_count - 0.5
+            stats["Rank Num Average"] = f"{stnd_avg:.2f}"
+            stats["Overall Rank"] = self._standards.names[int(round(stnd_avg))]
+
+        if self.diffs:
+            diff_avg = self.diff_total / len(self.diffs) / 1000
+            diff_med = self.median_diff_ms() / 1000
+            stats["Diff Average"] = (diff_avg, TrackTime._format_seconds(diff_avg))
+            stats["Diff Median"] = (diff_med, TrackTime._format_seconds(diff_med))
+            if len(self.diffs) > 1:
+                stats["Diff Std Dev"] = TrackTime._format_seconds(self.std_diff_ms() / 1000)
+
+        return stats
+
+class SheetStatsRegistry:
+    """`SheetStats` for every (player, cc, items) that has been viewed, kept in sync with the db.
+
+    Register `pb_changed` with `db.add_time_listener`: each single time insert or delete then
+    updates the one affected track. If the data version moves in any other way (e.g. a bulk import
+    or another process writing), everything is rebuilt from the db on next use.
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _build(self, player_id: int, cc: str, items: str) -> SheetStats:
+        pb_ms = np.array([np.nan if row["best_time_sec"] is None else TrackTime._seconds_to_ms(row["best_time_sec"])
+                          for row in db.get_best_times(cc, items, player_id)])
+        catalog = get_catalog()
+        return SheetStats(catalog.wrs_ms(cc, items), catalog.standards(cc, items), pb_ms)
+
+    @timed("sheet_stats.get")
+    def get(self, cc: str, items: str, player_id: int = db.DEFAULT_PLAYER) -> SheetStats:
+        """Get the up to date stats for a player's timesheet.
+
+        Args:
+            cc (str): CC.
+            items (str): Item type.
+            player_id (int, optional): Player. Defaults to `db.DEFAULT_PLAYER`.
+
+        Returns:
+            SheetStats: The stats. Shouldn't be modified by the caller.
+        """
+        version = db.get_data_version()
+        with self._lock:
+            if version != self._version:
+                self._stats.clear()
+                self._version = version
+            key = (player_id, cc, items)
+            if key not in self._stats:
+                self._stats[key] = self._build(player_id, cc, items)
+            return self._stats[key]
+
+    def pb_changed(self, player_id: int, cc: str, items: str, track: str, version: int):
+        """Time listener (see `db.add_time_listener`). Re-reads the PB of the affected track."""
+        with self._lock:
+            if self._version is None or version != self._version + 1:
+                # Missed a change, so nothing can be trusted
+                self._stats.clear()
+                self._version = None
+                return
+
+            self._version = version
+            stats = self._stats.get((player_id, cc, items))
+            if stats is None:
+                return
+            row = db.query_db("""
+                SELECT time_sec FROM personal_bests
+                WHERE player_id = ? AND cc = ? AND items = ? AND track = ?
+            """, (player_id, cc, items, track), one=True)
+            stats.set_pb(get_catalog()[track].number - 1, TrackTime._seconds_to_ms(row[0]) if row else None)
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+            self._version = None
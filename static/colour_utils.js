@@ -29,15 +29,21 @@ standardsNames.forEach((rank, i) => {
     rankColormap.set(rank, color);
 });
 
-// WR Diff Color Scaling
+// WR Diff Color Scaling (mirrored by DIFF_COLOUR_STEP_MS/DIFF_COLOUR_STEPS in timesheet.py)
 const DIFF_MAX = 10;
 const DIFF_STEP = 1.0;
 
 export function getWRDiffColor(diff) {
     if (isNaN(diff)) return "white";
 
-    let index = Math.max(0, Math.min(Math.floor(diff / DIFF_STEP) / (DIFF_MAX / DIFF_STEP), 1));
-    return d3.interpolateSpectral(1 - index);
+    return getWRDiffStepColor(Math.max(0, Math.min(Math.floor(diff / DIFF_STEP), DIFF_MAX / DIFF_STEP)));
+}
+
+// Colour for a step of the scale, as precomputed by the server in the data-colour attributes
+export function getWRDiffStepColor(step) {
+    if (step === "" || isNaN(step)) return "white";
+
+    return d3.interpolateSpectral(1 - step / (DIFF_MAX / DIFF_STEP));
 }
 
 // Function to lighten or darken a color
@@ -0,0 +1,31 @@
+// "Load More" buttons for keyset-paginated tables. The button holds the endpoint (data-url) and the
+// cursor of the next page (data-next), and is removed after the last page.
+
+// Fetch the next page and pass each row (the page's columns and the row's index) to addRow, which
+// should return the new <tr>. Returns the new rows
+export async function loadMore(button, cursorParam, addRow) {
+    const url = new URL(button.dataset.url, window.location.href);
+    url.searchParams.set(cursorParam, button.dataset.next);
+
+    button.disabled = true;
+    const response = await fetch(url);
+    if (!response.ok) {
+        button.disabled = false;
+        throw new Error(`Failed to load page: ${response.status}`);
+    }
+    const page = await response.json();
+
+    const rows = page.columns.id.map((_, i) => addRow(page.columns, i));
+    if (page.next) {
+        button.dataset.next = page.next;
+        button.disabled = false;
+    } else {
+        button.remove();
+    }
+    return rows;
+}
+
+// Clone the row in a <template> element
+export function cloneRow(templateId) {
+    return document.getElementById(templateId).content.querySelector("tr").cloneNode(true);
+}
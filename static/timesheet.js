@@ -1,4 +1,4 @@
-import { rankColormap, getWRDiffColor } from "./colour_utils.js";
+import { rankColormap, getWRDiffColor, getWRDiffStepColor } from "./colour_utils.js";
 
 const wrBarColors = diff_labels.map(label => {
     let diff = parseFloat(label);
@@ -80,8 +80,10 @@ document.addEventListener("DOMContentLoaded", function() {
     });
 
     // Colour Standard col
+    // Table cells have their colour keys precomputed in data-colour, so their text isn't read (which
+    // forces layout); the stats cells fall back to their text and data-sort
     document.querySelectorAll(".colour-rank").forEach(cell => {
-        let rank = cell.innerText.trim();
+        let rank = cell.dataset.colour ?? cell.innerText.trim();
         if (rankColormap.has(rank)) {
             cell.style.backgroundColor = rankColormap.get(rank);
         }
@@ -89,7 +91,8 @@ document.addEventListener("DOMContentLoaded", function() {
 
     // Colour WR Diff col
     document.querySelectorAll(".colour-diff").forEach(cell => {
-        let diff = parseFloat(cell.getAttribute("data-sort"));
-        cell.style.backgroundColor = getWRDiffColor(diff);
+        cell.style.backgroundColor = cell.dataset.colour !== undefined
+            ? getWRDiffStepColor(cell.dataset.colour)
+            : getWRDiffColor(parseFloat(cell.dataset.sort));
     });
 });
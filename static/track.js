@@ -1,23 +1,125 @@
-import { standardsNames, WRColor, rankColormap, getWRDiffColor, tintColor } from "./colour_utils.js";
+import { standardsNames, WRColor, rankColormap, getWRDiffColor, getWRDiffStepColor, tintColor } from "./colour_utils.js";
+import { loadMore, cloneRow } from "./load_more.js";
 
 let showRankBands = false;
+let timeChart = null;
+
+// M:SS.sss, like TrackTime
+function formatTime(ms) {
+    const minutes = Math.floor(ms / 60000);
+    const seconds = Math.floor(ms / 1000) % 60;
+    return `${minutes}:${String(seconds).padStart(2, "0")}.${String(ms % 1000).padStart(3, "0")}`;
+}
+
+document.addEventListener("DOMContentLoaded", function() {
+    new DataTable("#tsExcerpt", {
+        // See: https://datatables.net/manual/options
+        paging: false,
+        info: false,
+        searching: false,
+        ordering: false,
+        columnDefs: [
+            { className: "dt-head-left", targets: "_all" },
+            { className: "dt-body-center", targets: [3, 4, 5, 6, 7, 8] },
+            { width: "11%", targets: [3, 4, 5, 6, 7, 8] }
+        ]
+    });
+
+    // Colour Standard col
+    // Colour keys are precomputed in data-colour, so the cells' text isn't read (which forces layout)
+    document.querySelectorAll(".colour-rank").forEach(cell => {
+        let rank = cell.dataset.colour ?? cell.innerText.trim();
+        if (rankColormap.has(rank)) {
+            cell.style.backgroundColor = rankColormap.get(rank);
+        }
+    });
+
+    // Colour WR Diff col
+    document.querySelectorAll(".colour-diff").forEach(cell => {
+        cell.style.backgroundColor = cell.dataset.colour !== undefined
+            ? getWRDiffStepColor(cell.dataset.colour)
+            : getWRDiffColor(parseFloat(cell.dataset.sort));
+    });
+
+    let timesTable = new DataTable("#timesTable", {
+        paging: true,
+        pageLength: 10,
+        lengthChange: false,
+        searching: false,
+        ordering: true,
+        order: [[0, "asc"]],   // Position, 1 is the PB
+        columnDefs: [
+            { orderable: true, targets: 0 },
+            { orderable: false, targets: "_all" },
+            { className: "dt-head-left", targets: "_all" },
+            { className: "dt-body-center", targets: [1, 2, 3] },
+        ],
+        layout: {
+            bottomEnd: {
+                paging: {
+                    numbers: false
+                }
+            }
+        }
+    });
+
+    // Further pages of times, from the API
+    let loadMoreButton = document.getElementById("loadMoreTimes");
+    if (loadMoreButton) {
+        loadMoreButton.addEventListener("click", async function() {
+            let rows = await loadMore(loadMoreButton, "after", (columns, i) => {
+                let row = cloneRow("timeRowTemplate");
+                row.cells[0].textContent = columns.position[i];
+                row.cells[1].textContent = columns.time[i];
+                row.cells[2].textContent = columns.impr[i] !== null ? ` -${columns.impr[i]} ` : "";
+                let deleteButton = row.querySelector(".delete-btn");
+                deleteButton.dataset.id = columns.id[i];
+                deleteButton.dataset.time = columns.time[i];
+                return row;
+            });
+            timesTable.rows.add(rows).draw(false);
+        });
+    }
+});
+
+// The chart's times are fetched rather than embedded in the page, which only holds the first page
+// of the times table. They come downsampled, slowest first, keeping every PB improvement; zooming in
+// fetches the window at a higher resolution
+async function fetchChartPoints(start = null, end = null) {
+    let url = new URL(chartDataUrl, window.location.href);
+    if (start !== null) {
+        url.searchParams.set("start", start);
+        url.searchParams.set("end", end);
+    }
+    const chartData = await fetch(url).then(response => response.json());
+    const columns = chartData.columns;
+    return {
+        total: chartData.total,
+        points: columns.num.map((num, i) => ({ x: num, y: columns.time_ms[i] / 1000, pb: columns.pb[i] }))
+    };
+}
+
+const overview = await fetchChartPoints();
+const total = overview.total;
+const downsampled = overview.points.length < total;
+let windowRequest = 0;
 
 // PB Progression Line
 const pbDataset = {
     label: 'PB Progression',
-    data: timesSec,
+    data: overview.points,
     borderColor: '#36A2EB',
     backgroundColor: '#9BD0F5',
     tension: 0.05,
-    pointRadius: 6,
+    pointRadius: context => context.raw?.pb ? 6 : 3,
     pointHoverRadius: 10,
     fill: false
 };
 
-// WR Line
+// WR Line, across the whole range (at least two points to draw a line)
 const wrDataset = {
     label: 'WR',
-    data: wrData,
+    data: [{ x: 1, y: wrSec }, { x: Math.max(total, 2), y: wrSec }],
     borderColor: WRColor,
     borderDash: [20, 6],
     borderWidth: 3,
@@ -26,6 +128,20 @@ const wrDataset = {
     hidden: true  
 };
 
+// Replace the line with the visible window at a higher resolution, after zooming or panning
+async function loadWindow({ chart }) {
+    if (!downsampled) return;   // Already has every point
+    const request = ++windowRequest;
+    // One more point each side, so the line runs off the edges
+    const start = Math.max(Math.floor(chart.scales.x.min) - 1, 1);
+    const end = Math.min(Math.ceil(chart.scales.x.max) + 1, total);
+    const points = start > 1 || end < total ? (await fetchChartPoints(start, end)).points : overview.points;
+    if (request !== windowRequest) return;  // Superseded by a later zoom or pan
+    chart.data.datasets[0].data = points;
+    chart.update("none");
+    if (showRankBands) updateRankBands();
+}
+
 // Function to create rank band annotations
 // See: https://www.chartjs.org/chartjs-plugin-annotation/latest/samples/box/quarters.html
 function getRankAnnotations(chart) {
@@ -65,10 +181,9 @@ function getRankAnnotations(chart) {
 
 // Improvement chart
 const ctx = document.getElementById('timeProgressChart').getContext('2d');
-const timeChart = new Chart(ctx, {
+timeChart = new Chart(ctx, {
     type: "line",
     data: {
-        labels: indices.length > 1 ? indices : wrLabels,
         datasets: [pbDataset, wrDataset]
     },
     options: {
@@ -79,8 +194,8 @@ const timeChart = new Chart(ctx, {
                     label: function(tooltipItem) {
                         // Ensure custom tooltip only applies to the main dataset (index 0)
                         if (tooltipItem.datasetIndex === 0) {
-                            const index = tooltipItem.dataIndex;
-                            return `${timesStr[index]} (${timesSec[index].toFixed(3)})`;
+                            const seconds = tooltipItem.parsed.y;
+                            return `${formatTime(Math.round(seconds * 1000))} (${seconds.toFixed(3)})`;
                         }
                         return null;
                     }
@@ -92,6 +207,17 @@ const timeChart = new Chart(ctx, {
             annotation: { // Rank bands
                 common: { drawTime: 'beforeDraw' },
                 annotations: []
+            },
+            zoom: {
+                // See: https://www.chartjs.org/chartjs-plugin-zoom/latest/guide/options.html
+                limits: { x: { min: 1, max: Math.max(total, 2), minRange: 2 } },
+                pan: { enabled: true, mode: "x", modifierKey: "shift", onPanComplete: loadWindow },
+                zoom: {
+                    drag: { enabled: true },
+                    wheel: { enabled: true, modifierKey: "ctrl" },
+                    mode: "x",
+                    onZoomComplete: loadWindow
+                }
             }
         },
         // interaction: {
@@ -100,6 +226,10 @@ const timeChart = new Chart(ctx, {
         // },
         scales: {
             x: {
+                type: "linear",
+                min: 1,
+                max: Math.max(total, 2),
+                ticks: { precision: 0 },
                 title: {
                     display: true,
                     text: "Improvement #",
@@ -159,53 +289,11 @@ document.getElementById("toggleRankBands").addEventListener("click", function ()
     updateRankBands();
 });
 
-document.addEventListener("DOMContentLoaded", function() {
-    new DataTable("#tsExcerpt", {
-        // See: https://datatables.net/manual/options
-        paging: false,
-        info: false,
-        searching: false,
-        ordering: false,
-        columnDefs: [
-            { className: "dt-head-left", targets: "_all" },
-            { className: "dt-body-center", targets: [3, 4, 5, 6, 7, 8] },
-            { width: "11%", targets: [3, 4, 5, 6, 7, 8] }
-        ]
-    });
-
-    // Colour Standard col
-    document.querySelectorAll(".colour-rank").forEach(cell => {
-        let rank = cell.innerText.trim();
-        if (rankColormap.has(rank)) {
-            cell.style.backgroundColor = rankColormap.get(rank);
-        }
-    });
-
-    // Colour WR Diff col
-    document.querySelectorAll(".colour-diff").forEach(cell => {
-        let diff = parseFloat(cell.getAttribute("data-sort"));
-        cell.style.backgroundColor = getWRDiffColor(diff);
-    });
-
-    new DataTable("#timesTable", {
-        paging: true,
-        pageLength: 10,
-        lengthChange: false,
-        searching: false,
-        ordering: true,
-        order: [[0, "desc"]],
-        columnDefs: [
-            { orderable: true, targets: 0 },
-            { orderable: false, targets: "_all" },
-            { className: "dt-head-left", targets: "_all" },
-            { className: "dt-body-center", targets: [1, 2, 3] },
-        ],
-        layout: {
-            bottomEnd: {
-                paging: {
-                    numbers: false
-                }
-            }
-        }
-    });
+// Reset Zoom Button, back to the overview
+document.getElementById("resetZoom").addEventListener("click", function () {
+    windowRequest++;
+    timeChart.resetZoom();
+    timeChart.data.datasets[0].data = overview.points;
+    timeChart.update("none");
+    if (showRankBands) updateRankBands();
 });
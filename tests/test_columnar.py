@@ -0,0 +1,104 @@
+"""Tests for the columnar dataset (see `columnar`): exporting a db and importing the dataset into a
+fresh one must give back the same rows, with times exact to the ms.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import columnar
+import db
+import timesheet as ts
+
+TIMES = [   # (track number, time, cc, items, player id)
+    (1, "1:07.351", "150cc", "Shrooms", 1),     # 67.351 s isn't exact as a float
+    (1, "1:06.999", "150cc", "Shrooms", 1),
+    (2, "2:00.001", "200cc", "Shrooms", 2),
+    (3, "0:59.100", "150cc", "NITA", 2),
+    (3, "1:59.999", "200cc", "NITA", 1),
+]
+
+def new_db(path):
+    db.close_db()
+    db.DB_FILE = str(path)
+    db.init_db()
+    db.init_tracks_from_csv(ts.TRACKS_FILE)
+
+def dump(table: str, columns: str) -> list:
+    return [tuple(row) for row in db.query_db(f"SELECT {columns} FROM {table} ORDER BY {columns}")]
+
+TABLES = {
+    "players": "id, name",
+    "track_times": "id, player_id, track, time_str, time_sec, cc, items",
+    "personal_bests": "player_id, cc, items, track, time_id, time_str, time_sec",
+    "wr_snapshots": "cc, items, track, fetched_at, source_name, time_str, time_ms",
+}
+
+@pytest.fixture
+def source_db(tmp_path, monkeypatch):
+    """A db with a second player, a few times and the WR CSV snapshots. Returns its table contents."""
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(db, "DB_FILE", db.DB_FILE)
+    new_db(tmp_path / "source.db")
+    db.add_players([(2, "Other")])
+    names = ts.get_catalog().names
+    for track, time, cc, items, player_id in TIMES:
+        db.insert_time(names[track - 1], time, cc, items, player_id)
+    db.import_wr_csvs()
+    yield {table: dump(table, columns) for table, columns in TABLES.items()}
+    db.close_db()
+
+def test_export_columns(source_db, tmp_path):
+    path = str(tmp_path / "export")
+    manifest = columnar.export_dataset(path)
+    assert columnar.read_manifest(path) == manifest
+    assert manifest["tables"]["track_times"]["rows"] == len(TIMES)
+    assert manifest["tables"]["players"]["rows"] == 2
+
+    times = columnar.load_table(path, "track_times")
+    names = ts.get_catalog().names
+    assert times["track"].astype(str).tolist() == [names[track - 1] for track, *_ in TIMES]
+    assert times["time_ms"].tolist() == [67351, 66999, 120001, 59100, 119999]
+    assert times["cc"].astype(str).tolist() == [cc for _, _, cc, _, _ in TIMES]
+    assert times["items"].astype(str).tolist() == [items for _, _, _, items, _ in TIMES]
+    assert times["time_ms"].dtype == np.int32
+
+    wrs = columnar.load_table(path, "wrs", mmap=False)
+    catalog = ts.get_catalog()
+    shrooms = wrs[(wrs["cc"] == "150cc") & (wrs["items"] == "Shrooms")]
+    assert shrooms["time_ms"].tolist() == catalog.wrs_ms("150cc", "Shrooms").tolist()
+
+    with pytest.raises(ValueError):
+        columnar.load_table(path, "missing")
+    with pytest.raises(ValueError):
+        columnar.export_dataset(path, "csv")
+
+def test_round_trip(source_db, tmp_path):
+    path = str(tmp_path / "export")
+    columnar.export_dataset(path)
+
+    new_db(tmp_path / "imported.db")
+    stats = columnar.import_dataset(path)
+    assert stats["players"] == 2
+    assert stats["wr_snapshots"] == len(source_db["wr_snapshots"])
+    for table, columns in TABLES.items():
+        assert dump(table, columns) == source_db[table], table
+
+    # Importing again adds nothing
+    assert columnar.import_dataset(path)["wr_snapshots"] == 0
+    assert dump("track_times", TABLES["track_times"]) == source_db["track_times"]
+
+def test_parquet_round_trip(source_db, tmp_path):
+    pytest.importorskip("pyarrow")
+    path = str(tmp_path / "export")
+    columnar.export_dataset(path, "parquet")
+    assert columnar.load_table(path, "track_times")["time_ms"].tolist() == [67351, 66999, 120001, 59100, 119999]
+
+    new_db(tmp_path / "imported.db")
+    columnar.import_dataset(path)
+    for table, columns in TABLES.items():
+        assert dump(table, columns) == source_db[table], table
@@ -0,0 +1,70 @@
+"""Tests for `timesheet.aggregate_distributions`, against a straightforward per-time count."""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timesheet import MAX_DIFF_BUCKETS, MIN_DIFF_BUCKET_MS, aggregate_distributions
+
+N_RANKS = 5
+
+def naive_counts(diffs: list, ranks: list, bucket_ms: int) -> tuple:
+    n_buckets = max((int(round(d)) // bucket_ms for d in diffs if not np.isnan(d)), default=-1) + 1
+    diff_counts = [0] * n_buckets
+    rank_counts = [0] * (N_RANKS + 1)
+    joint = np.zeros((N_RANKS + 1, n_buckets), dtype=np.int64)
+    for d, r in zip(diffs, ranks):
+        if not np.isnan(d):
+            diff_counts[int(round(d)) // bucket_ms] += 1
+        if not np.isnan(r):
+            rank_counts[int(r) - 1] += 1
+        if not np.isnan(d) and not np.isnan(r):
+            joint[int(r) - 1, int(round(d)) // bucket_ms] += 1
+    return diff_counts, rank_counts, joint
+
+def test_matches_naive_counts():
+    rng = np.random.default_rng(0)
+    diffs = rng.uniform(0, 20000, 500)
+    diffs[rng.random(500) < 0.1] = np.nan
+    ranks = rng.integers(1, N_RANKS + 2, 500).astype(float)     # N_RANKS + 1 is Unranked
+    ranks[rng.random(500) < 0.1] = np.nan
+
+    for bucket_ms in (1000, 250, 3000):
+        dists = aggregate_distributions(diffs, ranks, N_RANKS, bucket_ms)
+        diff_counts, rank_counts, joint = naive_counts(diffs, ranks, bucket_ms)
+        assert dists.bucket_ms == bucket_ms
+        assert dists.diff_counts.tolist() == diff_counts
+        assert dists.rank_counts.tolist() == rank_counts
+        assert (dists.joint == joint).all()
+
+def test_empty_and_all_missing():
+    dists = aggregate_distributions(np.array([]), np.array([]), N_RANKS)
+    assert dists.diff_counts.tolist() == []
+    assert dists.rank_counts.tolist() == [0] * (N_RANKS + 1)
+
+    dists = aggregate_distributions(np.array([np.nan, np.nan]), np.array([1.0, np.nan]), N_RANKS)
+    assert dists.diff_counts.tolist() == []
+    assert dists.rank_counts.tolist() == [1] + [0] * N_RANKS
+
+def test_narrow_buckets_are_clamped():
+    for bucket_ms in (0, -5, 1):
+        dists = aggregate_distributions(np.array([50.0, 250.0]), np.array([1.0, 2.0]), N_RANKS, bucket_ms)
+        assert dists.bucket_ms == MIN_DIFF_BUCKET_MS
+        assert dists.diff_counts.tolist() == [1, 0, 1]
+
+def test_bucket_count_is_capped():
+    # One outlier would need a million buckets at this width, so they're widened
+    diffs = np.array([0.0, 500.0, 1e8])
+    dists = aggregate_distributions(diffs, np.full(3, np.nan), N_RANKS, MIN_DIFF_BUCKET_MS)
+    assert len(dists.diff_counts) <= MAX_DIFF_BUCKETS
+    assert dists.bucket_ms % MIN_DIFF_BUCKET_MS == 0
+    assert dists.diff_counts.sum() == 3
+    assert dists.diff_counts[-1] == 1
+    assert int(1e8) // dists.bucket_ms == len(dists.diff_counts) - 1
+
+    # Right at the limit, the width is kept
+    diffs = np.array([0.0, (MAX_DIFF_BUCKETS - 1) * 1000.0])
+    dists = aggregate_distributions(diffs, np.full(2, np.nan), N_RANKS, 1000)
+    assert dists.bucket_ms == 1000 and len(dists.diff_counts) == MAX_DIFF_BUCKETS
@@ -0,0 +1,88 @@
+"""Tests for `SheetStats`: after any sequence of PB updates, the incrementally maintained stats must
+match `calculate_sheet_stats` on a timesheet built from scratch.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import timesheet as ts
+from sheet_stats import SheetStats
+from TrackTime import TrackTime
+
+CC = "150cc"
+ITEMS = "Shrooms"
+
+@pytest.fixture
+def catalog(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    return ts.get_catalog()
+
+def sheet_summary(catalog, pb_ms: np.ndarray) -> dict | None:
+    pbs = [None if np.isnan(pb) else TrackTime._format_ms(int(pb)) for pb in pb_ms]
+    sheet = ts.create_timesheet_df(catalog.names, pbs, catalog.wrs(CC, ITEMS), CC, ITEMS)
+    return ts.calculate_sheet_stats(sheet)
+
+def assert_same_summary(actual: dict | None, expected: dict | None):
+    if expected is None:
+        assert actual is None
+        return
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        if isinstance(value, tuple):    # (seconds, formatted)
+            assert actual[key][0] == pytest.approx(float(value[0]))
+            assert actual[key][1] == value[1]
+        else:
+            assert actual[key] == value, key
+
+def test_matches_full_recompute_after_updates(catalog):
+    wr_ms = catalog.wrs_ms(CC, ITEMS)
+    rng = np.random.default_rng(0)
+    pb_ms = (wr_ms + rng.integers(0, 20000, len(wr_ms))).astype(float)
+    pb_ms[rng.random(len(wr_ms)) < 0.2] = np.nan
+
+    stats = SheetStats(wr_ms, catalog.standards(CC, ITEMS), pb_ms)
+    assert_same_summary(stats.summary(), sheet_summary(catalog, pb_ms))
+
+    for _ in range(300):
+        track = int(rng.integers(len(wr_ms)))
+        pb = None if rng.random() < 0.1 else int(wr_ms[track] + rng.integers(0, 20000))
+        stats.set_pb(track, pb)
+        pb_ms[track] = np.nan if pb is None else pb
+    assert_same_summary(stats.summary(), sheet_summary(catalog, pb_ms))
+
+    # Same as building the stats from the final PBs directly
+    assert stats.summary() == SheetStats(wr_ms, catalog.standards(CC, ITEMS), pb_ms).summary()
+
+def test_pb_faster_than_wr_counts_as_no_diff(catalog):
+    wr_ms = catalog.wrs_ms(CC, ITEMS)
+    stats = SheetStats(wr_ms, catalog.standards(CC, ITEMS))
+    stats.set_pb(0, int(wr_ms[0]) - 500)
+    stats.set_pb(1, int(wr_ms[1]) + 1500)
+    assert stats.diffs == [0, 1500]
+    assert stats.diff_total == 1500
+    assert stats.median_diff_ms() == 750
+
+def test_clearing_every_pb_resets_the_totals(catalog):
+    wr_ms = catalog.wrs_ms(CC, ITEMS)
+    pb_ms = (wr_ms + 1000).astype(float)
+    stats = SheetStats(wr_ms, catalog.standards(CC, ITEMS), pb_ms)
+    for track in range(len(stats)):
+        stats.set_pb(track, None)
+
+    assert stats.summary() is None
+    assert (stats.pb_total, stats.pb_count, stats.diff_total, stats.diff_sq_total, stats.rank_total) == (0, 0, 0, 0, 0)
+    assert stats.diffs == [] and not any(stats.rank_counts)
+    assert np.isnan(stats.median_diff_ms()) and np.isnan(stats.std_diff_ms())
+
+def test_without_wrs_or_standards():
+    pb_ms = np.array([60000.0, np.nan, 90000.0])
+    stats = SheetStats(None, None, pb_ms)
+    summary = stats.summary()
+    assert summary["Total PB Time"] == "0:02:30.000"
+    assert "Overall Rank" not in summary and "Diff Average" not in summary
+    assert stats.chart_rank_counts() == [0] * len(ts.STANDARDS_NAMES)
@@ -0,0 +1,68 @@
+"""Tests for `TrackTime`'s integer ms representation and the batch parse/format functions, which
+must agree exactly with the scalar ones.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TrackTime import MISSING_MS, TrackTime, TrackTimeExt, format_times, parse_times
+
+def test_scalar_parse_and_format():
+    assert TrackTime("1:06.243").ms == 66243
+    assert TrackTime("0:59.100").ms == 59100
+    assert str(TrackTime.from_ms(66243)) == "1:06.243"
+    assert TrackTimeExt("1:02:03.004").ms == ((1 * 60 + 2) * 60 + 3) * 1000 + 4
+    assert str(TrackTimeExt.from_ms(3723004)) == "1:02:03.004"
+    with pytest.raises(ValueError):
+        TrackTime("1:6.243")
+
+def test_seconds_to_ms_avoids_float_error():
+    # 7.351 is 7.350999... as a float, which would truncate to 7350
+    assert TrackTime._seconds_to_ms(7.351) == 7351
+    assert TrackTime._format_seconds(66.243) == "1:06.243"
+    assert TrackTime.from_seconds(0.001).ms == 1
+
+def test_arithmetic_and_comparisons():
+    a, b = TrackTime("1:06.243"), TrackTime("1:05.000")
+    assert str(a - b) == "0:01.243"
+    assert str(a + b) == "2:11.243"
+    assert b < a and a > b and a == "1:06.243" and a >= "1:06.243" and b <= a
+
+def test_batch_parse_matches_scalar():
+    rng = np.random.default_rng(0)
+    ms = rng.integers(0, 10 * 60 * 1000, 1000)
+    strs = [TrackTime._format_ms(int(t)) for t in ms]
+    strs.append("123:45.678")   # Minutes wider than usual
+    expected = [TrackTime(t).ms for t in strs]
+    assert parse_times(strs).tolist() == expected
+
+    ext_strs = [TrackTimeExt._format_ms(int(t) * 7) for t in ms]
+    assert parse_times(ext_strs, ext=True).tolist() == [TrackTimeExt(t).ms for t in ext_strs]
+
+def test_batch_parse_invalid():
+    times = ["1:06.243", "", "1:6.243", None, "1:06.2435", "12345678901234:00.000"]
+    with pytest.raises(ValueError):
+        parse_times(times)
+    out = parse_times(times, fill=MISSING_MS)
+    assert out.tolist() == [66243, MISSING_MS, MISSING_MS, MISSING_MS, MISSING_MS, 12345678901234 * 60000]
+
+def test_batch_parse_empty():
+    out = parse_times([])
+    assert out.dtype == np.int64 and out.shape == (0,)
+    assert parse_times([], ext=True).shape == (0,)
+    assert parse_times(iter(()), fill=MISSING_MS).shape == (0,)
+
+def test_batch_format():
+    ms = [66243, 0, 59100, 600000, MISSING_MS, np.nan]
+    assert format_times(ms).tolist() == ["1:06.243", "0:00.000", "0:59.100", "10:00.000", None, None]
+    assert format_times([3723004], ext=True).tolist() == ["1:02:03.004"]
+    assert format_times([-1], missing="").tolist() == [""]
+    assert format_times([]).shape == (0,)
+
+def test_batch_round_trip():
+    ms = np.random.default_rng(1).integers(0, 10 * 60 * 1000, 1000)
+    assert parse_times(format_times(ms)).tolist() == ms.tolist()
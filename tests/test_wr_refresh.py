@@ -0,0 +1,182 @@
+"""Tests for the background WR refresh (see `wr_refresh`), against a local stand-in HTTP server
+serving mkwrs-style pages with ETags, so no real network access is needed.
+"""
+import http.server
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db
+import outreach
+import timesheet as ts
+from TrackTime import TrackTime
+from wr_refresh import WRRefresher
+
+CC = "150cc"
+ITEMS = "Shrooms"
+
+def mkwrs_time(time: str) -> str:
+    """M:SS.sss -> M'SS"mmm, as mkwrs writes times."""
+    return time.replace(":", "'").replace(".", '"')
+
+def wrs_page(rows: list) -> str:
+    """A mkwrs-style page: the WRs are the second table, with a total row."""
+    cells = "".join(f"<tr><td>{track}</td><td>{mkwrs_time(time)}</td></tr>" for track, time in rows)
+    return ("<html><body><table><tr><td>Menu</td></tr></table>"
+            f"<table><tr><th>Track</th><th>Time</th></tr>{cells}<tr><td>Total</td><td>0'00\"000</td></tr></table>"
+            "</body></html>")
+
+class WRServer:
+    """Serves a page per path with a strong ETag, answering matching conditional requests with 304."""
+
+    def __init__(self):
+        self.pages = {}         # Path -> (etag, html)
+        self.statuses = []      # Status of each response, in order
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                etag, html = server.pages[self.path]
+                if self.headers.get("If-None-Match") == etag:
+                    server.statuses.append(304)
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                body = html.encode()
+                server.statuses.append(200)
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def serve(self, path: str, rows: list, version: int):
+        self.pages[path] = (f'"{version}"', wrs_page(rows))
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """A fresh db with the tracks and the WR CSV snapshots, a catalog loaded from it, and the WR
+    pages served locally with the current WRs."""
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1")
+    monkeypatch.setattr(db, "DB_FILE", str(tmp_path / "track_times.db"))
+    db.init_db()
+    db.init_tracks_from_csv(ts.TRACKS_FILE)
+    db.import_wr_csvs()
+
+    original, original_version = ts._catalog, ts._catalog_version
+    ts._set_catalog(ts.load_catalog())
+    ts._catalog_version = None
+
+    wr_server = WRServer()
+    monkeypatch.setattr(outreach, "WRS_150_URL", f"{wr_server.url}/wrs.php")
+    monkeypatch.setattr(outreach, "WRS_200_URL", f"{wr_server.url}/wrs_200.php")
+    for cc, path in [("150cc", "/wrs.php"), ("200cc", "/wrs_200.php")]:
+        wr_server.serve(path, current_rows(cc), 1)
+
+    yield wr_server
+
+    wr_server.close()
+    ts._set_catalog(original)
+    ts._catalog_version = original_version
+    db.close_db()
+
+def current_rows(cc: str = CC) -> list:
+    return [tuple(row) for row in ts.get_catalog().wr_frame(cc, ITEMS).itertuples(index=False)]
+
+def refresher(tmp_path, swaps: list) -> WRRefresher:
+    return WRRefresher(cache_dir=str(tmp_path / "http_cache"), on_swap=lambda cc, items: swaps.append((cc, items)))
+
+def test_unchanged_page_is_not_swapped(server, tmp_path):
+    swaps = []
+    wr_refresher = refresher(tmp_path, swaps)
+    catalog = ts.get_catalog()
+
+    assert wr_refresher.refresh(CC, ITEMS) == "unchanged"
+    assert wr_refresher.refresh(CC, ITEMS) == "unchanged"
+
+    assert server.statuses == [200, 304]   # The second fetch is conditional on the cached ETag
+    assert ts.get_catalog() is catalog
+    assert swaps == []
+
+def test_changed_page_is_recorded_and_swapped(server, tmp_path):
+    swaps = []
+    wr_refresher = refresher(tmp_path, swaps)
+    assert wr_refresher.refresh(CC, ITEMS) == "unchanged"
+
+    rows = current_rows()
+    track, time = rows[0]
+    new_time = TrackTime._format_ms(TrackTime(time).ms - 250)
+    rows[0] = (track, new_time)
+    server.serve("/wrs.php", rows, 2)
+
+    assert wr_refresher.refresh(CC, ITEMS) == "updated"
+    assert server.statuses == [200, 200]
+    assert db.get_latest_wrs(CC, ITEMS)[0]["time_str"] == new_time
+    assert ts.get_catalog().wr(CC, ITEMS, 1) == new_time
+    assert swaps == [(CC, ITEMS)]
+
+    # The new page is cached, so the next check is a 304 that changes nothing
+    assert wr_refresher.refresh(CC, ITEMS) == "unchanged"
+    assert server.statuses[-1] == 304
+    assert swaps == [(CC, ITEMS)]
+
+def _swap_track_order(rows: list) -> list:
+    rows[0], rows[1] = rows[1], rows[0]
+    return rows
+
+def _jump_first_wr(rows: list) -> list:
+    track, time = rows[0]
+    rows[0] = (track, TrackTime._format_ms(int(TrackTime(time).ms * 1.2)))
+    return rows
+
+@pytest.mark.parametrize("corrupt", [_swap_track_order, _jump_first_wr])
+def test_invalid_page_is_rejected(server, tmp_path, corrupt):
+    swaps = []
+    wr_refresher = refresher(tmp_path, swaps)
+    catalog = ts.get_catalog()
+    latest = [tuple(row) for row in db.get_latest_wrs(CC, ITEMS)]
+    server.serve("/wrs.php", corrupt(current_rows()), 2)
+
+    with pytest.raises(ValueError):
+        wr_refresher.refresh(CC, ITEMS)
+
+    assert ts.get_catalog() is catalog
+    assert [tuple(row) for row in db.get_latest_wrs(CC, ITEMS)] == latest
+    assert swaps == []
+
+    # `refresh_all` records the failure rather than raising, and keeps the old WRs too
+    assert wr_refresher.refresh_all()[(CC, ITEMS)].startswith("error")
+    assert ts.get_catalog().wrs(CC, ITEMS) == catalog.wrs(CC, ITEMS)
+
+def test_other_process_wrs_are_synced(server):
+    # WRs recorded by another worker's refresher reach this process when the data version changes
+    rows = current_rows()
+    track, time = rows[0]
+    new_time = TrackTime._format_ms(TrackTime(time).ms - 250)
+    rows[0] = (track, new_time)
+    db.record_wrs(CC, ITEMS, rows)
+    version = db.bump_data_version()
+
+    assert ts.get_catalog().wr(CC, ITEMS, 1) == time
+    assert ts.sync_catalog(version).wr(CC, ITEMS, 1) == new_time
+    assert server.statuses == []
@@ -1,43 +1,132 @@
 import csv
 from datetime import datetime
-import matplotlib
-import matplotlib.pyplot as plt
+from functools import lru_cache
+import glob
+import os
+import sqlite3
+import threading
+from types import MappingProxyType
+from typing import NamedTuple
 import numpy as np
 import pandas as pd
 from pandas import DataFrame, Series
-import seaborn as sns
 
-from outreach import fetch_wrs_shrooms
-from TrackTime import TrackTime, TrackTimeExt
+from profiling import timed
+from TrackTime import MISSING_MS, TrackTime, TrackTimeExt, parse_times
 
 pd.set_option('display.max_rows', 20)
 pd.set_option('display.max_columns', 20)
 pd.set_option('display.width', 0)
-sns.set_theme(style="whitegrid")
 
 #region Globals
 CC_CATEGORIES = ["150cc", "200cc"]
 ITEM_OPTIONS = ["Shrooms", "NITA"]
 
-WRS_150_SHROOMS = pd.read_csv("data/150cc_wrs_25_02_2025.csv", header=None)
-WRS_200_SHROOMS = pd.read_csv("data/200cc_wrs_25_02_2025.csv", header=None)
+# Reference data is read on first use rather than at import, see `_load_data`. Each of these is
+# still available as a module attribute, e.g. `timesheet.WRS_150_SHROOMS`. Paths with a `*` are WR
+# snapshots, resolved to the latest one (see `latest_wrs_file`)
+WRS_SNAPSHOT_FORMAT = "data/{cc}_wrs_{date}.csv"
+DATA_FILES = {
+    "WRS_150_SHROOMS": (WRS_SNAPSHOT_FORMAT.format(cc="150cc", date="*"), {"header": None}),
+    "WRS_200_SHROOMS": (WRS_SNAPSHOT_FORMAT.format(cc="200cc", date="*"), {"header": None}),
+    "STANDARDS_150_SHROOMS": ("data/150cc_standards.csv", {}),
+    "STANDARDS_150_NITA": ("data/150cc_nita_standards.csv", {}),
+}
 WRS_150_NITA = None
 WRS_200_NITA = None
-
-STANDARDS_150_SHROOMS = pd.read_csv("data/150cc_standards.csv")
 STANDARDS_200_SHROOMS = None
-STANDARDS_150_NITA = pd.read_csv("data/150cc_nita_standards.csv")
 STANDARDS_200_NITA = None
+TRACKS_FILE = "data/track_names.csv"
+DIFF_BUCKET_MS = 1000   # Default width of the WR diff histogram buckets, see `aggregate_distributions`
+MIN_DIFF_BUCKET_MS = 100    # Narrower buckets are widened to this
+MAX_DIFF_BUCKETS = 1000     # Buckets are widened if the largest diff would need more than this
+
+# (cc, items) -> name in `DATA_FILES`, None where the data doesn't exist (yet)
+WRS_DATA = {
+    ("150CC", "SHROOMS"): "WRS_150_SHROOMS",
+    ("200CC", "SHROOMS"): "WRS_200_SHROOMS",
+    ("150CC", "NITA"): None,
+    ("200CC", "NITA"): None,
+}
+STANDARDS_DATA = {
+    ("150CC", "SHROOMS"): "STANDARDS_150_SHROOMS",
+    ("200CC", "SHROOMS"): None,
+    ("150CC", "NITA"): "STANDARDS_150_NITA",
+    ("200CC", "NITA"): None,
+}
 STANDARDS_NAMES = [
     'God', 'Myth A', 'Myth B', 'Myth C', 'Titan A', 'Titan B', 'Titan C', 
     'Hero A', 'Hero B', 'Hero C', 'Exp A', 'Exp B', 'Exp C', 'Adv A', 'Adv B', 'Adv C', 
     'Int A', 'Int B', 'Int C', 'Beg A', 'Beg B', 'Beg C'
 ]
 
-# See: https://matplotlib.org/stable/gallery/color/colormap_reference.html
-cmap = matplotlib.colormaps.get_cmap("plasma")
-gradient = np.linspace(0, 1, len(STANDARDS_NAMES))
-STANDARDS_COLOURS = [matplotlib.colors.to_hex(cmap(i)) for i in gradient]
+@lru_cache(maxsize=None)
+def _load_data(name: str) -> DataFrame:
+    """Read one of the reference CSVs in `DATA_FILES`, once.
+
+    Args:
+        name (str): Global name of the data, e.g. `"WRS_150_SHROOMS"`.
+
+    Returns:
+        DataFrame: The data.
+    """
+    path, kwargs = DATA_FILES[name]
+    if "*" in path:
+        path = latest_wrs_file(path)
+    return pd.read_csv(path, **kwargs)
+
+def latest_wrs_file(pattern: str) -> str:
+    """Find the latest WR snapshot matching a pattern, by the `DD_MM_YYYY` date in the filename.
+
+    Args:
+        pattern (str): Glob pattern, e.g. `"data/150cc_wrs_*.csv"`.
+
+    Raises:
+        FileNotFoundError: If there are no snapshots.
+
+    Returns:
+        str: Path to the latest snapshot.
+    """
+    def snapshot_date(path: str) -> datetime:
+        try:
+            return datetime.strptime(os.path.basename(path).rsplit("_wrs_", 1)[1][:-4], "%d_%m_%Y")
+        except (IndexError, ValueError):
+            return datetime.min
+
+    paths = glob.glob(pattern)
+    if not paths:
+        raise FileNotFoundError(f"No WR snapshots found: {pattern}")
+    return max(paths, key=lambda path: (snapshot_date(path), path))
+
+@lru_cache(maxsize=None)
+def _standards_colours() -> list:
+    """Hex colours for each standard, sampled from a matplotlib colormap.
+
+    See: https://matplotlib.org/stable/gallery/color/colormap_reference.html
+    """
+    import matplotlib
+    cmap = matplotlib.colormaps.get_cmap("plasma")
+    gradient = np.linspace(0, 1, len(STANDARDS_NAMES))
+    return [matplotlib.colors.to_hex(cmap(i)) for i in gradient]
+
+def __getattr__(name: str):
+    """Lazily provide the reference data and colour globals (PEP 562)."""
+    if name in DATA_FILES:
+        return _load_data(name)
+    if name == "STANDARDS_COLOURS":
+        return _standards_colours()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _plotting():
+    """Import the plotting libraries on first use, since only the visualisation functions need them.
+
+    Returns:
+        tuple: The `(pyplot, seaborn)` modules.
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set_theme(style="whitegrid")
+    return plt, sns
 #endregion
 
 #region File functions
@@ -103,11 +192,56 @@ def basic_analysis(data: DataFrame, verbose: bool = False):
         print("\nDescriptive statistics:")
         print(data.describe())
 
+def clean_wrs(rows: list) -> DataFrame:
+    """Clean scraped WRs (as given by `outreach.fetch_wrs`) into a WRs DF: the last row (the total)
+    and ties are removed, and the result is checked to have one valid time per track.
+
+    Args:
+        rows (list): `(track, time)` rows.
+
+    Raises:
+        ValueError: If the WRs don't have the expected number of tracks or a time is invalid.
+
+    Returns:
+        DataFrame: WRs, with the track name in column 0 and the time in column 1.
+    """
+    times = DataFrame(rows[:-1])
+    times.drop_duplicates(inplace=True) # Needed to remove WR ties
+    times.reset_index(drop=True, inplace=True)
+
+    if times.shape[0] != 96: # Ensure the df has all 96 tracks
+        raise ValueError(f"WRs DF has unexpected length: {times.shape}")
+    parse_times(times[1])    # Raises if any are invalid
+    return times
+
+def write_wrs_snapshot(times: DataFrame, cc: str, path: str = None) -> str:
+    """Save a WRs DF as a CSV snapshot. The file is written in full and then moved into place, so
+    readers never see a partial file.
+
+    Args:
+        times (DataFrame): WRs, as given by `clean_wrs`.
+        cc (str): CC for WRs.
+        path (str, optional): File path to use. Defaults to today's snapshot, see `WRS_SNAPSHOT_FORMAT`.
+
+    Returns:
+        str: Path written to.
+    """
+    if path is None:
+        path = WRS_SNAPSHOT_FORMAT.format(cc=cc, date=datetime.now().strftime("%d_%m_%Y"))
+    tmp_path = f"{path}.tmp"
+    times.to_csv(tmp_path, header=False, index=False)
+    os.replace(tmp_path, path)
+    return path
+
 def update_wr_csv(cc: str = "150cc", path: str = None):
     """Updates the current WR CSV file by pulling the latest times and saving to a new file. If no
     filename is given, creates one by default with the format:
     - `[cc]_wrs_[DD_MM_YYYY].csv`
 
+    The WRs are also recorded in the db's snapshot store if there is a db, which takes priority
+    over the files; otherwise the latest file is used the next time the WRs are loaded. To update a
+    running server, see `wr_refresh` instead.
+
     Useful reference: https://strftime.org/
 
     Args:
@@ -117,17 +251,12 @@ def update_wr_csv(cc: str = "150cc", path: str = None):
     if cc not in CC_CATEGORIES:
         raise ValueError(f"Args not recognised: {cc}")
 
-    if path is None:
-        date_part = datetime.now().strftime("%d_%m_%Y")
-        path = f"data/{cc}_wrs_{date_part}.csv"
-
-    times = DataFrame(fetch_wrs_shrooms(cc)[:-1])
-    times.drop_duplicates(inplace=True) # Needed to remove WR ties
-
-    if times.shape[0] != 96: # Ensure the df has all 96 tracks
-        raise ValueError(f"WRs DF has unexpected length: {times.shape}")
-
-    times.to_csv(path, header=False, index=False)
+    import db
+    from outreach import fetch_wrs_shrooms
+    wrs = clean_wrs(fetch_wrs_shrooms(cc))
+    write_wrs_snapshot(wrs, cc, path)
+    if os.path.exists(db.DB_FILE):
+        db.record_wrs(cc, "Shrooms", wrs.itertuples(index=False))
 #endregion
 
 #region Timesheet functions
@@ -149,20 +278,13 @@ def determine_standards(cc: str, items: str) -> DataFrame | None:
     if cc not in CC_CATEGORIES or items not in ITEM_OPTIONS:
         raise ValueError(f"Args not recognised: {cc}, {items}")
 
-    standards_map = {
-        ("150CC", "SHROOMS"): STANDARDS_150_SHROOMS,
-        ("200CC", "SHROOMS"): STANDARDS_200_SHROOMS,
-        ("150CC", "NITA"): STANDARDS_150_NITA,
-        ("200CC", "NITA"): STANDARDS_200_NITA,
-    }
-
-    key = (cc.upper(), items.upper())
-    return standards_map.get(key, None)
+    name = STANDARDS_DATA.get((cc.upper(), items.upper()))
+    return _load_data(name) if name is not None else None
 
 def determine_wrs(cc: str, items: str, values_only: bool = True) -> DataFrame | list | None:
     """Get the WRs corresponding to the given CC and item type. The DFs should exist for each 
     combination of cc and item options, but might not until later in development; best to check if 
-    you get a None returned.
+    you get a None returned. The WRs come from the current track catalog, so reflect any refresh.
 
     Args:
         cc (str): CC.
@@ -179,15 +301,7 @@ def determine_wrs(cc: str, items: str, values_only: bool = True) -> DataFrame |
     if cc not in CC_CATEGORIES or items not in ITEM_OPTIONS:
         raise ValueError(f"Args not recognised: {cc}, {items}")
 
-    wrs_map = {
-        ("150CC", "SHROOMS"): WRS_150_SHROOMS,
-        ("200CC", "SHROOMS"): WRS_200_SHROOMS,
-        ("150CC", "NITA"): WRS_150_NITA,
-        ("200CC", "NITA"): WRS_200_NITA,
-    }
-
-    key = (cc.upper(), items.upper())
-    df = wrs_map.get(key, None)
+    df = get_catalog().wr_frame(cc, items)
     if df is not None and values_only:
         return df[1].values
     return df
@@ -217,15 +331,479 @@ def calculate_standard(time: TrackTime, standards: list, names: list = None) ->
     if len(standards) != len(names):
         raise ValueError("Standard names and cutoffs are different lengths.")
 
-    for i, cutoff in enumerate(standards):
-        if time <= cutoff:
-            # Get the previous bound if not already top rank
-            rank = names[i]
-            to_next = standards.iloc[i-1] if i > 0 else None
-            diff = time - TrackTime(to_next) if to_next else TrackTime("0:00.000")
-            return i+1, rank, diff
-    return len(names)+1, "Unranked", time - TrackTime(standards[-1])
+    time = time if isinstance(time, TrackTime) else TrackTime(time)
+    cutoffs = parse_times(standards)
+    i = int(np.searchsorted(cutoffs, time.ms, side="left"))
+    diff = TrackTime.from_ms(max(time.ms - cutoffs[i-1], 0) if i > 0 else 0)
+    if i == len(names):
+        return len(names)+1, "Unranked", diff
+    return i+1, names[i], diff
+
+class StandardsMatrix:
+    """Standards cut-offs for every track, compiled once into a `(tracks x ranks)` integer matrix of
+    milliseconds. Ranks are classified with a single `np.searchsorted` over the flattened matrix;
+    each row is offset by a multiple of a value larger than any cut-off so the flattened array stays
+    sorted and rows can't overlap.
+    """
+
+    def __init__(self, standards: DataFrame, names: list = None):
+        """Compiles a standards DF (as given by `determine_standards`).
+
+        Args:
+            standards (DataFrame): Standards with the track name as the first column, followed by
+                one column per rank.
+            names (list, optional): Rank names. If None, default names are used.
+        """
+        self.names = list(names) if names is not None else STANDARDS_NAMES
+        if standards.shape[1] - 1 != len(self.names):
+            raise ValueError("Standard names and cutoffs are different lengths.")
+
+        self.tracks = list(standards.iloc[:, 0])
+        values = standards.iloc[:, 1:].values
+        self.cutoffs = parse_times(values.ravel()).reshape(values.shape)
+        self.cutoffs.flags.writeable = False
+
+        self._stride = int(self.cutoffs.max()) + 1
+        offsets = np.arange(len(self.tracks), dtype=np.int64)[:, None] * self._stride
+        self._flat = (self.cutoffs + offsets).ravel()
+        self._rank_names = np.array(self.names + ["Unranked"], dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.tracks)
+
+    def rank(self, times_ms: np.ndarray, tracks: np.ndarray = None) -> tuple:
+        """Classify any number of (track, time) pairs. See `calculate_standard` for the rules.
+
+        Args:
+            times_ms (np.ndarray): Times in milliseconds.
+            tracks (np.ndarray, optional): 0-based track indices aligned with `times_ms`. If None,
+                the times are assumed to be one per track, in track order.
+
+        Returns:
+            tuple: Arrays of (rank_arg, rank_name, next_rank_diff_ms). `rank_arg` is 1-based, and
+                `len(names) + 1` means Unranked.
+        """
+        times_ms = np.asarray(times_ms, dtype=np.int64)
+        tracks = np.arange(len(times_ms)) if tracks is None else np.asarray(tracks, dtype=np.int64)
+        n_ranks = len(self.names)
+
+        # Clip so very slow times can't spill into the next track's row
+        shifted = np.minimum(times_ms, self._stride - 1) + tracks * self._stride
+        idx = np.searchsorted(self._flat, shifted, side="left") - tracks * n_ranks
+
+        prev_cut = self.cutoffs[tracks, np.maximum(idx - 1, 0)]
+        diff = np.where(idx > 0, np.maximum(times_ms - prev_cut, 0), 0)
+        return idx + 1, self._rank_names[idx], diff
+
+    def track_cutoffs(self, track_no: int) -> np.ndarray:
+        """Get the cut-offs (ms) for a track given its 1-based track number."""
+        return self.cutoffs[track_no - 1]
+
+@lru_cache(maxsize=None)
+def compile_standards(cc: str, items: str) -> StandardsMatrix | None:
+    """Get the compiled standards matrix for a given CC and item type. Each matrix is built once from
+    the DF given by `determine_standards` and cached.
+
+    Args:
+        cc (str): CC.
+        items (str): Item type.
+
+    Returns:
+        StandardsMatrix | None: Compiled standards if they exist, else None.
+    """
+    standards = determine_standards(cc, items)
+    return StandardsMatrix(standards) if standards is not None else None
+
+#region Track catalog
+class Track(NamedTuple):
+    """Static information for one track, as in the tracks CSV."""
+    number: int
+    cup: str
+    cup_type: str
+    name: str
+    abbrev: str
+
+class TrackCatalog:
+    """Immutable catalog of the static per-track data: the track info, plus the WRs and compiled
+    standards for each CC and item type. Built once (see `get_catalog`) so that requests only do
+    dict lookups, rather than re-reading, re-validating or re-parsing any of it. New WRs give a new
+    catalog (see `with_wrs`), which replaces the current one as a whole.
+
+    Tracks can be looked up by name, abbreviation or 1-based number.
+    """
+    __slots__ = ("tracks", "names", "abbrevs", "_index", "_wr_frames", "_wrs", "_wrs_ms", "_standards")
+
+    def __init__(self, tracks: list, wrs: dict, standards: dict):
+        """Initialises a catalog. Usually built with `load_catalog`.
+
+        Args:
+            tracks (list): `Track` objects, in track order.
+            wrs (dict): `(cc, items)` -> WRs DF (track name and time columns, in track order), or None.
+            standards (dict): `(cc, items)` -> `StandardsMatrix`, or None.
+
+        Raises:
+            ValueError: If any WRs are invalid or don't have one time per track.
+        """
+        self.tracks = tuple(tracks)
+        self.names = tuple(track.name for track in self.tracks)
+        self.abbrevs = tuple(track.abbrev for track in self.tracks)
+
+        index = {}
+        for track in self.tracks:
+            index[track.number] = index[track.name] = index[track.abbrev] = track
+        self._index = MappingProxyType(index)
+
+        self._wr_frames = MappingProxyType(dict(wrs))
+        strs, parsed = {}, {}
+        for key, df in self._wr_frames.items():
+            strs[key] = parsed[key] = None
+            if df is not None:
+                if len(df) != len(self.tracks):
+                    raise ValueError(f"WRs have unexpected length for {key}: {len(df)}")
+                strs[key] = tuple(df[1])
+                parsed[key] = parse_times(strs[key])
+                parsed[key].flags.writeable = False
+        self._wrs = MappingProxyType(strs)
+        self._wrs_ms = MappingProxyType(parsed)
+        self._standards = MappingProxyType(dict(standards))
+
+    def __len__(self) -> int:
+        return len(self.tracks)
+
+    def __iter__(self):
+        return iter(self.tracks)
+
+    def __contains__(self, key) -> bool:
+        return key in self._index
+
+    def __getitem__(self, key: str | int) -> Track:
+        return self._index[key]
+
+    def get(self, key: str | int, default=None) -> Track | None:
+        """Look up a track by name, abbreviation or 1-based number.
+
+        Args:
+            key (str | int): Track name, abbreviation or number.
+            default (optional): Returned if the track doesn't exist. Defaults to None.
+
+        Returns:
+            Track | None: The track.
+        """
+        return self._index.get(key, default)
+
+    @staticmethod
+    def _key(cc: str, items: str) -> tuple:
+        if cc not in CC_CATEGORIES or items not in ITEM_OPTIONS:
+            raise ValueError(f"Args not recognised: {cc}, {items}")
+        return cc, items
+
+    def wr_frame(self, cc: str, items: str) -> DataFrame | None:
+        """WRs DF (as `determine_wrs` with `values_only=False`), or None if they don't exist."""
+        return self._wr_frames[self._key(cc, items)]
+
+    def wrs(self, cc: str, items: str) -> tuple | None:
+        """WR strings in track order, or None if they don't exist."""
+        return self._wrs[self._key(cc, items)]
+
+    def wrs_ms(self, cc: str, items: str) -> np.ndarray | None:
+        """WRs in ms in track order (read-only), or None if they don't exist."""
+        return self._wrs_ms[self._key(cc, items)]
+
+    def wr(self, cc: str, items: str, track: str | int) -> str | None:
+        """WR string for a single track, or None if WRs don't exist."""
+        wrs = self.wrs(cc, items)
+        return wrs[self[track].number - 1] if wrs is not None else None
+
+    def standards(self, cc: str, items: str) -> StandardsMatrix | None:
+        """Compiled standards (as `compile_standards`), or None if they don't exist."""
+        return self._standards[self._key(cc, items)]
+
+    def with_wrs(self, cc: str, items: str, wrs: DataFrame) -> "TrackCatalog":
+        """Get a copy of the catalog with new WRs for a CC and item type.
+
+        Args:
+            cc (str): CC.
+            items (str): Item type.
+            wrs (DataFrame): WRs DF, as given by `clean_wrs`.
+
+        Returns:
+            TrackCatalog: The new catalog.
+        """
+        frames = dict(self._wr_frames)
+        frames[self._key(cc, items)] = wrs
+        return TrackCatalog(self.tracks, frames, self._standards)
+
+def load_catalog(tracks_path: str = TRACKS_FILE) -> TrackCatalog:
+    """Build a track catalog from the tracks CSV and the reference data files.
+
+    Args:
+        tracks_path (str, optional): Path to the tracks CSV. Defaults to `TRACKS_FILE`.
+
+    Returns:
+        TrackCatalog: The catalog.
+    """
+    with open(tracks_path, newline="") as f:
+        tracks = [Track(int(row[0]), *row[1:5]) for row in csv.reader(f) if row]
+
+    wrs = {}
+    for cc in CC_CATEGORIES:
+        for items in ITEM_OPTIONS:
+            wrs[(cc, items)] = _stored_wrs(cc, items, len(tracks))
+            if wrs[(cc, items)] is None:
+                name = WRS_DATA.get((cc.upper(), items.upper()))
+                wrs[(cc, items)] = _load_data(name) if name is not None else None
+    return TrackCatalog(tracks, wrs, {key: compile_standards(*key) for key in wrs})
+
+def _stored_wrs(cc: str, items: str, n_tracks: int) -> DataFrame | None:
+    """Latest WRs from the db's snapshot store (see `db.record_wrs`), or None if the db doesn't have
+    a full set, in which case the CSV snapshots are used."""
+    import db
+    if not os.path.exists(db.DB_FILE):
+        return None
+    try:
+        rows = db.get_latest_wrs(cc, items)
+    except sqlite3.OperationalError:    # DB from before the snapshot store
+        return None
+    if len(rows) != n_tracks:
+        return None
+    return DataFrame([(row["source_name"], row["time_str"]) for row in rows])
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_catalog() -> TrackCatalog:
+    """Get the current track catalog, built on first use. The catalog can be replaced at any time by
+    `swap_wrs`, so get it once and keep using that object for a consistent view."""
+    catalog = _catalog
+    if catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _set_catalog(load_catalog())
+            catalog = _catalog
+    return catalog
+
+def _set_catalog(catalog: TrackCatalog):
+    global _catalog
+    _catalog = catalog
+
+def swap_wrs(cc: str, items: str, wrs: DataFrame) -> TrackCatalog:
+    """Replace the WRs for a CC and item type in the running process. The new catalog is built first
+    and then swapped in with a single assignment, so readers never block and never see a partial
+    update.
+
+    Args:
+        cc (str): CC.
+        items (str): Item type.
+        wrs (DataFrame): WRs DF, as given by `clean_wrs`.
 
+    Returns:
+        TrackCatalog: The new catalog.
+    """
+    catalog = get_catalog()
+    with _catalog_lock:
+        catalog = _catalog.with_wrs(cc, items, wrs)
+        _set_catalog(catalog)
+    return catalog
+
+_catalog_version = None
+
+def sync_catalog(version: int) -> TrackCatalog:
+    """Bring the catalog's WRs up to date with the db's snapshot store (see `db.record_wrs`) when the
+    data version has changed since the last sync. With several worker processes, WRs swapped in by
+    one of them (see `wr_refresh`) are recorded in the db and bump the shared data version, so this
+    makes every process use them before building pages cached under the new version.
+
+    Args:
+        version (int): Current data version (see `db.get_data_version`).
+
+    Returns:
+        TrackCatalog: The current catalog.
+    """
+    global _catalog_version
+    catalog = get_catalog()
+    if version == _catalog_version:
+        return catalog
+    with _catalog_lock:
+        if version != _catalog_version:
+            catalog = _catalog
+            for cc in CC_CATEGORIES:
+                for items in ITEM_OPTIONS:
+                    stored = _stored_wrs(cc, items, len(catalog))
+                    if stored is not None and tuple(stored[1]) != catalog.wrs(cc, items):
+                        catalog = catalog.with_wrs(cc, items, stored)
+            _set_catalog(catalog)
+            _catalog_version = version
+        return _catalog
+#endregion
+
+TIMESHEET_COLUMNS = [
+    "TrackNo", "TrackName", "Time", "TimeNum",
+    "Standard", "StandardNum", "StandardDiff", "StandardDiffNum",
+    "WR", "WRNum", "WRDiff", "WRDiffNum", "WRDiffNorm"
+]
+DIFF_COLOUR_STEP_MS = 1000  # WR diff colour scale, matching `getWRDiffColor` in static/colour_utils.js
+DIFF_COLOUR_STEPS = 10
+
+def times_to_ms(times: list) -> np.ndarray:
+    """Convert a list of formatted time strings (M:SS.sss) to a float array of milliseconds. Missing
+    or invalid times (e.g. `None` or `"-"`) become NaN.
+
+    Args:
+        times (list): List of time strings.
+
+    Returns:
+        np.ndarray: Float array of times in milliseconds.
+    """
+    ms = parse_times(times, fill=MISSING_MS).astype(float)
+    ms[ms == MISSING_MS] = np.nan
+    return ms
+
+@timed()
+def compute_timesheet_columns(pb_ms: np.ndarray, wr_ms: np.ndarray | None, standards: StandardsMatrix | None,
+                              tracks: np.ndarray = None) -> dict:
+    """Vectorised timesheet engine. Computes the numeric timesheet columns for every track in one
+    pass. All times are in milliseconds, and missing PBs or WRs should be NaN.
+
+    Standards are classified with `StandardsMatrix.rank`.
+
+    Args:
+        pb_ms (np.ndarray): PBs, shape `(tracks,)`.
+        wr_ms (np.ndarray | None): WRs, shape `(tracks,)`, or None if there are no WRs.
+        standards (StandardsMatrix | None): Compiled standards, or None if there are no standards.
+        tracks (np.ndarray, optional): 0-based track indices of the PBs. If None, the PBs are assumed
+            to be for every track, in order.
+
+    Returns:
+        dict: Arrays for `TimeNum`, `WRNum`, `WRDiffNum`, `WRDiffNorm`, `Standard`, `StandardNum`,
+            `StandardDiffNum` (times in seconds), plus `StandardDiffMs` and `WRDiffMs`.
+    """
+    pb_ms = np.asarray(pb_ms, dtype=float)
+    has_pb = ~np.isnan(pb_ms)
+    n = len(pb_ms)
+
+    if wr_ms is not None:
+        wr_ms = np.asarray(wr_ms, dtype=float)
+        wr_diff_ms = np.maximum(pb_ms - wr_ms, 0)   # NaN propagates for missing PBs
+    else:
+        wr_ms = np.full(n, np.nan)
+        wr_diff_ms = np.full(n, np.nan)
+
+    stnd_num = np.full(n, np.nan)
+    stnd_name = np.full(n, np.nan, dtype=object)
+    stnd_diff_ms = np.full(n, np.nan)
+    if standards is not None and has_pb.any():
+        tracks = np.arange(n) if tracks is None else np.asarray(tracks)
+        rank_arg, rank_name, diff = standards.rank(pb_ms[has_pb], tracks[has_pb])
+        stnd_num[has_pb] = rank_arg
+        stnd_name[has_pb] = rank_name
+        stnd_diff_ms[has_pb] = diff
+
+    return {
+        "TimeNum": pb_ms / 1000,
+        "WRNum": wr_ms / 1000,
+        "WRDiffNum": wr_diff_ms / 1000,
+        "WRDiffNorm": np.round(wr_diff_ms / wr_ms * 100, 5),
+        "Standard": stnd_name,
+        "StandardNum": stnd_num,
+        "StandardDiffNum": stnd_diff_ms / 1000,
+        "WRDiffMs": wr_diff_ms,
+        "StandardDiffMs": stnd_diff_ms,
+    }
+
+class Distributions(NamedTuple):
+    """WR diff histogram and standard counts, as given by `aggregate_distributions`."""
+    bucket_ms: int
+    diff_counts: np.ndarray     # Count per WR diff bucket; bucket `i` covers `[i, i + 1) * bucket_ms`
+    rank_counts: np.ndarray     # Count per standard, best first, then Unranked
+    joint: np.ndarray           # `(ranks + 1, buckets)` counts of times with both a standard and a WR diff
+
+    def diff_labels(self) -> list:
+        """Bucket labels in seconds, e.g. `"0-1"`, `"1-2"` for 1 s buckets."""
+        step = self.bucket_ms / 1000
+        return [f"{i * step:g}-{(i + 1) * step:g}" for i in range(len(self.diff_counts))]
+
+    def chart_rank_counts(self) -> list:
+        """Count per standard (excluding Unranked), as a list."""
+        return self.rank_counts[:-1].tolist()
+
+@timed()
+def aggregate_distributions(wr_diff_ms: np.ndarray, rank_args: np.ndarray, n_ranks: int = len(STANDARDS_NAMES),
+                            bucket_ms: int = DIFF_BUCKET_MS) -> Distributions:
+    """Count the WR diff buckets and standards of any number of times in a single pass: each time is
+    mapped to one cell of a (standard x diff bucket) grid, with an extra row and column for a
+    missing standard or diff, and the grid is filled with one `np.bincount`. The histogram and the
+    standard counts are its margins.
+
+    Args:
+        wr_diff_ms (np.ndarray): WR diffs in ms (NaN if missing), e.g. `WRDiffMs` from
+            `compute_timesheet_columns`. Rounded to whole ms.
+        rank_args (np.ndarray): 1-based standards (`n_ranks + 1` is Unranked, NaN if missing), e.g.
+            `StandardNum` from `compute_timesheet_columns`. Aligned with `wr_diff_ms`.
+        n_ranks (int, optional): Number of standards. Defaults to `len(STANDARDS_NAMES)`.
+        bucket_ms (int, optional): Width of the WR diff buckets in ms, at least `MIN_DIFF_BUCKET_MS`.
+            Defaults to `DIFF_BUCKET_MS`.
+
+    Returns:
+        Distributions: The counts. There are as many buckets as needed for the largest diff, but
+            at most `MAX_DIFF_BUCKETS`: if more would be needed, the buckets are widened to a
+            multiple of `bucket_ms` (the width used is in the result).
+    """
+    bucket_ms = max(int(bucket_ms), MIN_DIFF_BUCKET_MS)
+    diffs = np.asarray(wr_diff_ms, dtype=float)
+    ranks = np.asarray(rank_args, dtype=float)
+    has_diff = ~np.isnan(diffs)
+    has_rank = ~np.isnan(ranks)
+
+    diff_ms = np.rint(diffs[has_diff]).astype(np.int64)
+    if len(diff_ms) and int(diff_ms.max()) // bucket_ms >= MAX_DIFF_BUCKETS:
+        bucket_ms *= -(-(int(diff_ms.max()) + 1) // (bucket_ms * MAX_DIFF_BUCKETS))
+    buckets = np.zeros(len(diffs), dtype=np.int64)
+    buckets[has_diff] = diff_ms // bucket_ms
+    n_buckets = int(buckets.max()) + 1 if has_diff.any() else 0
+    buckets[~has_diff] = n_buckets
+
+    rows = np.full(len(ranks), n_ranks + 1, dtype=np.int64)
+    rows[has_rank] = ranks[has_rank].astype(np.int64) - 1
+
+    width = n_buckets + 1
+    grid = np.bincount(rows * width + buckets, minlength=(n_ranks + 2) * width).reshape(n_ranks + 2, width)
+    return Distributions(
+        bucket_ms=bucket_ms,
+        diff_counts=grid[:, :n_buckets].sum(axis=0),
+        rank_counts=grid[:n_ranks + 1].sum(axis=1),
+        joint=grid[:n_ranks + 1, :n_buckets],
+    )
+
+def _ms_to_track_times(ms: np.ndarray) -> list:
+    """Convert an array of milliseconds to a list of `TrackTime` objects, with NaN left as NaN."""
+    return [np.nan if np.isnan(t) else TrackTime.from_ms(t) for t in ms.tolist()]
+
+def _build_timesheet(nums: list, tracks: list, pb_ms: np.ndarray, wr_ms: np.ndarray | None,
+                     standards: StandardsMatrix | None) -> DataFrame:
+    """Assemble a timesheet DataFrame from the output of `compute_timesheet_columns`."""
+    cols = compute_timesheet_columns(pb_ms, wr_ms, standards, np.asarray(nums) - 1)
+
+    stnd_num = cols["StandardNum"]
+    if not np.isnan(stnd_num).any():
+        stnd_num = stnd_num.astype(int)
+
+    return DataFrame({
+        "TrackNo": nums,
+        "TrackName": tracks,
+        "Time": _ms_to_track_times(pb_ms),
+        "TimeNum": cols["TimeNum"],
+        "Standard": cols["Standard"],
+        "StandardNum": stnd_num,
+        "StandardDiff": _ms_to_track_times(cols["StandardDiffMs"]),
+        "StandardDiffNum": cols["StandardDiffNum"],
+        "WR": _ms_to_track_times(cols["WRNum"] * 1000),
+        "WRNum": cols["WRNum"],
+        "WRDiff": _ms_to_track_times(cols["WRDiffMs"]),
+        "WRDiffNum": cols["WRDiffNum"],
+        "WRDiffNorm": cols["WRDiffNorm"],
+    }, columns=TIMESHEET_COLUMNS)
+
+@timed()
 def create_timesheet_df(tracks: list, pbs: list, wrs: list, cc: str, items: str) -> DataFrame:
     """Create a timesheet for the given PB times. The timesheet is a DataFrame that includes various 
     useful columns, such as the WR, standard, and differences. Columns appended with `"Num"` are 
@@ -233,7 +811,8 @@ def create_timesheet_df(tracks: list, pbs: list, wrs: list, cc: str, items: str)
     in seconds. StandardNum is different as this contains the number position of the rank, e.g.,
     `Gold` would be 1 if it was the top rank, etc.
 
-    Note that the lists of track names and times are assumed to already be aligned.
+    Note that the lists of track names and times are assumed to already be aligned. The numeric
+    columns are computed for all tracks at once, see `compute_timesheet_columns`.
 
     Args:
         tracks (list): Ordered list of track names.
@@ -245,54 +824,11 @@ def create_timesheet_df(tracks: list, pbs: list, wrs: list, cc: str, items: str)
     Returns:
         DataFrame: The completed timesheet.
     """
-    column_names = [
-        "TrackNo", "TrackName", "Time", "TimeNum",
-        "Standard", "StandardNum", "StandardDiff", "StandardDiffNum",
-        "WR", "WRNum", "WRDiff", "WRDiffNum", "WRDiffNorm"
-    ]
-    standards = determine_standards(cc, items)
-    
-    timesheet = []
-    for num in range(len(tracks)):
-        tr_name = tracks[num]
-
-        wr_time, wr_num, wr_diff, diff_num = np.nan, np.nan, np.nan, np.nan
-        if wrs is not None:
-            wr_time = TrackTime(wrs[num])
-            wr_num = wr_time.get_seconds()
-
-        try:
-            TrackTime(pbs[num])
-        except ValueError: # Time is not valid, and likely empty
-            timesheet.append([
-                num + 1, tr_name, np.nan, np.nan,
-                np.nan, np.nan, np.nan, np.nan,
-                wr_time, wr_num, wr_diff, diff_num, np.nan
-            ])
-            continue
-
-        row = []
-        pb_time = TrackTime(pbs[num])
-        if wrs is not None:
-            wr_diff = pb_time - wr_time
-            diff_num = wr_diff.get_seconds()
-
-        # Calculate standards
-        stnd_arg, stnd_name, stnd_diff, stnd_diff_num = np.nan, np.nan, np.nan, np.nan
-        if standards is not None:
-            stnd_arg, stnd_name, stnd_diff = calculate_standard(pb_time, standards.iloc[num][1:])
-            stnd_diff_num = stnd_diff.get_seconds()
-
-        row = [
-            num + 1, tr_name, pb_time, pb_time.get_seconds(),
-            stnd_name, stnd_arg, stnd_diff, stnd_diff_num,
-            wr_time, wr_num, wr_diff, diff_num
-        ]
-        row.append(round(row[-1] / row[-3] * 100, 5)) # WRDiffNorm
-        timesheet.append(row)
-
-    return DataFrame(timesheet, columns=column_names)
+    pb_ms = times_to_ms(pbs)
+    wr_ms = times_to_ms(list(wrs)) if wrs is not None else None
+    return _build_timesheet(list(range(1, len(tracks) + 1)), list(tracks), pb_ms, wr_ms, compile_standards(cc, items))
 
+@timed()
 def create_ts_excerpt_df(num: int, track: str, pb: str, wr: str, cc: str, items: str) -> DataFrame:
     """Create only a single row of the timesheet for an individual track. See `create_timesheet_df`
     for more.
@@ -308,46 +844,41 @@ def create_ts_excerpt_df(num: int, track: str, pb: str, wr: str, cc: str, items:
     Returns:
         DataFrame: The timesheet row.
     """
-    column_names = [
-        "TrackNo", "TrackName", "Time", "TimeNum",
-        "Standard", "StandardNum", "StandardDiff", "StandardDiffNum",
-        "WR", "WRNum", "WRDiff", "WRDiffNum", "WRDiffNorm"
-    ]
-    standards = determine_standards(cc, items)
-    
-    wr_time, wr_num, wr_diff, diff_num = np.nan, np.nan, np.nan, np.nan
-    if wr is not None:
-        wr_time = TrackTime(wr)
-        wr_num = wr_time.get_seconds()
+    df = _build_timesheet(
+        [num], [track], times_to_ms([pb]), times_to_ms([wr]) if wr is not None else None,
+        compile_standards(cc, items)
+    )
+    if np.isnan(df.at[0, "TimeNum"]):
+        df["WRDiffNorm"] = 0
+    return df
 
-    try:
-        pb_time = TrackTime(pb)
-    except (ValueError, TypeError) as e: # Time is not valid, and likely empty
-        row = [
-            num, track, np.nan, np.nan,
-            np.nan, np.nan, np.nan, np.nan,
-            wr_time, wr_num, wr_diff, diff_num, 0
-        ]
-        return DataFrame([row], columns=column_names)
-
-    if wr is not None:
-        wr_diff = pb_time - wr_time
-        diff_num = wr_diff.get_seconds()
-
-    # Calculate standards
-    stnd_arg, stnd_name, stnd_diff, stnd_diff_num = np.nan, np.nan, np.nan, np.nan
-    if standards is not None:
-        stnd_arg, stnd_name, stnd_diff = calculate_standard(pb_time, standards.iloc[num - 1][1:])
-        stnd_diff_num = stnd_diff.get_seconds()
-
-    row = [
-        num, track, pb_time, pb_time.get_seconds(),
-        stnd_name, stnd_arg, stnd_diff, stnd_diff_num,
-        wr_time, wr_num, wr_diff, diff_num
-    ]
-    row.append(round(row[-1] / row[-3] * 100, 5)) # WRDiffNorm
-
-    return DataFrame([row], columns=column_names)
+@timed()
+def create_display_records(df: DataFrame) -> list:
+    """Pre-format a timesheet (or excerpt) for the templates, so rendering is only string
+    substitution: every cell becomes the string shown (NaN as `"nan"`, `WRDiffNorm` to 3 decimal
+    places), plus colour keys for the styled cells:
+    - RankColour: the standard name, a key of `rankColormap` in static/colour_utils.js.
+    - DiffColour: the step of the WR diff colour scale (0-10), or `""` for no diff.
+
+    Args:
+        df (DataFrame): Timesheet, as from `create_timesheet_df`.
+
+    Returns:
+        list: One dict of strings per row.
+    """
+    # Plain lists rather than `astype(str)` and `to_dict`, which are several times slower
+    display = {col: [str(x) for x in df[col].tolist()] for col in df.columns}
+    display["WRDiffNorm"] = [f"{x:.3f}" for x in df["WRDiffNorm"].tolist()]
+    display["RankColour"] = display["Standard"]
+
+    # Same arithmetic as the JS, in seconds, so cells on a step boundary get the same colour
+    diff = df["WRDiffNum"].to_numpy(dtype=float)
+    missing = np.isnan(diff)
+    steps = np.clip(np.floor(np.where(missing, 0, diff) / (DIFF_COLOUR_STEP_MS / 1000)), 0, DIFF_COLOUR_STEPS)
+    display["DiffColour"] = np.where(missing, "", steps.astype(int).astype(str)).tolist()
+
+    names = list(display)
+    return [dict(zip(names, row)) for row in zip(*display.values())]
 
 def create_timesheet_df_old(pbs: DataFrame, wrs: DataFrame, standards: DataFrame | None = None) -> DataFrame:
     """NOTE: this function is deprecated. Please see `create_timesheet_df` instead.
@@ -397,6 +928,7 @@ def create_timesheet_df_old(pbs: DataFrame, wrs: DataFrame, standards: DataFrame
 
     return DataFrame(timesheet, columns=col_names)
 
+@timed()
 def create_track_times_df(times: list) -> DataFrame:
     """Create a sheet based on time improvements for a track.
 
@@ -425,6 +957,120 @@ def create_track_times_df(times: list) -> DataFrame:
 
     return DataFrame(tracksheet, columns=column_names)
 
+CHART_POINTS = 300  # Default number of points the PB progression chart is downsampled to
+
+def pb_improvements(ids: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """Find the times that were PB improvements when they were added, i.e. faster than every time
+    added before them (by id). The first time is always one.
+
+    Args:
+        ids (np.ndarray): Row ids, in the order of `times`.
+        times (np.ndarray): Times, in any unit.
+
+    Returns:
+        np.ndarray: Boolean mask over `times`.
+    """
+    mask = np.zeros(len(times), dtype=bool)
+    if len(times):
+        order = np.argsort(ids, kind="stable")
+        chrono = times[order]
+        best_before = np.minimum.accumulate(np.concatenate(([np.inf], chrono[:-1])))
+        mask[order[chrono < best_before]] = True
+    return mask
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets downsampling of a line: the first and last points are kept,
+    and the rest are split into `points - 2` buckets, keeping from each the point forming the
+    largest triangle with the point kept from the previous bucket and the mean of the next one.
+    Keeps the line's shape, including spikes, far better than taking every nth point.
+
+    Args:
+        x (np.ndarray): X values, increasing.
+        y (np.ndarray): Y values.
+        points (int): Number of points to keep.
+
+    Returns:
+        np.ndarray: Indices of the points kept, increasing.
+    """
+    n = len(y)
+    if points >= n:
+        return np.arange(n)
+    if points < 3:
+        return np.array([0, n - 1][:max(points, 0)], dtype=int)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Bucket edges for the middle points, then the last point as a bucket of its own
+    edges = np.append(np.linspace(1, n - 1, points - 1).astype(int), n)
+    kept = np.empty(points, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi, next_hi = edges[i], edges[i+1], edges[i+2]
+        next_x, next_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        # Twice the triangle areas, the constant factor doesn't matter
+        areas = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(areas.argmax())
+        kept[i+1] = a
+    return kept
+
+def downsample_series(y: np.ndarray, points: int, keep: np.ndarray | None = None) -> np.ndarray:
+    """Downsample a line (x is the index) to at most `points` points with `lttb`, always keeping
+    the first and last points, the extremes, and the points in `keep` as far as the budget allows.
+    If there are more of those than `points`, they're downsampled themselves.
+
+    Args:
+        y (np.ndarray): Y values.
+        points (int): Maximum number of points to keep.
+        keep (np.ndarray | None, optional): Boolean mask of points to always keep. Defaults to None.
+
+    Returns:
+        np.ndarray: Indices of the points kept, increasing.
+    """
+    n = len(y)
+    if n <= points:
+        return np.arange(n)
+
+    forced = np.zeros(n, dtype=bool) if keep is None else keep.copy()
+    forced[[0, n - 1, int(np.argmin(y)), int(np.argmax(y))]] = True
+    forced = np.flatnonzero(forced)
+    if len(forced) >= points:
+        return forced[lttb(forced, y[forced], points)]
+
+    # Fill the rest of the budget with the line's shape. The union can be smaller than `points`
+    # when they overlap, which is fine as this is an upper bound
+    shape = lttb(np.arange(n), y, points - len(forced))
+    return np.union1d(shape, forced)
+
+@timed()
+def create_track_chart_df(times: np.ndarray, ids: np.ndarray, points: int = CHART_POINTS,
+                          start: int | None = None, end: int | None = None) -> DataFrame:
+    """Create the PB progression chart's data for a track: its times from slowest to fastest,
+    numbered from 1 like the "Improvement #" axis, downsampled to at most `points` points. Every PB
+    improvement (see `pb_improvements`) and the extremes are kept, so the payload is bounded however
+    many times there are. Zooming in fetches a `start`-`end` window, downsampled to the same budget,
+    so detail appears as the window narrows.
+
+    Args:
+        times (np.ndarray): Times in ms, fastest first (as from `db.get_times_for_track`).
+        ids (np.ndarray): Row ids, in the same order.
+        points (int, optional): Maximum number of points. Defaults to `CHART_POINTS`.
+        start (int | None, optional): First number in the window. Defaults to the first.
+        end (int | None, optional): Last number in the window (inclusive). Defaults to the last.
+
+    Returns:
+        DataFrame: Columns "Num", "TimeMs" and "PB" (whether it was a PB improvement).
+    """
+    times = np.asarray(times)[::-1]
+    ids = np.asarray(ids)[::-1]
+    is_pb = pb_improvements(ids, times)
+
+    lo = max((start or 1) - 1, 0)
+    hi = min(end or len(times), len(times))
+    kept = lo + downsample_series(times[lo:hi], points, is_pb[lo:hi]) if hi > lo else np.arange(0)
+
+    return DataFrame({"Num": kept + 1, "TimeMs": times[kept], "PB": is_pb[kept]})
+
 def check_col_numeric(name: str) -> bool:
     """Check if a given column name for a timesheet is numeric.
 
@@ -456,6 +1102,7 @@ def top_n_times(timesheet: DataFrame, n: int = 10, bottom: bool = False, col: st
         raise ValueError("Column name needs to be numeric to sort.")
     return timesheet.sort_values(by=col, ascending=(not bottom)).iloc[:n]
 
+@timed()
 def calculate_sheet_stats(sheet: DataFrame, verbose: bool = False) -> dict | None:
     """Calculates various statistics for a given timesheet, such as for the WRDiff column.
 
@@ -509,6 +1156,8 @@ def create_visuals_overall(timesheet: DataFrame):
     Args:
         timesheet (DataFrame): Given timesheet.
     """
+    plt, sns = _plotting()
+
     # Histogram of WR diffs
     sns.histplot(data=timesheet, x="WRDiffNum", binwidth=1.0, binrange=(2.0, 8.0))
     plt.xlabel("WR Diff (s)")
@@ -536,7 +1185,7 @@ def create_visuals_overall(timesheet: DataFrame):
     # plt.ylabel("Standard Name")
     plt.show()
 
-def create_visuals_track(timesheet: DataFrame, standards: DataFrame = STANDARDS_150_SHROOMS, track_name: str = None, track_no: int = None):
+def create_visuals_track(timesheet: DataFrame, standards: DataFrame = None, track_name: str = None, track_no: int = None):
     """Create visualisations for a given individual track. Also used for testing mostly. Either the
     track name or number must be provided.
 
@@ -552,6 +1201,10 @@ def create_visuals_track(timesheet: DataFrame, standards: DataFrame = STANDARDS_
     if track_name is None and track_no is None:
         raise ValueError("Need to give either a track name or number, e.g. Mario Kart Stadium (1).")
 
+    plt, sns = _plotting()
+    if standards is None:
+        standards = _load_data("STANDARDS_150_SHROOMS")
+
     # TODO support for track numbers, should infer track name from given number
 
     track_stats = timesheet.loc[timesheet["TrackName"] == track_name]
@@ -573,7 +1226,7 @@ def create_visuals_track(timesheet: DataFrame, standards: DataFrame = STANDARDS_
             plt.xlim(track_stnds_secs[0], time_1)
             break
 
-        plt.axvspan(time_1, time_2, facecolor=STANDARDS_COLOURS[i], alpha=0.5)
+        plt.axvspan(time_1, time_2, facecolor=_standards_colours()[i], alpha=0.5)
         plt.text(x=np.mean((time_1, time_2)), y=plt.ylim()[0] - 0.05, s=STANDARDS_NAMES[i], horizontalalignment="center", verticalalignment="bottom", rotation=90) # Kerning here is fucking annoying, maybe x-value
     
     plt.xlabel("Time (s)")
@@ -0,0 +1,144 @@
+from collections.abc import Callable
+import sys
+import threading
+
+import numpy as np
+from pandas import DataFrame
+
+import db
+import outreach
+from timesheet import CC_CATEGORIES, ITEM_OPTIONS, WRS_DATA, clean_wrs, get_catalog, swap_wrs
+from TrackTime import parse_times
+
+REFRESH_INTERVAL = 6 * 60 * 60  # Seconds
+MAX_WR_CHANGE = 0.1             # Largest relative change to a WR that is accepted as genuine
+
+def validate_wrs(cc: str, items: str, wrs: DataFrame):
+    """Sanity check new WRs against the current ones, so a change to the scraped page can't swap in
+    garbage. `clean_wrs` already checks the track count and the time formats; this also checks that
+    the tracks are in the same order and that no WR moved by more than `MAX_WR_CHANGE`.
+
+    Args:
+        cc (str): CC.
+        items (str): Item type.
+        wrs (DataFrame): New WRs, as given by `clean_wrs`.
+
+    Raises:
+        ValueError: If the new WRs look wrong.
+    """
+    catalog = get_catalog()
+    current = catalog.wr_frame(cc, items)
+    if current is None:
+        return
+
+    moved = [i for i, (old, new) in enumerate(zip(current[0], wrs[0])) if old != new]
+    if moved:
+        raise ValueError(f"WR tracks don't match for {cc} {items}: {[wrs.iat[i, 0] for i in moved[:5]]}")
+
+    old_ms = catalog.wrs_ms(cc, items)
+    new_ms = parse_times(wrs[1])
+    change = np.abs(new_ms - old_ms) / old_ms
+    if change.max() > MAX_WR_CHANGE:
+        track = int(change.argmax())
+        raise ValueError(f"WR changed too much for {cc} {items}, {wrs.iat[track, 0]}: "
+                         f"{current.iat[track, 1]} -> {wrs.iat[track, 1]}")
+
+class WRRefresher:
+    """Periodically fetches the WRs, and if they changed and look valid, records a new snapshot in
+    the db (see `db.record_wrs`) and swaps them into the running process (see `timesheet.swap_wrs`). Requests keep being served from
+    the old WRs until the swap, which is a single assignment.
+
+    Fetches are conditional HTTP requests backed by an on-disk cache (see `outreach.fetch_page`),
+    so a check when nothing changed costs a `304`. With several worker processes, each runs its own
+    refresher, but each interval's refresh is claimed in the db (see `db.claim_task`) so only one of
+    them fetches. The others pick the new WRs up from the db when the data version changes (see
+    `timesheet.sync_catalog`), which needs `snapshot` on.
+    """
+
+    def __init__(self, interval: float = REFRESH_INTERVAL, cache_dir: str | None = outreach.HTTP_CACHE_DIR,
+                 on_swap: Callable[[str, str], None] | None = None, snapshot: bool = True):
+        """Initialises a refresher. Call `start` to begin refreshing in the background.
+
+        Args:
+            interval (float, optional): Seconds between refreshes. Defaults to `REFRESH_INTERVAL`.
+            cache_dir (str | None, optional): HTTP cache directory. Defaults to `outreach.HTTP_CACHE_DIR`.
+            on_swap (Callable[[str, str], None] | None, optional): Called with the cc and items after
+                new WRs are swapped in, e.g. to invalidate caches. Defaults to None.
+            snapshot (bool, optional): If true, new WRs are also recorded in the db, so they're
+                kept in the history and loaded on the next start. Defaults to True.
+        """
+        self.interval = interval
+        self.cache_dir = cache_dir
+        self.on_swap = on_swap
+        self.snapshot = snapshot
+        self.last_results = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self, cc: str, items: str) -> str:
+        """Fetch and (if changed) swap in the WRs for one CC and item type.
+
+        Args:
+            cc (str): CC.
+            items (str): Item type.
+
+        Raises:
+            ValueError: If the fetched WRs are invalid.
+
+        Returns:
+            str: `"updated"` or `"unchanged"`.
+        """
+        wrs = clean_wrs(outreach.fetch_wrs(cc, items, self.cache_dir))
+        if get_catalog().wrs(cc, items) == tuple(wrs[1]):
+            return "unchanged"
+
+        validate_wrs(cc, items, wrs)
+        if self.snapshot:
+            db.record_wrs(cc, items, wrs.itertuples(index=False))
+        swap_wrs(cc, items, wrs)
+        if self.on_swap is not None:
+            self.on_swap(cc, items)
+        return "updated"
+
+    def refresh_all(self) -> dict:
+        """Refresh every CC and item type that has WRs. Failures are recorded rather than raised, so
+        one bad fetch doesn't stop the others; the old WRs stay in use.
+
+        Returns:
+            dict: `(cc, items)` -> `"updated"`, `"unchanged"` or the error message.
+        """
+        results = {}
+        combos = [(cc, items) for cc in CC_CATEGORIES for items in ITEM_OPTIONS
+                  if WRS_DATA.get((cc.upper(), items.upper())) is not None]
+        for cc, items in combos:
+            try:
+                results[(cc, items)] = self.refresh(cc, items)
+            except Exception as e:
+                results[(cc, items)] = f"error: {e!r}"
+                print(f"WR refresh failed for {cc} {items}: {e!r}", file=sys.stderr)
+        self.last_results = results
+        return results
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                claimed = db.claim_task("wr_refresh", self.interval)
+            except Exception as e:
+                print(f"WR refresh claim failed: {e!r}", file=sys.stderr)
+                continue
+            if claimed:
+                self.refresh_all()
+
+    def start(self) -> "WRRefresher":
+        """Start refreshing in a daemon thread, first refresh after one interval."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="wr-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float | None = None):
+        """Stop the background thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)